@@ -21,9 +21,11 @@ except ImportError:
     pass
 import logging
 import multiprocessing as mp
-from .comm import RedisWebsocketRelay
+from . import defaults
+from . import tracing
+from .comm import RedisWebsocketRelay, RelayWorkerPool, TrackRaceCommunicator
 from .game import GameManager
-from .webui import create_app, db
+from .webui.server import serve as serve_webui
 
 
 logger = logging.getLogger(__name__)
@@ -41,6 +43,30 @@ def _create_redis_websocket_relay(loop):
     return ws_relay
 
 
+def _create_relay_workers(loop):
+    """ Starts the relay worker processes, spectator load then stays off the
+    game loop
+    """
+    relay_workers = RelayWorkerPool(defaults.RELAY_WORKERS)
+    relay_workers.start()
+    loop.create_task(relay_workers.supervise())
+    return relay_workers
+
+
+def _create_track_communicator(loop, game_manager):
+    """ Creates the serial reader for the track hardware, if configured.
+    Track events are passed to the game manager in-process.
+    """
+    if defaults.TRACK_SERIAL_PORT is None:
+        logger.info("No track serial port configured")
+        return None
+
+    track_communicator = TrackRaceCommunicator(loop=loop,
+                                               game_manager=game_manager)
+    loop.run_until_complete(track_communicator.start())
+    return track_communicator
+
+
 def _create_race(loop):
     """ Creats the Race """
     game_manager = GameManager(loop=loop)
@@ -49,21 +75,7 @@ def _create_race(loop):
 
 def _create_webui_task():
     """ Creats the task for the web based user interface """
-    def serve():
-        webui = create_app()
-
-        # @TODO only do one
-        with webui.app_context():
-            db.create_all()
-
-        # @TODO use wsgi backend
-        webui.run(host="0.0.0.0",
-                  port=5000,
-                  debug=True,
-                  use_reloader=False,
-                  use_debugger=False)
-
-    return mp.Process(target=serve)
+    return mp.Process(target=serve_webui)
 
 
 def entrypoint():
@@ -72,10 +84,19 @@ def entrypoint():
 
     logger.info("Setting up tasks")
 
-    _create_redis_websocket_relay(loop)
-    _create_race(loop)
+    if defaults.RELAY_WORKERS > 0:
+        ws_relay = None
+        relay_workers = _create_relay_workers(loop)
+    else:
+        ws_relay = _create_redis_websocket_relay(loop)
+        relay_workers = None
+    game_manager = _create_race(loop)
+    track_communicator = _create_track_communicator(loop, game_manager)
     webui_task = _create_webui_task()
 
+    # Periodic latency summary
+    loop.create_task(tracing.tracer.log_periodically())
+
     logger.info("Starting racecontrol")
     try:
         webui_task.start()
@@ -88,8 +109,24 @@ def entrypoint():
         logger.error(e)
 
     finally:
-        logger.info("Killing webui thread")
-        webui_task.terminate()  # @TODO clean shutdown of the webui
+        logger.info("Stopping webui")
+        # Requests in flight are drained first
+        webui_task.terminate()
+        webui_task.join(defaults.WEBUI_GRACEFUL_TIMEOUT + 1)
+        if webui_task.is_alive():
+            logger.warning("Webui did not stop, killing")
+            webui_task.kill()
+        if track_communicator:
+            logger.info("Closing track communicator")
+            loop.run_until_complete(track_communicator.close())
+        logger.info("Closing game manager")
+        loop.run_until_complete(game_manager.close())
+        if relay_workers:
+            logger.info("Stopping relay workers")
+            relay_workers.stop()
+        if ws_relay:
+            logger.info("Closing websocket relay")
+            loop.run_until_complete(ws_relay.close())
         logger.info("Stopping event loop")
         loop.stop()
         # loop.close()
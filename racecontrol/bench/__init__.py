@@ -0,0 +1,11 @@
+# -*- coding: utf-8 -*-
+"""
+    racecontrol.bench
+    ~~~~~~~~~~~~~~~~~
+
+    Benchmarks for the racecontrol hot paths, every module is runnable with
+    `python -m racecontrol.bench.<module>`
+
+    :author: Matthias Riegler, 2018
+    :license: aGPLv3, see LICENSE.md for more details.
+"""
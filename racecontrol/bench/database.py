@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+"""
+    racecontrol.bench.database
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Startup cost and throughput of the web UI database. Readers list and look
+    up drivers while writers keep adding new ones, once per journal mode.
+    With WAL the readers are expected to keep their throughput while a
+    writer commits.
+
+    :author: Matthias Riegler, 2018
+    :license: aGPLv3, see LICENSE.md for more details.
+"""
+
+
+import argparse
+import itertools
+import json
+import os
+import tempfile
+import threading
+import time
+from .. import config
+from ..metrics import LatencyHistogram
+from ..webui import create_app, db, init_db
+from ..webui.models import Driver
+from .report import write_report
+
+
+def create(path, journal_mode, pool_size):
+    """ Creates the web UI app on a database file
+
+    :returns: (app, seconds spent)
+    """
+    started = time.monotonic()
+    app = create_app({
+        "SQLALCHEMY_DATABASE_URI": f"sqlite:///{path}",
+        "SQLITE_PRAGMAS": {**config.SQLITE_PRAGMAS,
+                           "journal_mode": journal_mode},
+        # One connection per thread, like the web UI workers
+        "SQLALCHEMY_ENGINE_OPTIONS": {**config.SQLALCHEMY_ENGINE_OPTIONS,
+                                      "pool_size": pool_size}
+        })
+    init_db(app)
+    return app, time.monotonic() - started
+
+
+def writer(app, end, names, counts):
+    """ Adds drivers until `end`, one commit each """
+    writes = 0
+    with app.app_context():
+        while time.monotonic() < end:
+            name = str(next(names))
+            if Driver.add_to_db(f"Driver {name}", name):
+                writes += 1
+    counts.append(writes)
+
+
+def reader(app, end, latency, counts):
+    """ Lists drivers and looks single ones up until `end` """
+    reads = 0
+    with app.app_context():
+        while time.monotonic() < end:
+            started = time.monotonic()
+            Driver.query.limit(50).all()
+            Driver.query.filter_by(id=reads % 50 + 1).first()
+            # Next read sees the latest commit
+            db.session.rollback()
+            latency.record(time.monotonic() - started)
+            reads += 1
+    counts.append(reads)
+
+
+def run(journal_mode, args):
+    """ Measures one journal mode
+
+    :returns: dict with the results
+    """
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, "racecontrol.db")
+
+    pool_size = args.readers + args.writers
+    app, cold_start = create(path, journal_mode, pool_size)
+    _, warm_start = create(path, journal_mode, pool_size)
+
+    # Something to read from the start
+    names = itertools.count()
+    writer(app, time.monotonic() + 0.2, names, [])
+
+    latency = LatencyHistogram(size=100000)
+    reads, writes = [], []
+    end = time.monotonic() + args.duration
+    threads = [threading.Thread(target=reader,
+                                args=(app, end, latency, reads))
+               for _ in range(args.readers)]
+    threads += [threading.Thread(target=writer,
+                                 args=(app, end, names, writes))
+                for _ in range(args.writers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    return {
+            "journal_mode": journal_mode,
+            "cold_start_ms": cold_start * 1000,
+            "warm_start_ms": warm_start * 1000,
+            "reads_per_second": sum(reads) / args.duration,
+            "writes_per_second": sum(writes) / args.duration,
+            "read_latency_ms": latency.summary()
+            }
+
+
+def main():
+    """ Entry point """
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--journal-modes", nargs="+",
+                        default=["DELETE", "WAL"])
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--writers", type=int, default=1)
+    parser.add_argument("--duration", type=float, default=5)
+    parser.add_argument("--output", help="Write the results as JSON")
+    args = parser.parse_args()
+
+    results = []
+    for journal_mode in args.journal_modes:
+        result = run(journal_mode, args)
+        results.append(result)
+        print(f"{journal_mode:>8} start {result['cold_start_ms']:>6.1f}ms "
+              f"(warm {result['warm_start_ms']:>6.1f}ms) "
+              f"{result['reads_per_second']:>7.0f} reads/s "
+              f"{result['writes_per_second']:>6.0f} writes/s "
+              f"read p99 {result['read_latency_ms']['p99']:>6.1f}ms")
+
+    if args.output:
+        write_report(args.output, "database", vars(args), results)
+    else:
+        print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
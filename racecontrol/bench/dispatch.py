@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+"""
+    racecontrol.bench.dispatch
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Cost of routing a decoded request to its handler. The schema registry
+    and the handler table are compared with the `if request["request"] ==`
+    chain they replaced, both call the same no-op handlers. Measured for a
+    race-like mix of valid requests and for malformed ones.
+
+    :author: Matthias Riegler, 2018
+    :license: aGPLv3, see LICENSE.md for more details.
+"""
+
+
+import argparse
+import json
+import time
+from .. import messages
+from ..game.dispatch import handles, handler_table
+from ..game.events import InvalidRequest, LapFinished, Pause, Resync, Start
+from ..game.events import parse_request
+from .report import write_report
+
+
+class Sink(object):
+    """ Counts the handled events """
+
+    def __init__(self):
+        """ Init """
+        self.handled = 0
+
+    @handles(Start, Pause, Resync)
+    def on_command(self, event):
+        """ UI command """
+        self.handled += 1
+
+    @handles(LapFinished)
+    def on_lap_finished(self, event):
+        """ Track event """
+        self.handled += 1
+
+
+TABLE = handler_table(Sink)
+
+
+def route_chain(sink, request):
+    """ The chain the registry replaced """
+    try:
+        if request["request"] == messages.MSG_START:
+            sink.on_command(request.get("entries"))
+        elif request["request"] == messages.MSG_PAUSE:
+            sink.on_command(None)
+        elif request["request"] == messages.MSG_TRACK_EVENT:
+            if request["type"] != messages.MSG_TRACK_EVENT_LAP_FINISHED:
+                return False
+            sink.on_lap_finished(LapFinished(int(request["track_id"]),
+                                             int(request["time"]),
+                                             request.get("trace")))
+        elif request["request"] == messages.MSG_RESYNC:
+            sink.on_command(None)
+        else:
+            return False
+    except (KeyError, ValueError, TypeError):
+        return False
+    return True
+
+
+def route_table(sink, request):
+    """ Schema registry and handler table """
+    try:
+        event = parse_request(request)
+    except InvalidRequest:
+        return False
+    function, _ = TABLE[type(event)]
+    function(sink, event)
+    return True
+
+
+def valid_requests(count):
+    """ :returns: Requests like a race sees them, mostly laps """
+    commands = ({"request": messages.MSG_START},
+                {"request": messages.MSG_PAUSE},
+                {"request": messages.MSG_RESYNC})
+    requests = []
+    for i in range(count):
+        if i % 10 == 9:
+            requests.append(commands[i // 10 % len(commands)])
+        else:
+            requests.append({"request": messages.MSG_TRACK_EVENT,
+                             "type": messages.MSG_TRACK_EVENT_LAP_FINISHED,
+                             "track_id": i % 4,
+                             "time": 5000 + i % 977})
+    return requests
+
+
+def invalid_requests(count):
+    """ :returns: Malformed requests, every kind in turn """
+    kinds = ({"request": messages.MSG_TRACK_EVENT,
+              "type": messages.MSG_TRACK_EVENT_LAP_FINISHED,
+              "track_id": 1},
+             {"request": messages.MSG_TRACK_EVENT,
+              "type": messages.MSG_TRACK_EVENT_LAP_FINISHED,
+              "track_id": "x", "time": 5000},
+             {"request": messages.MSG_TRACK_EVENT, "type": "unknown"},
+             {"request": "unknown"},
+             {"type": messages.MSG_TRACK_EVENT_LAP_FINISHED})
+    return [kinds[i % len(kinds)] for i in range(count)]
+
+
+def measure(route, requests, repeat):
+    """ :returns: dict with the best time per request of `repeat` runs """
+    best = None
+    for _ in range(repeat):
+        sink = Sink()
+        started = time.perf_counter()
+        for request in requests:
+            route(sink, request)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return {"handled": sink.handled,
+            "ns_per_request": best / len(requests) * 1e9}
+
+
+def main():
+    """ Entry point """
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", help="Write the results as JSON")
+    args = parser.parse_args()
+
+    results = {}
+    for name, requests in (("valid", valid_requests(args.requests)),
+                           ("invalid", invalid_requests(args.requests))):
+        results[name] = {
+                "chain": measure(route_chain, requests, args.repeat),
+                "table": measure(route_table, requests, args.repeat)
+                }
+
+    if args.output:
+        write_report(args.output, "dispatch", vars(args), results)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+"""
+    racecontrol.bench.driver_memory
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Memory held per driver per 1000 laps and the cost of serializing a
+    driver for a state push, as a function of the lap count. A plain list of
+    ints is measured next to the driver as reference for the history.
+
+    :author: Matthias Riegler, 2018
+    :license: aGPLv3, see LICENSE.md for more details.
+"""
+
+
+import argparse
+import random
+import timeit
+import tracemalloc
+from ..game.driver import Driver
+from .report import write_report
+
+
+def allocated(build):
+    """ :returns: Bytes still allocated by the object `build` returns """
+    tracemalloc.start()
+    obj = build()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del obj
+    return size
+
+
+def lap_times(num_laps):
+    """ :returns: Random lap times in ms """
+    return [random.randint(5000, 9000) for _ in range(num_laps)]
+
+
+def build_driver(times):
+    """ :returns: Driver that drove `times` """
+    driver = Driver()
+    for lap_time in times:
+        driver.add_lap(lap_time)
+    driver.state()
+    return driver
+
+
+def measure(num_laps, iterations):
+    """ Measures one lap count
+
+    :returns: dict with bytes per 1000 laps and microseconds per
+              serialization
+    """
+    times = lap_times(num_laps)
+    driver = build_driver(times)
+
+    def serialize():
+        # Every push after a lap rebuilds the view
+        driver._state = None
+        driver.state()
+
+    return {
+            "laps": num_laps,
+            "driver_bytes_per_1000_laps":
+                allocated(lambda: build_driver(times)) / num_laps * 1000,
+            "list_bytes_per_1000_laps":
+                allocated(lambda: lap_times(num_laps)) / num_laps
+                * 1000,
+            "state_us": timeit.timeit(serialize, number=iterations)
+                / iterations * 1e6,
+            "cached_state_us": timeit.timeit(driver.state, number=iterations)
+                / iterations * 1e6
+            }
+
+
+def main():
+    """ Entry point """
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--laps", type=int, nargs="+",
+                        default=[100, 1000, 100000])
+    parser.add_argument("--iterations", type=int, default=100000)
+    parser.add_argument("--output", help="Write the results as JSON")
+    args = parser.parse_args()
+
+    results = [measure(num_laps, args.iterations) for num_laps in args.laps]
+
+    print(f"{'laps':>7} {'driver B/1k':>12} {'list B/1k':>10} "
+          f"{'state':>9} {'cached':>9}")
+    for r in results:
+        print(f"{r['laps']:>7} {r['driver_bytes_per_1000_laps']:>12.0f} "
+              f"{r['list_bytes_per_1000_laps']:>10.0f} "
+              f"{r['state_us']:>7.3f}us {r['cached_state_us']:>7.3f}us")
+
+    if args.output:
+        write_report(args.output, "driver_memory", vars(args), results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+"""
+    racecontrol.bench.fake_redis
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    In-process stand-in for the parts of aioredis racecontrol uses, so the
+    benchmarks run without a redis server. Pub/sub semantics are kept:
+    messages are delivered as bytes to every subscribed channel.
+
+    :author: Matthias Riegler, 2018
+    :license: aGPLv3, see LICENSE.md for more details.
+"""
+
+
+import asyncio
+import fnmatch
+import json
+from collections import defaultdict, deque
+import aioredis
+
+
+class Broker(object):
+    """ Routes published messages to the subscribed channels """
+
+    def __init__(self):
+        """ Init """
+        self._channels = defaultdict(set)
+        self._patterns = set()
+        #: Number of open connections
+        self.connections = 0
+
+    def subscribe(self, channel):
+        """ Registers a channel """
+        if channel.is_pattern:
+            self._patterns.add(channel)
+        else:
+            self._channels[channel.name].add(channel)
+
+    def unsubscribe(self, channel):
+        """ Removes a channel """
+        self._patterns.discard(channel)
+        self._channels[channel.name].discard(channel)
+
+    def publish(self, name, msg):
+        """ Delivers a message
+
+        :returns: Receiver count
+        """
+        data = msg.encode() if isinstance(msg, str) else msg
+        receivers = self._channels.get(name, ())
+        for channel in receivers:
+            channel.put(data)
+        matched = [pattern for pattern in self._patterns
+                   if fnmatch.fnmatchcase(name, pattern.name)]
+        for pattern in matched:
+            pattern.put((name.encode(), data))
+        return len(receivers) + len(matched)
+
+
+#: Broker shared by every connection of this process
+broker = Broker()
+
+
+class FakeChannel(object):
+    """ Subscribed channel, mirrors `aioredis.Channel`. Pattern channels
+    deliver (channel, message) tuples.
+    """
+
+    def __init__(self, name, is_pattern=False):
+        """ Init """
+        self.name = name
+        self.is_pattern = is_pattern
+        self._messages = deque()
+        self._event = asyncio.Event()
+        self._closed = False
+
+    def put(self, data):
+        """ Queues a received message """
+        self._messages.append(data)
+        self._event.set()
+
+    async def wait_message(self):
+        """ :returns: True once a message is available, False if closed """
+        while not self._messages:
+            if self._closed:
+                return False
+            self._event.clear()
+            await self._event.wait()
+        return True
+
+    async def get(self):
+        """ :returns: next message as bytes, None if closed """
+        if not await self.wait_message():
+            return None
+        return self._messages.popleft()
+
+    async def get_json(self):
+        """ :returns: next message decoded as JSON """
+        msg = await self.get()
+        if self.is_pattern:
+            return msg[0], json.loads(msg[1].decode())
+        return json.loads(msg.decode())
+
+    def close(self):
+        """ Closes the channel """
+        self._closed = True
+        self._event.set()
+
+
+class FakePipeline(object):
+    """ Pipeline, mirrors `aioredis.commands.Pipeline` for publishing """
+
+    def __init__(self):
+        """ Init """
+        self._commands = []
+
+    def publish(self, channel, msg):
+        """ Queues a publish """
+        self._commands.append((channel, msg))
+
+    async def execute(self):
+        """ :returns: Receiver counts """
+        return [broker.publish(channel, msg)
+                for channel, msg in self._commands]
+
+
+class FakeRedis(object):
+    """ Connection, mirrors `aioredis.Redis` for pub/sub """
+
+    def __init__(self):
+        """ Init """
+        self._channels = []
+        self._closed = False
+        broker.connections += 1
+
+    async def subscribe(self, *names):
+        """ :returns: list of channels """
+        channels = [FakeChannel(name) for name in names]
+        for channel in channels:
+            broker.subscribe(channel)
+        self._channels.extend(channels)
+        return channels
+
+    async def psubscribe(self, *patterns):
+        """ :returns: list of pattern channels """
+        channels = [FakeChannel(pattern, is_pattern=True)
+                    for pattern in patterns]
+        for channel in channels:
+            broker.subscribe(channel)
+        self._channels.extend(channels)
+        return channels
+
+    async def publish(self, channel, msg):
+        """ :returns: Receiver count """
+        return broker.publish(channel, msg)
+
+    def pipeline(self):
+        """ :returns: Pipeline """
+        return FakePipeline()
+
+    def close(self):
+        """ Closes the connection and its channels """
+        if self._closed:
+            return
+        self._closed = True
+        broker.connections -= 1
+        for channel in self._channels:
+            broker.unsubscribe(channel)
+            channel.close()
+
+    async def wait_closed(self):
+        """ Connection is closed immediately """
+        pass
+
+
+async def create_redis(address, **kwargs):
+    """ Replacement for `aioredis.create_redis` """
+    return FakeRedis()
+
+
+async def create_redis_pool(address, **kwargs):
+    """ Replacement for `aioredis.create_redis_pool` """
+    return FakeRedis()
+
+
+def install():
+    """ Replaces the aioredis connection factories of this process """
+    aioredis.create_redis = create_redis
+    aioredis.create_redis_pool = create_redis_pool
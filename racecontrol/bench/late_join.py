@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+"""
+    racecontrol.bench.late_join
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Reconnect storm against a running race. A race is started and driven for
+    a few laps, then N spectators connect at once while nothing happens on
+    the track. Measures the time until each of them holds a full state and
+    the packets the game published meanwhile.
+
+    :author: Matthias Riegler, 2018
+    :license: aGPLv3, see LICENSE.md for more details.
+"""
+
+
+import argparse
+import asyncio
+import json
+import logging
+import time
+import websockets
+from .. import defaults
+from .. import messages
+from ..metrics import LatencyHistogram
+from .report import write_report
+
+
+async def join(uri, latency, first_types):
+    """ Connects a spectator and waits for its first packet """
+    started = time.monotonic()
+    async with websockets.connect(uri) as ws:
+        msg = await ws.recv()
+        latency.record(time.monotonic() - started)
+        first_types.append(json.loads(msg)["type"])
+
+
+async def storm(relay, game_manager, args):
+    """ Drives the race, then connects the spectators at once
+
+    :returns: dict with the results
+    """
+    await game_manager.handle_request({"request": messages.MSG_START})
+    for lap in range(args.laps):
+        await game_manager.handle_request({
+            "request": messages.MSG_TRACK_EVENT,
+            "type": messages.MSG_TRACK_EVENT_LAP_FINISHED,
+            "track_id": lap % defaults.NUM_DRIVERS,
+            "time": 5000 + lap
+            })
+    # Let the last state push pass the relay
+    await asyncio.sleep(0.5)
+
+    channel = relay.hub.channel_name
+    seq_before = relay.hub.cached_seqs().get(channel)
+    latency = LatencyHistogram(size=args.spectators)
+    first_types = []
+    uri = f"ws://127.0.0.1:{args.port}{defaults.WEBSOCKET_STREAM_PATH}"
+
+    started = time.monotonic()
+    await asyncio.wait_for(
+            asyncio.gather(*(join(uri, latency, first_types)
+                             for _ in range(args.spectators))),
+            args.timeout)
+    elapsed = time.monotonic() - started
+
+    return {
+            "spectators": args.spectators,
+            "elapsed_s": elapsed,
+            "time_to_state_ms": latency.summary(),
+            "snapshots_first": first_types.count(
+                messages.REDIS_MSG_TYPE_STATE_PUSH),
+            "cached_seq": seq_before,
+            "game_packets_during_join":
+                relay.hub.cached_seqs().get(channel) - seq_before
+            }
+
+
+def main():
+    """ Entry point """
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--spectators", type=int, default=500)
+    parser.add_argument("--laps", type=int, default=20)
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--port", type=int, default=8768)
+    parser.add_argument("--redis", default="memory",
+                        help="Redis URI or 'memory' for the in-process "
+                             "stand-in")
+    parser.add_argument("--output", help="Write the results as JSON")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+
+    if args.redis == "memory":
+        from . import fake_redis
+        fake_redis.install()
+        redis_uri = defaults.REDIS_URI
+    else:
+        redis_uri = args.redis
+
+    # Import after installing the stand-in
+    from ..comm import RedisWebsocketRelay
+    from ..game import GameManager
+
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+
+    relay = RedisWebsocketRelay(loop=loop, port=args.port,
+                                redis_uri=redis_uri)
+    game_manager = GameManager(loop=loop, redis_uri=redis_uri,
+                               journal_dir=None)
+
+    results = loop.run_until_complete(storm(relay, game_manager, args))
+    loop.run_until_complete(relay.close())
+    loop.run_until_complete(game_manager.close())
+
+    if args.output:
+        write_report(args.output, "late_join", vars(args), results)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+"""
+    racecontrol.bench.load
+    ~~~~~~~~~~~~~~~~~~~~~~
+
+    Load test for the websocket relay and the game manager. Starts both on
+    one event loop, connects N spectators and M input clients and drives
+    synthetic lap events through the /input path.
+
+    Fan-out latency is measured by the relay, from the moment it received
+    the lap event to the moment it sent the state push carrying it to the
+    first spectator. The spread is the time from the first to each further
+    spectator receiving the same packet.
+    Clients share the process with the server, so absolute numbers are
+    pessimistic; they are meant to be compared across commits.
+
+    :author: Matthias Riegler, 2018
+    :license: aGPLv3, see LICENSE.md for more details.
+"""
+
+
+import argparse
+import asyncio
+import json
+import logging
+import random
+import time
+import websockets
+from .. import defaults
+from .. import messages
+from .. import tracing
+from ..metrics import LatencyHistogram
+from .report import write_report, memory
+
+
+logger = logging.getLogger(__name__)
+
+# Tracks lap events are generated for
+NUM_TRACKS = 4
+
+
+class Spectator(object):
+    """ Websocket client on the game stream """
+
+    def __init__(self, uri, spread, first_seen):
+        """ Init
+
+        :param spread: Histogram of the delay behind the first spectator
+        :param first_seen: (type, seq) -> time any spectator received it
+        """
+        self._uri = uri
+        self._spread = spread
+        self._first_seen = first_seen
+        #: Received packets
+        self.packets = 0
+        #: Received bytes
+        self.bytes = 0
+
+    async def run(self, connected):
+        """ Receives until canceled """
+        async with websockets.connect(self._uri) as ws:
+            connected.release()
+            async for msg in ws:
+                now = time.monotonic()
+                self.packets += 1
+                self.bytes += len(msg)
+                packet = json.loads(msg)
+                if "seq" in packet:
+                    key = (packet["type"], packet["seq"])
+                    self._spread.record(
+                            now - self._first_seen.setdefault(key, now))
+
+
+class InputClient(object):
+    """ Websocket client sending lap events """
+
+    def __init__(self, uri, rate, num_tracks):
+        """ Init """
+        self._uri = uri
+        self._interval = 1 / rate
+        self._num_tracks = num_tracks
+        #: Sent lap events
+        self.laps = 0
+
+    async def run(self, start_race=False):
+        """ Sends lap events until canceled """
+        async with websockets.connect(self._uri) as ws:
+            if start_race:
+                await ws.send(json.dumps({"request": messages.MSG_START}))
+
+            next_send = time.monotonic()
+            while True:
+                await ws.send(json.dumps({
+                    "request": messages.MSG_TRACK_EVENT,
+                    "type": messages.MSG_TRACK_EVENT_LAP_FINISHED,
+                    "track_id": random.randrange(self._num_tracks),
+                    "time": random.randint(5000, 9000)
+                    }))
+                self.laps += 1
+
+                next_send += self._interval
+                await asyncio.sleep(max(0, next_send - time.monotonic()))
+
+
+async def run_load(relay, args):
+    """ Runs the load test against a running relay and game manager
+
+    :returns: dict with the results
+    """
+    loop = asyncio.get_event_loop()
+    base_uri = f"ws://127.0.0.1:{args.port}"
+    spread = LatencyHistogram(size=100000)
+    first_seen = {}
+
+    # Connect the spectators first
+    connected = asyncio.Semaphore(0)
+    spectators = [Spectator(base_uri + defaults.WEBSOCKET_STREAM_PATH,
+                            spread, first_seen)
+                  for _ in range(args.spectators)]
+    tasks = [loop.create_task(s.run(connected)) for s in spectators]
+    for _ in spectators:
+        await connected.acquire()
+    peak_subscribers = relay.hub.subscriber_count
+
+    inputs = [InputClient(base_uri + defaults.WEBSOCKET_INPUT_PATH,
+                          args.rate / args.inputs,
+                          NUM_TRACKS)
+              for _ in range(args.inputs)]
+    started = time.monotonic()
+    tasks += [loop.create_task(c.run(start_race=(i == 0)))
+              for i, c in enumerate(inputs)]
+
+    await asyncio.sleep(args.duration)
+    elapsed = time.monotonic() - started
+    mem = memory()
+
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+    packets = sum(s.packets for s in spectators)
+    hops = tracing.tracer.summary()
+    return {
+            "elapsed_s": elapsed,
+            "laps_sent": sum(c.laps for c in inputs),
+            "laps_per_second": sum(c.laps for c in inputs) / elapsed,
+            "packets_received": packets,
+            "packets_per_second": packets / elapsed,
+            "bytes_received": sum(s.bytes for s in spectators),
+            "fanout_latency_ms": hops.get(
+                f"{tracing.HOP_INPUT}->{tracing.HOP_SEND} (total)"),
+            "fanout_spread_ms": spread.summary(),
+            "peak_subscribers": peak_subscribers,
+            "hop_latency_ms": hops,
+            "memory": mem
+            }
+
+
+def main():
+    """ Entry point """
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--spectators", type=int, default=100)
+    parser.add_argument("--inputs", type=int, default=4)
+    parser.add_argument("--rate", type=float, default=20,
+                        help="Lap events per second, over all input clients")
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--redis", default="memory",
+                        help="Redis URI or 'memory' for the in-process "
+                             "stand-in")
+    parser.add_argument("--output", default="bench_load.json")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+
+    if args.redis == "memory":
+        from . import fake_redis
+        fake_redis.install()
+        redis_uri = defaults.REDIS_URI
+    else:
+        redis_uri = args.redis
+
+    # Import after installing the stand-in
+    from ..comm import RedisWebsocketRelay
+    from ..game import GameManager
+
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+
+    relay = RedisWebsocketRelay(loop=loop, port=args.port,
+                                redis_uri=redis_uri)
+    GameManager(loop=loop, redis_uri=redis_uri, journal_dir=None)
+
+    results = loop.run_until_complete(run_load(relay, args))
+    if args.redis == "memory":
+        # Connections held by the relay and the game manager
+        results["redis_connections"] = fake_redis.broker.connections
+    loop.run_until_complete(relay.close())
+
+    write_report(args.output, "load", vars(args), results)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
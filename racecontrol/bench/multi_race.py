@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+"""
+    racecontrol.bench.multi_race
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Throughput of one game manager hosting several races. Every race gets the
+    same number of lap events published on its own input channel, the time
+    until all of them are applied is measured for each race count.
+
+    With --stall the first race never finishes handling a request, the other
+    races are expected to keep their throughput.
+
+    :author: Matthias Riegler, 2018
+    :license: aGPLv3, see LICENSE.md for more details.
+"""
+
+
+import argparse
+import asyncio
+import json
+import logging
+import time
+import aioredis
+from .. import channels
+from .. import defaults
+from .. import messages
+from .report import write_report, memory
+
+
+def race_ids(num_races):
+    """ :returns: Race ids of a run """
+    return [f"race{i}" for i in range(num_races)]
+
+
+async def stalled_event(event):
+    """ Event handler of a race which got stuck """
+    await asyncio.Event().wait()
+
+
+def laps_applied(game_manager, ids):
+    """ :returns: Laps applied over all races """
+    return sum(lap_count
+               for race_id in ids
+               for _, lap_count in game_manager.race(race_id)
+               .ranking.standings())
+
+
+async def drive(game_manager, ids, laps, num_drivers, redis_uri, stall):
+    """ Publishes the lap events and waits until they are applied
+
+    :returns: dict with the results of one race count
+    """
+    redis = await aioredis.create_redis(redis_uri)
+    if stall:
+        game_manager.runner(ids[0]).handle_event = stalled_event
+    measured = ids[1:] if stall else ids
+
+    for race_id in ids:
+        await redis.publish(channels.race_channel(
+            game_manager.incoming_event_channel, race_id),
+            json.dumps({"request": messages.MSG_START}))
+
+    started = time.monotonic()
+    for lap in range(laps):
+        # One round trip per lap over all races
+        pipe = redis.pipeline()
+        for race_id in ids:
+            pipe.publish(channels.race_channel(
+                game_manager.incoming_event_channel, race_id),
+                json.dumps({
+                    "request": messages.MSG_TRACK_EVENT,
+                    "type": messages.MSG_TRACK_EVENT_LAP_FINISHED,
+                    "track_id": lap % num_drivers,
+                    "time": 5000 + lap
+                    }))
+        await pipe.execute()
+    published = time.monotonic() - started
+
+    expected = laps * len(measured)
+    while laps_applied(game_manager, measured) < expected:
+        await asyncio.sleep(0.001)
+    elapsed = time.monotonic() - started
+
+    redis.close()
+    await redis.wait_closed()
+    return {
+            "races": len(ids),
+            "laps": expected,
+            "publish_s": published,
+            "elapsed_s": elapsed,
+            "laps_per_second": expected / elapsed,
+            "dropped": sum(game_manager.runner(race_id).dropped
+                           for race_id in ids)
+            }
+
+
+def main():
+    """ Entry point """
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--races", type=int, nargs="+",
+                        default=[1, 2, 4, 8, 16])
+    parser.add_argument("--laps", type=int, default=200,
+                        help="Lap events per race")
+    parser.add_argument("--drivers", type=int, default=4)
+    parser.add_argument("--stall", action="store_true")
+    parser.add_argument("--redis", default="memory",
+                        help="Redis URI or 'memory' for the in-process "
+                             "stand-in")
+    parser.add_argument("--output", help="Write the results as JSON")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.ERROR)
+
+    if args.redis == "memory":
+        from . import fake_redis
+        fake_redis.install()
+        redis_uri = defaults.REDIS_URI
+    else:
+        redis_uri = args.redis
+
+    # Import after installing the stand-in
+    from ..game import GameManager
+
+    results = []
+    for num_races in args.races:
+        if args.stall and num_races < 2:
+            continue
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        ids = race_ids(num_races)
+
+        game_manager = GameManager(loop=loop, redis_uri=redis_uri,
+                                   journal_dir=None, race_ids=ids)
+        result = loop.run_until_complete(drive(
+            game_manager, ids, args.laps, args.drivers, redis_uri,
+            args.stall))
+        loop.run_until_complete(game_manager.close())
+        # Let canceled tasks finish before the loop goes away
+        pending = asyncio.all_tasks(loop)
+        for task in pending:
+            task.cancel()
+        loop.run_until_complete(
+            asyncio.gather(*pending, return_exceptions=True))
+        loop.close()
+
+        results.append(result)
+        print(f"{result['races']:>3} races {result['laps']:>6} laps "
+              f"{result['elapsed_s']:>7.3f}s "
+              f"{result['laps_per_second']:>9.0f} laps/s "
+              f"{result['dropped']:>4} dropped")
+
+    if args.output:
+        write_report(args.output, "multi_race", vars(args),
+                     {"runs": results, "memory": memory()})
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+"""
+    racecontrol.bench.relay_workers
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Fan-out throughput of the relay worker pool for different worker counts.
+    Spectators are spread over several client processes, state packets are
+    published straight to redis at a fixed rate. Needs a redis server, the
+    in-process stand-in does not work across processes.
+
+    Scaling is bounded by the number of cores shared by the workers and the
+    client processes.
+
+    :author: Matthias Riegler, 2018
+    :license: aGPLv3, see LICENSE.md for more details.
+"""
+
+
+import argparse
+import asyncio
+import json
+import multiprocessing as mp
+import time
+import aioredis
+import websockets
+from .. import defaults
+from ..comm import RelayWorkerPool
+from .report import write_report
+from .wire_format import build_snapshot
+
+
+def run_clients(uri, count, duration, results):
+    """ Client process, connects `count` spectators and counts the received
+    packets for `duration` seconds
+    """
+    async def spectator(stats):
+        try:
+            async with websockets.connect(uri) as ws:
+                stats["connected"] += 1
+                async for _ in ws:
+                    stats["received"] += 1
+        except (OSError, websockets.exceptions.WebSocketException):
+            stats["failed"] += 1
+
+    async def main():
+        stats = {"connected": 0, "received": 0, "failed": 0}
+        tasks = [asyncio.ensure_future(spectator(stats))
+                 for _ in range(count)]
+        await asyncio.sleep(duration)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        results.put(stats)
+
+    asyncio.new_event_loop().run_until_complete(main())
+
+
+async def publish(redis_uri, rate, duration):
+    """ Publishes state packets
+
+    :returns: Number of published packets
+    """
+    redis = await aioredis.create_redis(redis_uri)
+    msg = json.dumps(build_snapshot(8))
+    interval = 1 / rate
+    published = 0
+    end = time.monotonic() + duration
+    next_send = time.monotonic()
+    while time.monotonic() < end:
+        await redis.publish(defaults.OUTGOING_EVENT_CHANNEL, msg)
+        published += 1
+        next_send += interval
+        await asyncio.sleep(max(0, next_send - time.monotonic()))
+    redis.close()
+    await redis.wait_closed()
+    return published
+
+
+def run(num_workers, args):
+    """ Measures one worker count
+
+    :returns: dict with the results
+    """
+    pool = RelayWorkerPool(num_workers, port=args.port,
+                           redis_uri=args.redis)
+    pool.start()
+    # Workers need a moment to bind the port
+    time.sleep(args.startup)
+
+    ctx = mp.get_context("spawn")
+    results = ctx.Queue()
+    uri = f"ws://127.0.0.1:{args.port}{defaults.WEBSOCKET_STREAM_PATH}"
+    per_process = args.spectators // args.client_processes
+    clients = [ctx.Process(target=run_clients,
+                           args=(uri, per_process,
+                                 args.duration + args.startup, results))
+               for _ in range(args.client_processes)]
+    for client in clients:
+        client.start()
+    time.sleep(args.startup)
+
+    published = asyncio.new_event_loop().run_until_complete(
+            publish(args.redis, args.rate, args.duration))
+
+    stats = [results.get() for _ in clients]
+    for client in clients:
+        client.join()
+    pool.stop()
+
+    received = sum(s["received"] for s in stats)
+    return {
+            "workers": num_workers,
+            "connected": sum(s["connected"] for s in stats),
+            "failed": sum(s["failed"] for s in stats),
+            "published": published,
+            "received": received,
+            "delivered_per_second": received / args.duration
+            }
+
+
+def main():
+    """ Entry point """
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--spectators", type=int, default=400)
+    parser.add_argument("--client-processes", type=int, default=4)
+    parser.add_argument("--rate", type=float, default=20,
+                        help="State packets per second")
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--startup", type=float, default=2)
+    parser.add_argument("--port", type=int, default=8767)
+    parser.add_argument("--redis", default=defaults.REDIS_URI)
+    parser.add_argument("--output", help="Write the results as JSON")
+    args = parser.parse_args()
+
+    results = []
+    for num_workers in args.workers:
+        result = run(num_workers, args)
+        results.append(result)
+        print(f"{result['workers']:>2} workers "
+              f"{result['connected']:>5} connected "
+              f"{result['delivered_per_second']:>9.0f} packets/s")
+
+    if args.output:
+        write_report(args.output, "relay_workers", vars(args), results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+"""
+    racecontrol.bench.report
+    ~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Machine readable benchmark results, comparable across commits
+
+    :author: Matthias Riegler, 2018
+    :license: aGPLv3, see LICENSE.md for more details.
+"""
+
+
+import json
+import platform
+import resource
+import subprocess
+import time
+
+
+def git_commit():
+    """ :returns: Commit hash of the working tree or None """
+    try:
+        return subprocess.check_output(
+                ["git", "rev-parse", "HEAD"],
+                stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def memory():
+    """ :returns: dict with the current and peak resident set size in KiB """
+    usage = {"max_rss_kib": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss}
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        usage["rss_kib"] = pages * resource.getpagesize() // 1024
+    except OSError:
+        pass
+    return usage
+
+
+def write_report(path, benchmark, params, results):
+    """ Writes a benchmark report as JSON
+
+    :param path: Output file
+    :param benchmark: Name of the benchmark
+    :param params: Parameters the benchmark ran with
+    :param results: Results
+    """
+    report = {
+            "benchmark": benchmark,
+            "timestamp": time.time(),
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "params": params,
+            "results": results
+            }
+
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2)
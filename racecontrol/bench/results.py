@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+"""
+    racecontrol.bench.results
+    ~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Cost of storing a finished race for the event loop. A race is driven to
+    the requested number of laps per driver, then stored once on the writer
+    thread and once directly on the loop. A probe task measures how late the
+    loop wakes it up meanwhile.
+
+    :author: Matthias Riegler, 2018
+    :license: aGPLv3, see LICENSE.md for more details.
+"""
+
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import tempfile
+import time
+from .. import defaults
+from .. import messages
+from ..metrics import LatencyHistogram
+from .report import write_report
+
+# Probe interval in seconds
+PROBE_INTERVAL = 0.001
+
+
+async def probe(lag, stop):
+    """ Records how late the loop runs the probe """
+    while not stop.is_set():
+        started = time.monotonic()
+        await asyncio.sleep(PROBE_INTERVAL)
+        lag.record(time.monotonic() - started - PROBE_INTERVAL)
+
+
+async def measure(store, results, background):
+    """ Stores the results while probing the loop
+
+    :returns: dict with the results of one run
+    """
+    lag = LatencyHistogram(size=100000)
+    stop = asyncio.Event()
+    probe_task = asyncio.ensure_future(probe(lag, stop))
+    await asyncio.sleep(0.05)
+
+    started = time.monotonic()
+    if background:
+        await store.persist(results)
+    else:
+        store.write(results)
+    elapsed = time.monotonic() - started
+
+    await asyncio.sleep(0.05)
+    stop.set()
+    await probe_task
+    return {"store_ms": elapsed * 1000, "loop_lag_ms": lag.summary()}
+
+
+async def drive(game_manager, args):
+    """ Drives a race and copies its results
+
+    :returns: (results, milliseconds spent copying them)
+    """
+    race = game_manager.current_race
+    await game_manager.handle_request({"request": messages.MSG_START})
+    await asyncio.sleep(0.05)
+    for lap in range(args.laps * args.drivers):
+        await race._on_lap_finished(lap % args.drivers, 5000 + lap % 977)
+    await game_manager.handle_request({"request": messages.MSG_FINISH})
+
+    started = time.monotonic()
+    results = race.results()
+    return results, (time.monotonic() - started) * 1000
+
+
+def main():
+    """ Entry point """
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--laps", type=int, default=500,
+                        help="Laps per driver")
+    parser.add_argument("--drivers", type=int, default=8)
+    parser.add_argument("--output", help="Write the results as JSON")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+
+    from . import fake_redis
+    fake_redis.install()
+
+    # Import after installing the stand-in
+    from ..game import GameManager
+    from ..game.results import ResultStore
+
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+
+    game_manager = GameManager(loop=loop, race_ids=(), journal_dir=None,
+                               persist_results=False)
+    loop.run_until_complete(game_manager.add_race(defaults.DEFAULT_RACE_ID,
+                                                  num_drivers=args.drivers))
+    results, copy_ms = loop.run_until_complete(drive(game_manager, args))
+
+    database = os.path.join(tempfile.mkdtemp(), "racecontrol.db")
+    store = ResultStore(loop, {
+        "SQLALCHEMY_DATABASE_URI": f"sqlite:///{database}"})
+    # First write creates the app and the schema, not part of the numbers
+    loop.run_until_complete(store.persist(results))
+
+    report = {
+            "laps": args.laps * args.drivers,
+            "copy_ms": copy_ms,
+            "writer_thread": loop.run_until_complete(
+                measure(store, results, True)),
+            "on_loop": loop.run_until_complete(
+                measure(store, results, False))
+            }
+    loop.run_until_complete(store.close())
+    loop.run_until_complete(game_manager.close())
+
+    if args.output:
+        write_report(args.output, "results", vars(args), report)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
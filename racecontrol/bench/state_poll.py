@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+"""
+    racecontrol.bench.state_poll
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    HTTP pollers against the state path of the relay. Measures plain and
+    conditional requests against an unchanged state first, then N long-poll
+    clients following a race and the time from a lap until they hold the new
+    state.
+
+    :author: Matthias Riegler, 2018
+    :license: aGPLv3, see LICENSE.md for more details.
+"""
+
+
+import argparse
+import asyncio
+import json
+import logging
+import time
+from .. import defaults
+from .. import messages
+from ..metrics import LatencyHistogram
+from .report import write_report
+
+
+async def get(port, path, etag=None):
+    """ Sends a plain HTTP GET to the relay
+
+    :returns: (status, headers, body)
+    """
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    request = f"GET {path} HTTP/1.1\r\nHost: 127.0.0.1\r\n"
+    if etag:
+        request += f"If-None-Match: {etag}\r\n"
+    writer.write((request + "\r\n").encode())
+
+    head = await reader.readuntil(b"\r\n\r\n")
+    lines = head.decode().split("\r\n")
+    status = int(lines[0].split()[1])
+    headers = dict(line.split(": ", 1) for line in lines[1:] if line)
+    body = await reader.readexactly(int(headers.get("Content-Length", 0)))
+    writer.close()
+    return status, headers, body
+
+
+async def unchanged(port, requests, etag):
+    """ Requests the unchanged state, one request at a time
+
+    :param etag: Sent as If-None-Match, None for plain requests
+    :returns: dict with the results
+    """
+    latency = LatencyHistogram(size=requests)
+    sent = 0
+    started = time.monotonic()
+    for _ in range(requests):
+        request_started = time.monotonic()
+        status, _, body = await get(port, defaults.WEBSOCKET_STATE_PATH,
+                                    etag)
+        latency.record(time.monotonic() - request_started)
+        sent += len(body)
+    elapsed = time.monotonic() - started
+    return {"status": status,
+            "requests_per_s": requests / elapsed,
+            "body_bytes": sent,
+            "latency_ms": latency.summary()}
+
+
+async def follow(port, wait, stop, lapped, latency, counts):
+    """ Long-polls the state until `stop` is set """
+    etag = None
+    path = f"{defaults.WEBSOCKET_STATE_PATH}?wait={wait}"
+    while not stop.is_set():
+        status, headers, _ = await get(port, path, etag)
+        counts[status] = counts.get(status, 0) + 1
+        if status == 200:
+            if etag is not None:
+                latency.record(time.monotonic() - lapped[0])
+            etag = headers["ETag"]
+
+
+async def drive(relay, game_manager, args):
+    """ Drives a race while the pollers follow it
+
+    :returns: dict with the results
+    """
+    await game_manager.handle_request({"request": messages.MSG_START})
+    # Let the first state push pass the relay
+    await asyncio.sleep(0.5)
+    etag = relay.hub.state().etag
+
+    results = {
+            "plain": await unchanged(args.port, args.requests, None),
+            "conditional": await unchanged(args.port, args.requests, etag)
+            }
+
+    stop = asyncio.Event()
+    lapped = [time.monotonic()]
+    latency = LatencyHistogram(size=args.pollers * args.laps)
+    counts = {}
+    pollers = [asyncio.ensure_future(
+                   follow(args.port, args.wait, stop, lapped, latency,
+                          counts))
+               for _ in range(args.pollers)]
+    # Let every poller hold the current state
+    await asyncio.sleep(1)
+
+    # The last lap releases the pollers
+    for lap in range(args.laps + 1):
+        if lap == args.laps:
+            stop.set()
+        lapped[0] = time.monotonic()
+        await game_manager.handle_request({
+            "request": messages.MSG_TRACK_EVENT,
+            "type": messages.MSG_TRACK_EVENT_LAP_FINISHED,
+            "track_id": lap % defaults.NUM_DRIVERS,
+            "time": 5000 + lap
+            })
+        await asyncio.sleep(args.interval)
+
+    await asyncio.wait_for(asyncio.gather(*pollers), args.wait + 5)
+
+    results["long_poll"] = {
+            "pollers": args.pollers,
+            "laps": args.laps,
+            "responses": counts,
+            "time_to_state_ms": latency.summary()
+            }
+    return results
+
+
+def main():
+    """ Entry point """
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--pollers", type=int, default=200)
+    parser.add_argument("--requests", type=int, default=2000,
+                        help="Requests against the unchanged state")
+    parser.add_argument("--laps", type=int, default=20)
+    parser.add_argument("--interval", type=float, default=0.5,
+                        help="Seconds between two laps")
+    parser.add_argument("--wait", type=float, default=10,
+                        help="Seconds a long-poll waits at most")
+    parser.add_argument("--port", type=int, default=8769)
+    parser.add_argument("--redis", default="memory",
+                        help="Redis URI or 'memory' for the in-process "
+                             "stand-in")
+    parser.add_argument("--output", help="Write the results as JSON")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+
+    if args.redis == "memory":
+        from . import fake_redis
+        fake_redis.install()
+        redis_uri = defaults.REDIS_URI
+    else:
+        redis_uri = args.redis
+
+    # Import after installing the stand-in
+    from ..comm import RedisWebsocketRelay
+    from ..game import GameManager
+
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+
+    relay = RedisWebsocketRelay(loop=loop, port=args.port,
+                                redis_uri=redis_uri)
+    game_manager = GameManager(loop=loop, redis_uri=redis_uri,
+                               journal_dir=None, persist_results=False)
+
+    results = loop.run_until_complete(drive(relay, game_manager, args))
+    loop.run_until_complete(relay.close())
+    loop.run_until_complete(game_manager.close())
+
+    if args.output:
+        write_report(args.output, "state_poll", vars(args), results)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+"""
+    racecontrol.bench.static_assets
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Bytes and time of loading `/race` like a browser: the page, then every
+    stylesheet, script and image it references. The repeat load uses the
+    cache of the first one, files still fresh are not requested, the others
+    are revalidated. Runs once with the plain static folders and once with
+    the built assets.
+
+    :author: Matthias Riegler, 2018
+    :license: aGPLv3, see LICENSE.md for more details.
+"""
+
+
+import argparse
+import http.client
+import json
+import multiprocessing as mp
+import os
+import re
+import tempfile
+import time
+from ..webui import server
+from .report import write_report
+from .webui_load import wait_for_port
+
+
+PAGE = "/race/"
+
+# What a current browser sends
+ACCEPT_ENCODING = "gzip, deflate, br"
+
+# Stylesheets, scripts and images, links to other pages are left out
+_REFERENCES = re.compile(rb'(?:<link[^>]*href|src)="(/[^"]+)"')
+
+
+def fetch(conn, path, cached=None):
+    """ Requests a file, revalidates it if it is cached
+
+    :param cached: Response headers of the cached copy
+    :returns: (status, response headers, body, bytes received)
+    """
+    headers = {"Accept-Encoding": ACCEPT_ENCODING}
+    if cached is not None:
+        if cached.get("ETag"):
+            headers["If-None-Match"] = cached["ETag"]
+        if cached.get("Last-Modified"):
+            headers["If-Modified-Since"] = cached["Last-Modified"]
+
+    conn.request("GET", path, headers=headers)
+    response = conn.getresponse()
+    body = response.read()
+    # Header bytes, roughly as they are on the wire
+    received = sum(len(k) + len(v) + 4 for k, v in response.getheaders())
+    return response.status, dict(response.getheaders()), body, \
+        received + len(body)
+
+
+def fresh(headers):
+    """ :returns: True if a browser uses the cached copy without asking """
+    cache_control = headers.get("Cache-Control", "")
+    match = re.search(r"max-age=(\d+)", cache_control)
+    return "no-cache" not in cache_control and match is not None \
+        and int(match.group(1)) > 0
+
+
+def load(port, cache):
+    """ Loads the page and the files it references
+
+    :param cache: path -> response headers, filled by the first load
+    :returns: dict with the results of one load
+    """
+    conn = http.client.HTTPConnection("127.0.0.1", port)
+    received = requests = not_modified = 0
+    started = time.monotonic()
+
+    _, _, page, size = fetch(conn, PAGE)
+    received += size
+    requests += 1
+    for path in dict.fromkeys(_REFERENCES.findall(page)):
+        path = path.decode()
+        cached = cache.get(path)
+        if cached is not None and fresh(cached):
+            continue
+        status, headers, _, size = fetch(conn, path, cached)
+        received += size
+        requests += 1
+        not_modified += status == 304
+        if status == 200:
+            cache[path] = headers
+
+    elapsed = time.monotonic() - started
+    conn.close()
+    return {
+            "requests": requests,
+            "not_modified": not_modified,
+            "bytes": received,
+            "ms": elapsed * 1000
+            }
+
+
+def run(name, assets, args):
+    """ Starts the web UI and loads the page twice
+
+    :param assets: Asset build directory, None serves the static folders
+    :returns: dict with the results
+    """
+    database = os.path.join(tempfile.mkdtemp(), "racecontrol.db")
+    process = mp.Process(target=server.serve, kwargs={
+        "host": "127.0.0.1",
+        "port": args.port,
+        "server": args.server,
+        "config": {"SQLALCHEMY_DATABASE_URI": f"sqlite:///{database}",
+                   "ASSETS_BUILD_DIR": assets}
+        })
+    process.start()
+    try:
+        wait_for_port(args.port, 30)
+        cache = {}
+        first = load(args.port, cache)
+        repeat = load(args.port, cache)
+    finally:
+        process.terminate()
+        process.join()
+    return {"name": name, "first": first, "repeat": repeat}
+
+
+def main():
+    """ Entry point """
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--server", default=server.SERVER_GUNICORN)
+    parser.add_argument("--port", type=int, default=5052)
+    parser.add_argument("--output", help="Write the results as JSON")
+    args = parser.parse_args()
+
+    results = [run("static", None, args),
+               run("assets", tempfile.mkdtemp(), args)]
+    for result in results:
+        for load_name in ("first", "repeat"):
+            numbers = result[load_name]
+            print(f"{result['name']:>8} {load_name:>8} "
+                  f"{numbers['requests']:>3} requests "
+                  f"{numbers['bytes']:>8} bytes {numbers['ms']:>7.1f}ms")
+
+    if args.output:
+        write_report(args.output, "static_assets", vars(args), results)
+    else:
+        print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+# -*- coding: utf-8 -*-
+"""
+    racecontrol.bench.webui_load
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    HTTP load test of the web UI pages. The web UI is started the way the
+    racecontrol process starts it, once per server type on a fresh database,
+    and seeded with drivers and cars through its forms. Every client thread
+    holds one keep-alive connection and requests one page after another.
+
+    Clients share the machine with the server, numbers are meant to be
+    compared between server types and commits.
+
+    :author: Matthias Riegler, 2018
+    :license: aGPLv3, see LICENSE.md for more details.
+"""
+
+
+import argparse
+import http.client
+import json
+import multiprocessing as mp
+import os
+import re
+import socket
+import tempfile
+import threading
+import time
+from urllib.parse import urlencode
+from ..metrics import LatencyHistogram
+from ..webui import server
+from .report import write_report
+
+
+# Page -> path
+PAGES = {
+        "drivers": "/driver/",
+        "driver": "/driver/profile/1",
+        "cars": "/car/",
+        "car": "/car/profile/1",
+        "race": "/race/"
+        }
+
+_CSRF_TOKEN = re.compile(rb'name="csrf_token" type="hidden" value="([^"]+)"')
+
+
+def wait_for_port(port, timeout):
+    """ Waits until the server accepts connections """
+    end = time.monotonic() + timeout
+    while time.monotonic() < end:
+        try:
+            socket.create_connection(("127.0.0.1", port), 0.1).close()
+            return
+        except OSError:
+            time.sleep(0.05)
+    raise TimeoutError(f"Nothing listening on port {port}")
+
+
+def submit_form(conn, path, fields):
+    """ Submits a form of the web UI, the CSRF token is taken from the form
+    page
+    """
+    conn.request("GET", path)
+    response = conn.getresponse()
+    token = _CSRF_TOKEN.search(response.read()).group(1).decode()
+    cookie = response.getheader("Set-Cookie").split(";")[0]
+
+    conn.request("POST", path, urlencode({**fields, "csrf_token": token}),
+                 {"Content-Type": "application/x-www-form-urlencoded",
+                  "Cookie": cookie})
+    response = conn.getresponse()
+    response.read()
+    if response.status >= 400:
+        raise RuntimeError(f"{path} answered {response.status}")
+
+
+def seed(port, entries):
+    """ Adds drivers and cars """
+    conn = http.client.HTTPConnection("127.0.0.1", port)
+    for i in range(entries):
+        submit_form(conn, "/driver/newdriver",
+                    {"name": f"Driver {i}", "shortname": f"d{i}"})
+        submit_form(conn, "/car/newcar",
+                    {"name": f"Car {i}", "manufacturer": "Carrera",
+                     "scale": 32})
+    conn.close()
+
+
+def client(port, path, end, latency, counts):
+    """ Requests a page over one keep-alive connection until `end` """
+    conn = http.client.HTTPConnection("127.0.0.1", port)
+    requests = errors = 0
+    while time.monotonic() < end:
+        started = time.monotonic()
+        try:
+            conn.request("GET", path)
+            response = conn.getresponse()
+            response.read()
+            if response.status != 200:
+                errors += 1
+        except (OSError, http.client.HTTPException):
+            errors += 1
+            conn.close()
+            conn = http.client.HTTPConnection("127.0.0.1", port)
+            continue
+        latency.record(time.monotonic() - started)
+        requests += 1
+    conn.close()
+    counts.append((requests, errors))
+
+
+def load_page(port, path, args):
+    """ Runs the clients against one page
+
+    :returns: dict with the results of the page
+    """
+    latency = LatencyHistogram(size=100000)
+    counts = []
+    end = time.monotonic() + args.duration
+    threads = [threading.Thread(target=client,
+                                args=(port, path, end, latency, counts))
+               for _ in range(args.clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    requests = sum(c[0] for c in counts)
+    return {
+            "requests": requests,
+            "errors": sum(c[1] for c in counts),
+            "requests_per_second": requests / args.duration,
+            "latency_ms": latency.summary()
+            }
+
+
+def run(server_type, args):
+    """ Starts the web UI and loads every page
+
+    :returns: dict with the results of a server type
+    """
+    directory = tempfile.mkdtemp()
+    database = os.path.join(directory, "racecontrol.db")
+    process = mp.Process(target=server.serve, kwargs={
+        "host": "127.0.0.1",
+        "port": args.port,
+        "server": server_type,
+        "workers": args.workers,
+        "threads": args.threads,
+        "config": {"SQLALCHEMY_DATABASE_URI": f"sqlite:///{database}",
+                   "ASSETS_BUILD_DIR": os.path.join(directory, "assets")}
+        })
+    process.start()
+    try:
+        wait_for_port(args.port, 30)
+        seed(args.port, args.entries)
+        pages = {name: load_page(args.port, path, args)
+                 for name, path in PAGES.items()}
+    finally:
+        stopped = time.monotonic()
+        process.terminate()
+        process.join()
+    return {
+            "server": server_type,
+            "pages": pages,
+            "shutdown_s": time.monotonic() - stopped
+            }
+
+
+def main():
+    """ Entry point """
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--servers", nargs="+",
+                        default=[server.SERVER_DEVELOPMENT,
+                                 server.SERVER_GUNICORN])
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--entries", type=int, default=20,
+                        help="Drivers and cars added before the run")
+    parser.add_argument("--duration", type=float, default=5,
+                        help="Seconds per page")
+    parser.add_argument("--port", type=int, default=5051)
+    parser.add_argument("--output", help="Write the results as JSON")
+    args = parser.parse_args()
+
+    results = []
+    for server_type in args.servers:
+        result = run(server_type, args)
+        results.append(result)
+        for name, page in result["pages"].items():
+            print(f"{server_type:>12} {name:>8} "
+                  f"{page['requests_per_second']:>8.0f} req/s "
+                  f"p99 {page['latency_ms']['p99']:>7.1f}ms "
+                  f"{page['errors']:>4} errors")
+
+    if args.output:
+        write_report(args.output, "webui_load", vars(args), results)
+    else:
+        print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
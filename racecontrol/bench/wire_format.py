@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+"""
+    racecontrol.bench.wire_format
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Compares JSON and the binary wire format: encode/decode cost and bytes on
+    the wire for snapshots and deltas
+
+    :author: Matthias Riegler, 2018
+    :license: aGPLv3, see LICENSE.md for more details.
+"""
+
+
+import argparse
+import json
+import timeit
+from .. import messages
+from .. import wire
+from ..game import race_states
+from .report import write_report
+
+
+def build_snapshot(num_drivers):
+    """ Snapshot of a race in progress, decoded as a client would see it """
+    packet = {
+            "status": race_states.STARTED,
+            "positions": [[driver, 100 - driver]
+                          for driver in range(num_drivers)],
+            "type": messages.REDIS_MSG_TYPE_STATE_PUSH,
+            "seq": 1234
+            }
+    for driver in range(num_drivers):
+        packet[str(driver)] = {
+                "lap_count": 100 - driver,
+                "best_time": 7412 + driver,
+                "lap_time": 7999 + driver,
+                "best_lap": 42
+                }
+    return packet
+
+
+def build_delta(num_drivers):
+    """ Typical delta, one driver finished a lap and overtook another """
+    return {
+            "type": messages.REDIS_MSG_TYPE_STATE_DELTA,
+            "seq": 1235,
+            "base": 1234,
+            "drivers": {"1": {"lap_count": 100,
+                              "best_time": 7413,
+                              "lap_time": 7501,
+                              "best_lap": 42}},
+            "ranks": [[0, 1, 100], [1, 0, 100]]
+            }
+
+
+def measure(packet, iterations):
+    """ Measures one packet in both formats
+
+    :returns: dict with bytes and microseconds per encode/decode
+    """
+    text = json.dumps(packet)
+    binary = wire.encode(packet)
+    assert wire.decode(binary) == json.loads(text)
+
+    def usec(stmt):
+        return timeit.timeit(stmt, number=iterations) / iterations * 1e6
+
+    return {
+            "json_bytes": len(text.encode()),
+            "binary_bytes": len(binary),
+            "json_encode_us": usec(lambda: json.dumps(packet)),
+            "binary_encode_us": usec(lambda: wire.encode(packet)),
+            "json_decode_us": usec(lambda: json.loads(text)),
+            "binary_decode_us": usec(lambda: wire.decode(binary))
+            }
+
+
+def run(driver_counts, iterations):
+    """ Runs the benchmark
+
+    :returns: list of result dicts
+    """
+    results = []
+    for num_drivers in driver_counts:
+        for kind, packet in (("snapshot", build_snapshot(num_drivers)),
+                             ("delta", build_delta(num_drivers))):
+            results.append({"drivers": num_drivers,
+                            "packet": kind,
+                            **measure(packet, iterations)})
+    return results
+
+
+def main():
+    """ Entry point """
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--drivers", type=int, nargs="+", default=[4, 8, 32])
+    parser.add_argument("--iterations", type=int, default=20000)
+    parser.add_argument("--output", help="Write the results as JSON")
+    args = parser.parse_args()
+
+    results = run(args.drivers, args.iterations)
+
+    print(f"{'drivers':>7} {'packet':>8} {'json B':>7} {'bin B':>6} "
+          f"{'json enc':>9} {'bin enc':>8} {'json dec':>9} {'bin dec':>8}")
+    for r in results:
+        print(f"{r['drivers']:>7} {r['packet']:>8} "
+              f"{r['json_bytes']:>7} {r['binary_bytes']:>6} "
+              f"{r['json_encode_us']:>7.2f}us {r['binary_encode_us']:>6.2f}us "
+              f"{r['json_decode_us']:>7.2f}us {r['binary_decode_us']:>6.2f}us")
+
+    if args.output:
+        write_report(args.output, "wire_format", vars(args), results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+"""
+    racecontrol.channels
+    ~~~~~~~~~~~~~~~~~~~~
+
+    Channel namespace of the races. The default race uses the plain channels,
+    every other race gets its id appended, e.g. `game_events:track2`.
+
+    :author: Matthias Riegler, 2018
+    :license: aGPLv3, see LICENSE.md for more details.
+"""
+
+
+import re
+from . import defaults
+
+
+SEPARATOR = ":"
+
+_RACE_ID = re.compile(r"[A-Za-z0-9_-]{1,32}")
+
+
+def valid_race_id(race_id):
+    """ :returns: True if `race_id` can be used in a channel name """
+    return isinstance(race_id, str) and \
+        _RACE_ID.fullmatch(race_id) is not None
+
+
+def race_channel(channel, race_id=defaults.DEFAULT_RACE_ID):
+    """ Channel of a race
+
+    :param channel: Plain channel, e.g. `defaults.OUTGOING_EVENT_CHANNEL`
+    :param race_id: Race id
+    :returns: Channel name
+    """
+    if race_id == defaults.DEFAULT_RACE_ID:
+        return channel
+    return f"{channel}{SEPARATOR}{race_id}"
+
+
+def channel_pattern(channel):
+    """ :returns: Pattern matching the channel of every race """
+    return f"{channel}*"
@@ -11,3 +11,5 @@
 
 
 from .redis_websocket_relay import RedisWebsocketRelay
+from .relay_workers import RelayWorkerPool
+from .track_race_communicator import TrackRaceCommunicator
@@ -0,0 +1,428 @@
+# -*- coding: utf-8 -*-
+"""
+    racecontrol.comm.fanout_hub
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Single Redis subscription which is fanned out in-process to every
+    connected websocket client
+
+    :author: Matthias Riegler, 2018
+    :license: aGPLv3, see LICENSE.md for more details.
+"""
+
+
+import collections
+import logging
+import asyncio
+import time
+import aioredis
+import websockets
+from .packet import Packet
+from .state_cache import StateCache
+from .. import channels
+from .. import defaults
+from .. import wire
+from ..game.state_delta import merge_packets
+
+
+logger = logging.getLogger(__name__)
+
+
+class Subscriber(object):
+    """ Websocket client registered at the hub. Its queue is bounded, the
+    pending states of a client which is not keeping up are collapsed into the
+    newest one.
+    """
+
+    def __init__(self, ws, wire_format, race_id=defaults.DEFAULT_RACE_ID,
+                 queue_size=defaults.SUBSCRIBER_QUEUE_SIZE):
+        """ Init
+
+        :param queue_size: Packets queued before pending states are collapsed
+        """
+        # Websocket the messages are relayed to
+        self._ws = ws
+        # Wire format negotiated by the client
+        self._wire_format = wire_format
+        # Race the client follows
+        self._race_id = race_id
+        # (queued at, packet) not yet sent to the websocket
+        self._queue = collections.deque()
+        self._queue_size = queue_size
+        # Set while packets are queued
+        self._ready = asyncio.Event()
+        #: Packets collapsed into a newer state
+        self.collapsed = 0
+        #: Packets dropped, the client resyncs after the gap
+        self.dropped = 0
+
+    def put(self, packet):
+        """ Queues a packet for the subscriber, `None` signals the shutdown
+        of the hub
+        """
+        self._queue.append((time.monotonic(), packet))
+        if len(self._queue) > self._queue_size:
+            self._collapse()
+        self._ready.set()
+
+    def _collapse(self):
+        """ Merges consecutive state packets, a merged packet keeps the time
+        its oldest part was queued
+        """
+        # [queued at, packet, parsed state, merged]
+        entries = []
+        for queued_at, packet in self._queue:
+            state = packet.state if packet is not None else None
+            if entries and state is not None and entries[-1][2] is not None:
+                merged = merge_packets(entries[-1][2], state)
+                if merged is not None:
+                    entries[-1][1:] = [packet, merged, merged is not state]
+                    self.collapsed += 1
+                    continue
+            entries.append([queued_at, packet, state, False])
+
+        # Only unrelated packets are left, drop the oldest ones
+        excess = max(0, len(entries) - self._queue_size)
+        self.dropped += excess
+        self._queue = collections.deque(
+                (queued_at, Packet.from_data(state) if merged else packet)
+                for queued_at, packet, state, merged in entries[excess:])
+
+    async def get(self):
+        """ Waits for the next message
+
+        :returns: Packet or `None` if the hub got closed
+        """
+        while not self._queue:
+            self._ready.clear()
+            await self._ready.wait()
+        return self._queue.popleft()[1]
+
+    @property
+    def ws(self):
+        """ Websocket of the subscriber """
+        return self._ws
+
+    @property
+    def wire_format(self):
+        """ Wire format of the subscriber """
+        return self._wire_format
+
+    @property
+    def race_id(self):
+        """ Race the subscriber follows """
+        return self._race_id
+
+    @property
+    def pending(self):
+        """ Number of queued packets """
+        return len(self._queue)
+
+    @property
+    def lag(self):
+        """ Seconds the oldest queued packet is waiting, 0 if none is """
+        if not self._queue:
+            return 0
+        return time.monotonic() - self._queue[0][0]
+
+    def stats(self):
+        """ :returns: dict with the subscriber statistics """
+        return {
+                "address": self.ws.remote_address,
+                "race_id": self.race_id,
+                "pending": self.pending,
+                "lag_ms": self.lag * 1000,
+                "collapsed": self.collapsed,
+                "dropped": self.dropped
+                }
+
+
+class FanoutHub(object):
+    """ Keeps exactly one subscription on the channels of every race and
+    relays each message to the subscribers of its race
+    """
+
+    def __init__(self, loop, redis_uri, channel,
+                 queue_size=defaults.SUBSCRIBER_QUEUE_SIZE,
+                 max_lag=defaults.SUBSCRIBER_MAX_LAG,
+                 reconnect_delay=defaults.REDIS_RECONNECT_DELAY,
+                 max_reconnect_delay=defaults.REDIS_RECONNECT_MAX_DELAY):
+        """ Init
+
+        :param channel: Plain channel, race channels are derived from it
+        :param queue_size: Packets queued per subscriber before its pending
+                           states are collapsed
+        :param max_lag: Seconds a subscriber may stay behind before it is
+                        disconnected
+        :param reconnect_delay: Seconds to wait before resubscribing
+        :param max_reconnect_delay: Longest wait between two attempts
+        """
+        # Event loop
+        self._loop = loop
+        # Redis URI
+        self._redis_uri = redis_uri
+        # Channel to subscribe to
+        self._channel_name = channel
+
+        self._queue_size = queue_size
+        self._max_lag = max_lag
+        self._reconnect_delay = reconnect_delay
+        self._max_reconnect_delay = max_reconnect_delay
+
+        # Channel name -> subscribers
+        self._subscribers = {}
+        # Channel name -> latest full state, sent to new subscribers
+        self._states = {}
+        # Channel name -> future resolved on the next state change, shared
+        # by every poller waiting on the channel
+        self._changes = {}
+        #: Subscribers disconnected for staying behind
+        self.slow_disconnects = 0
+        #: Subscriptions renewed after redis went away
+        self.reconnects = 0
+
+        self._redis = None
+        self._reader_task = None
+
+    async def start(self):
+        """ Connects to redis, subscribes and starts relaying """
+        channel = await self._subscribe()
+        self._reader_task = self.loop.create_task(self._reader(channel))
+
+    async def _subscribe(self):
+        """ Opens the connection and subscribes to the channels of every race
+
+        :returns: Pattern channel
+        """
+        self._redis = await aioredis.create_redis(self.redis_uri)
+        channel = (await self._redis.psubscribe(
+            channels.channel_pattern(self.channel_name)))[0]
+        logger.info(f"Subscribed to {self.channel_name}")
+        return channel
+
+    async def _reader(self, channel):
+        """ Reads messages from the pubsub channel and fans them out, the
+        subscription is renewed whenever redis goes away
+        """
+        while True:
+            try:
+                while await channel.wait_message():
+                    name, data = await channel.get()
+                    # Decode only once, every subscriber gets the same packet
+                    self._publish(Packet(data.decode()), name.decode())
+            except (OSError, aioredis.RedisError) as e:
+                logger.warning(f"Subscription on {self.channel_name}: {e!r}")
+
+            logger.warning(f"Subscription on {self.channel_name} closed")
+            self._forget_states()
+            channel = await self._resubscribe()
+
+    def _forget_states(self):
+        """ Drops the cached states, packets were missed while redis was
+        away. Pollers are woken up and learn that the state is unknown.
+        """
+        self._states.clear()
+        for name in list(self._changes):
+            self._notify(name)
+
+    async def _resubscribe(self):
+        """ Reconnects until redis accepts the subscription again
+
+        :returns: Pattern channel
+        """
+        self._redis.close()
+        delay = self._reconnect_delay
+        while True:
+            await asyncio.sleep(delay)
+            try:
+                channel = await self._subscribe()
+            except (OSError, aioredis.RedisError) as e:
+                logger.warning(f"Resubscribing to {self.channel_name} "
+                               + f"failed: {e!r}")
+                self._redis.close()
+                delay = min(delay * 2, self._max_reconnect_delay)
+            else:
+                self.reconnects += 1
+                return channel
+
+    def publish(self, packet, race_id=defaults.DEFAULT_RACE_ID):
+        """ Passes a packet to every subscriber of a race
+
+        :param packet: Packet to relay
+        :param race_id: Race id
+        """
+        self._publish(packet, channels.race_channel(self.channel_name,
+                                                    race_id))
+
+    def _publish(self, packet, channel_name):
+        """ Passes a packet to every subscriber of a channel """
+        cache = self._states.get(channel_name)
+        if cache is None:
+            cache = self._states[channel_name] = StateCache()
+        if cache.update(packet):
+            self._notify(channel_name)
+
+        slow = []
+        for subscriber in self._subscribers.get(channel_name, ()):
+            subscriber.put(packet)
+            if subscriber.lag > self._max_lag:
+                slow.append(subscriber)
+
+        for subscriber in slow:
+            self._disconnect_slow(subscriber)
+
+    def _notify(self, channel_name):
+        """ Wakes up the pollers waiting for a change of the state """
+        change = self._changes.pop(channel_name, None)
+        if change is not None and not change.done():
+            change.set_result(None)
+
+    def state(self, race_id=defaults.DEFAULT_RACE_ID):
+        """ Latest full state of a race
+
+        :param race_id: Race id
+        :returns: StateCache, None if no state was relayed yet
+        """
+        cache = self._states.get(channels.race_channel(self.channel_name,
+                                                       race_id))
+        return cache if cache is not None and cache.seq is not None else None
+
+    async def wait_for_change(self, race_id=defaults.DEFAULT_RACE_ID,
+                              etag=None, timeout=None):
+        """ Waits until the state of a race differs from the one a client has
+
+        :param race_id: Race id
+        :param etag: Entity tag of the state the client has
+        :param timeout: Seconds to wait at most
+        :returns: StateCache, None if the state is unknown
+        """
+        state = self.state(race_id)
+        if state is not None and state.etag != etag:
+            return state
+
+        name = channels.race_channel(self.channel_name, race_id)
+        change = self._changes.get(name)
+        if change is None:
+            change = self._changes[name] = self.loop.create_future()
+        try:
+            # Shielded, a poller giving up must not cancel the shared future
+            await asyncio.wait_for(asyncio.shield(change), timeout)
+        except asyncio.TimeoutError:
+            pass
+        return self.state(race_id)
+
+    def _disconnect_slow(self, subscriber):
+        """ Disconnects a subscriber which is not keeping up, its client is
+        expected to reconnect and start over with a fresh snapshot
+        """
+        self.unsubscribe(subscriber)
+        self.slow_disconnects += 1
+        logger.warning(f"{subscriber.ws.remote_address} is "
+                       + f"{subscriber.lag:.1f}s behind, disconnecting")
+        self.loop.create_task(self._close(subscriber.ws))
+
+    async def _close(self, ws):
+        """ Closes a websocket, the handshake is given up after the close
+        timeout
+        """
+        try:
+            await ws.close(code=1013, reason="Not keeping up")
+        except websockets.exceptions.ConnectionClosed:
+            pass
+
+    def subscribe(self, ws, wire_format=wire.FORMAT_JSON,
+                  race_id=defaults.DEFAULT_RACE_ID):
+        """ Registers a websocket at the hub
+
+        :param ws: websocket
+        :param wire_format: Format the packets are sent in
+        :param race_id: Race the websocket follows
+        :returns: Subscriber
+        """
+        name = channels.race_channel(self.channel_name, race_id)
+        subscriber = Subscriber(ws, wire_format, race_id, self._queue_size)
+        self._subscribers.setdefault(name, set()).add(subscriber)
+
+        # Start the client off with the latest state, deltas follow on it
+        cache = self._states.get(name)
+        if cache is not None and cache.packet is not None:
+            subscriber.put(cache.packet)
+        logger.debug(f"{self.subscriber_count} subscribers registered")
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        """ Removes a subscriber from the hub
+
+        :param subscriber: Subscriber returned by `subscribe`
+        """
+        name = channels.race_channel(self.channel_name, subscriber.race_id)
+        subscribers = self._subscribers.get(name)
+        if subscribers is not None:
+            subscribers.discard(subscriber)
+            if not subscribers:
+                del self._subscribers[name]
+
+    async def close(self):
+        """ Stops relaying, wakes up all subscribers and closes the redis
+        connection
+        """
+        if self._reader_task:
+            self._reader_task.cancel()
+
+        for subscribers in self._subscribers.values():
+            for subscriber in subscribers:
+                subscriber.put(None)
+        self._subscribers.clear()
+
+        # Pollers answer with what they have
+        for name in list(self._changes):
+            self._notify(name)
+
+        if self._redis:
+            self._redis.close()
+            await self._redis.wait_closed()
+
+        logger.info(f"Unsubscribed from {self.channel_name}")
+
+    @property
+    def loop(self):
+        """ Event loop """
+        return self._loop
+
+    @property
+    def redis_uri(self):
+        """ Redis uri """
+        return self._redis_uri
+
+    @property
+    def channel_name(self):
+        """ Channel the hub is subscribed to """
+        return self._channel_name
+
+    @property
+    def subscriber_count(self):
+        """ Number of registered subscribers """
+        return sum(len(s) for s in self._subscribers.values())
+
+    def subscriber_counts(self):
+        """ :returns: dict with the number of subscribers per channel """
+        return {name: len(s) for name, s in self._subscribers.items()}
+
+    def cached_seqs(self):
+        """ :returns: dict with the sequence number of the cached state per
+                  channel, None if it is unknown
+        """
+        return {name: cache.seq for name, cache in self._states.items()}
+
+    def subscriber_stats(self, limit=None):
+        """ Statistics of the subscribers, the ones lagging most first
+
+        :param limit: Maximum number of subscribers reported
+        :returns: list of `Subscriber.stats`
+        """
+        subscribers = sorted(
+                (subscriber
+                 for subscribers in self._subscribers.values()
+                 for subscriber in subscribers),
+                key=lambda subscriber: subscriber.lag, reverse=True)
+        return [subscriber.stats() for subscriber in subscribers[:limit]]
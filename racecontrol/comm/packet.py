@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+"""
+    racecontrol.comm.packet
+    ~~~~~~~~~~~~~~~~~~~~~~~
+
+    Game event received from redis, shared by every subscriber of the hub
+
+    :author: Matthias Riegler, 2018
+    :license: aGPLv3, see LICENSE.md for more details.
+"""
+
+
+import json
+import struct
+from .. import wire
+from ..game.state_delta import is_state_packet
+
+
+class Packet(object):
+    """ Message pushed by the game. Parsing and the binary encoding happen at
+    most once, no matter how many clients receive the packet. Latency traces
+    are taken off, clients never see them.
+    """
+
+    __slots__ = ("_text", "_data", "_binary", "_traces")
+
+    def __init__(self, text):
+        """ Init
+
+        :param text: Decoded JSON message
+        """
+        self._text = text
+        self._data = None
+        self._binary = None
+        # Traces attached by the game, until they are finished
+        self._traces = None
+        if '"traces"' in text:
+            self._strip_traces()
+
+    def _strip_traces(self):
+        """ Moves the traces out of the message """
+        try:
+            data = self.data
+        except ValueError:
+            return
+        if isinstance(data, dict) and "traces" in data:
+            self._traces = data.pop("traces")
+            self._text = json.dumps(data)
+
+    @classmethod
+    def from_data(cls, data):
+        """ Creates a packet from parsed JSON, e.g. a merged state
+
+        :param data: JSON serializable packet
+        :returns: Packet
+        """
+        packet = cls(json.dumps(data))
+        packet._data = data
+        return packet
+
+    @property
+    def text(self):
+        """ JSON representation """
+        return self._text
+
+    @property
+    def data(self):
+        """ Parsed JSON """
+        if self._data is None:
+            self._data = json.loads(self._text)
+        return self._data
+
+    def pop_traces(self):
+        """ Latency traces attached by the game, see `racecontrol.tracing`.
+        They are handed out once, so every trace is finished once per packet
+        and not once per client.
+
+        :returns: list of traces, empty after the first call
+        """
+        traces, self._traces = self._traces, None
+        return traces if isinstance(traces, list) else []
+
+    @property
+    def state(self):
+        """ Parsed snapshot or delta, None for any other message """
+        try:
+            data = self.data
+        except ValueError:
+            return None
+        return data if is_state_packet(data) else None
+
+    def encoded(self, wire_format):
+        """ Representation in the given wire format
+
+        :param wire_format: wire.FORMAT_JSON or wire.FORMAT_BINARY
+        :returns: str or bytes; non state packets are always sent as JSON
+        """
+        if wire_format == wire.FORMAT_BINARY:
+            if self._binary is None:
+                try:
+                    self._binary = wire.encode(self.data) or self._text
+                except (ValueError, KeyError, TypeError, struct.error):
+                    # Not a well formed state packet, relay it as it is
+                    self._binary = self._text
+            return self._binary
+
+        return self._text
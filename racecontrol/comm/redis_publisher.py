@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+"""
+    racecontrol.comm.redis_publisher
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Shared publisher for a Redis channel, backed by a single connection
+
+    :author: Matthias Riegler, 2018
+    :license: aGPLv3, see LICENSE.md for more details.
+"""
+
+
+import logging
+import asyncio
+import aioredis
+from .. import defaults
+
+
+logger = logging.getLogger(__name__)
+
+
+class RedisPublisher(object):
+    """ Publishes messages to a Redis channel on behalf of many clients.
+
+    Messages are queued in arrival order and written by a single writer task
+    which pipelines everything queued in the meantime, so ordering is kept
+    while reconnecting clients do not open connections on their own. The
+    writer is the only user of the connection, more would not be used.
+    """
+
+    def __init__(
+            self,
+            loop,
+            redis_uri,
+            channel,
+            batch_size=defaults.REDIS_PUBLISH_BATCH_SIZE,
+            queue_size=defaults.REDIS_PUBLISH_QUEUE_SIZE,
+            retry_delay=defaults.REDIS_PUBLISH_RETRY_DELAY
+            ):
+        """ Init """
+        # Event loop
+        self._loop = loop
+        # Redis URI
+        self._redis_uri = redis_uri
+        # Channel to publish to
+        self._channel = channel
+        # Maximum number of messages per pipeline
+        self._batch_size = batch_size
+        # Seconds to wait after a failed write
+        self._retry_delay = retry_delay
+
+        # Pending (message, channel, future), bounded to push back on clients
+        self._queue = asyncio.Queue(maxsize=queue_size)
+
+        self._redis = None
+        self._writer_task = None
+
+    async def start(self):
+        """ Connects and starts the writer """
+        # A pool of one, it reconnects after redis restarted
+        self._redis = await aioredis.create_redis_pool(
+                self.redis_uri,
+                minsize=1,
+                maxsize=1)
+
+        self._writer_task = self.loop.create_task(self._writer())
+        logger.info(f"Publisher for {self.channel} started")
+
+    async def publish(self, msg, channel=None):
+        """ Publishes a message and waits until redis acknowledged it
+
+        :param msg: Message to send, string or bytestring
+        :param channel: Channel to publish to instead of the default one
+        :returns: Receiver count
+        """
+        if self._writer_task is None or self._writer_task.done():
+            raise RuntimeError(f"Publisher for {self.channel} is not running")
+
+        fut = self.loop.create_future()
+        await self._queue.put((msg, channel or self.channel, fut))
+        return await fut
+
+    async def _writer(self):
+        """ Writes queued messages in batches """
+        while True:
+            batch = [await self._queue.get()]
+            while len(batch) < self._batch_size and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+
+            try:
+                pipe = self._redis.pipeline()
+                for msg, channel, _ in batch:
+                    pipe.publish(channel, msg)
+                results = await pipe.execute()
+            except Exception as e:
+                # Redis errors as well as refused reconnects, the writer has
+                # to keep running for the next batch
+                logger.error(f"Publishing to {self.channel} failed: {e!r}")
+                for _, _, fut in batch:
+                    if not fut.done():
+                        fut.set_exception(e)
+                await asyncio.sleep(self._retry_delay)
+            else:
+                for (_, _, fut), receivers in zip(batch, results):
+                    if not fut.done():
+                        fut.set_result(receivers)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    async def close(self, timeout=defaults.REDIS_PUBLISH_CLOSE_TIMEOUT):
+        """ Flushes pending messages and closes the connection
+
+        :param timeout: Seconds to wait for pending messages
+        """
+        if self._writer_task is None:
+            return
+
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout=timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Dropping {self._queue.qsize()} pending messages")
+
+        self._writer_task.cancel()
+
+        # Wake up everyone still waiting for an acknowledgement
+        while not self._queue.empty():
+            _, _, fut = self._queue.get_nowait()
+            if not fut.done():
+                fut.cancel()
+
+        self._redis.close()
+        await self._redis.wait_closed()
+        logger.info(f"Publisher for {self.channel} closed")
+
+    @property
+    def loop(self):
+        """ Event loop """
+        return self._loop
+
+    @property
+    def redis_uri(self):
+        """ Redis uri """
+        return self._redis_uri
+
+    @property
+    def channel(self):
+        """ Channel messages are published to """
+        return self._channel
@@ -13,10 +13,19 @@
 
 import logging
 import asyncio
-import aioredis
+import json
+import math
+import os
 import websockets
 import functools
+from http import HTTPStatus
+from urllib.parse import parse_qs, urlsplit
+from .. import channels
 from .. import defaults
+from .. import tracing
+from .. import wire
+from .fanout_hub import FanoutHub
+from .redis_publisher import RedisPublisher
 
 
 logger = logging.getLogger(__name__)
@@ -36,9 +45,19 @@ class RedisWebsocketRelay(object):
             outgoing_event_channel=defaults.OUTGOING_EVENT_CHANNEL,
             incoming_event_channel=defaults.INCOMING_EVENT_CHANNEL,
             outgoing_websocket_path=defaults.WEBSOCKET_STREAM_PATH,
-            incoming_websocket_path=defaults.WEBSOCKET_INPUT_PATH
+            incoming_websocket_path=defaults.WEBSOCKET_INPUT_PATH,
+            stats_path=defaults.WEBSOCKET_STATS_PATH,
+            state_path=defaults.WEBSOCKET_STATE_PATH,
+            race_ids=defaults.RACE_IDS,
+            reuse_port=False
             ):
-        """ Initializes the Redis websocket Relay """
+        """ Initializes the Redis websocket Relay
+
+        :param race_ids: Races clients may connect to, the default race is
+                         served on the plain paths, every other one on
+                         `<path>/<race_id>`
+        :param reuse_port: Share the port with other relay processes
+        """
         # Event loop
         self._loop = loop
         # Redis URI
@@ -55,23 +74,45 @@ class RedisWebsocketRelay(object):
         self._outgoing_websocket_path = outgoing_websocket_path
         # Websocket input path
         self._incoming_websocket_path = incoming_websocket_path
+        # Plain HTTP path serving the relay statistics
+        self._stats_path = stats_path
+        # Plain HTTP path serving the latest race state
+        self._state_path = state_path
+        # Races served
+        self._race_ids = frozenset(race_ids)
+
+        # One subscription on the outgoing channels shared by every client
+        self._hub = FanoutHub(loop=self.loop,
+                              redis_uri=self.redis_uri,
+                              channel=self.outgoing_event_channel)
+        self.loop.run_until_complete(self._hub.start())
+
+        # Pooled publisher shared by every input client
+        self._publisher = RedisPublisher(loop=self.loop,
+                                         redis_uri=self.redis_uri,
+                                         channel=self.incoming_event_channel)
+        self.loop.run_until_complete(self._publisher.start())
 
         # Create Websocket server
-        self.loop.run_until_complete(
+        self._server = self.loop.run_until_complete(
                 websockets.serve(
                     functools.partial(RedisWebsocketRelay.relay, self),
                     self.host,
-                    self.port))
+                    self.port,
+                    subprotocols=wire.SUBPROTOCOLS,
+                    process_request=self.process_request,
+                    reuse_port=reuse_port))
 
         logger.info("Created websocket server")
 
-    async def get_pubsub(self, channel):
-        """ Actual relay for gameserver events """
-        # Connect to the local running redis server
-        redis = await aioredis.create_redis(self.redis_uri)
-
-        # Return the pubsub channel
-        return (await redis.subscribe(channel))[0]
+    async def close(self):
+        """ Closes the websocket server and the shared redis subscription """
+        self._server.close()
+        # Releases the subscribers and pollers the server waits for
+        await self._hub.close()
+        await self._server.wait_closed()
+        await self._publisher.close()
+        logger.info("Closed websocket relay")
 
     async def dead_end_checker(self, ws):
         """ Helper for detecting closed connections """
@@ -89,30 +130,134 @@ class RedisWebsocketRelay(object):
             # Check every 10 seconds
             await asyncio.sleep(10)
 
-    async def game_event_producer(self, ws):
+    async def game_event_producer(self, ws, wire_format=wire.FORMAT_JSON,
+                                  race_id=defaults.DEFAULT_RACE_ID):
         """ Actual relay for gameserver events """
-        # Get the pubsub channel
-        pubsub = await self.get_pubsub(self.outgoing_event_channel)
-
-        # Just relay json messages to the ws
-        while await pubsub.wait_message():
-            msg = (await pubsub.get()).decode()
-            try:
-                await ws.send(msg)
-            except websockets.exceptions.ConnectionClosed:
-                break
-
-    async def input_event_consumer(self, ws):
-        """ Relays incoming messages to a pubsub channel """
-        # Connect to redis
-        pub = await aioredis.create_redis(self.redis_uri)
-
-        async for message in ws:
-            try:
-                # Forward incoming messages to the pubsub channel
-                pub.publish(self.incoming_event_channel, message)
-            except websockets.exceptions.ConnectionClosed:
-                break
+        # Register at the shared subscription
+        subscriber = self._hub.subscribe(ws, wire_format, race_id)
+
+        try:
+            # Relay packets in the format the client asked for
+            while True:
+                packet = await subscriber.get()
+                # Hub closed
+                if packet is None:
+                    break
+                await ws.send(packet.encoded(subscriber.wire_format))
+
+                # Finished by the first client the packet was sent to
+                for trace in packet.pop_traces():
+                    tracing.tracer.finish(trace, tracing.HOP_SEND)
+
+        except websockets.exceptions.ConnectionClosed:
+            pass
+
+        finally:
+            self._hub.unsubscribe(subscriber)
+
+    async def input_event_consumer(self, ws,
+                                   race_id=defaults.DEFAULT_RACE_ID):
+        """ Relays incoming messages to the pubsub channel of a race """
+        channel = channels.race_channel(self.incoming_event_channel, race_id)
+        try:
+            async for message in ws:
+                # Forward incoming messages to the pubsub channel, awaiting
+                # keeps the order of the messages sent by this client
+                try:
+                    await self._publisher.publish(self._trace_input(message),
+                                                  channel)
+                except Exception as e:
+                    # Redis is away, the client stays connected
+                    logger.warning(f"Dropped input for {channel}: {e!r}")
+        except websockets.exceptions.ConnectionClosed:
+            pass
+
+    def _trace_input(self, message):
+        """ Starts the round trip trace of a UI command
+
+        :param message: Message received on the input path
+        :returns: Message with the trace attached, unchanged if it is no JSON
+                  object
+        """
+        try:
+            request = json.loads(message)
+        except ValueError:
+            return message
+
+        if not isinstance(request, dict):
+            return message
+
+        request["trace"] = tracing.tracer.start(tracing.HOP_INPUT)
+        return json.dumps(request)
+
+    def stats(self):
+        """ :returns: dict with the relay statistics """
+        return {
+                "subscribers": self._hub.subscriber_count,
+                "subscribers_by_channel": self._hub.subscriber_counts(),
+                "clients": self._hub.subscriber_stats(
+                    defaults.RELAY_STATS_CLIENTS),
+                "slow_disconnects": self._hub.slow_disconnects,
+                "reconnects": self._hub.reconnects,
+                "cached_seqs": self._hub.cached_seqs(),
+                "pid": os.getpid(),
+                "latency_ms": tracing.tracer.summary()
+                }
+
+    async def process_request(self, path, request_headers):
+        """ Serves plain HTTP requests before the websocket handshake
+
+        :returns: None to continue with the handshake, or a HTTP response
+        """
+        url = urlsplit(path)
+        if url.path == self.stats_path:
+            return (HTTPStatus.OK,
+                    [("Content-Type", "application/json")],
+                    json.dumps(self.stats()).encode())
+
+        race_id = self._race_of(url.path, self.state_path)
+        if race_id:
+            return await self.state_response(race_id, url.query,
+                                             request_headers)
+
+        return None
+
+    async def state_response(self, race_id, query, request_headers):
+        """ Serves the cached state of a race. A client sending the ETag of
+        the state it has gets 304 Not Modified, with `?wait=<seconds>` the
+        answer is held back until the state changes.
+
+        :param race_id: Race id
+        :param query: Query string of the request
+        :param request_headers: Request headers
+        :returns: HTTP response
+        """
+        try:
+            wait = float(parse_qs(query).get("wait", ["0"])[-1])
+        except ValueError:
+            wait = None
+        # nan and inf can not be clamped
+        if wait is None or not math.isfinite(wait):
+            return (HTTPStatus.BAD_REQUEST, [], b"Invalid wait\n")
+        wait = min(max(wait, 0), defaults.STATE_POLL_MAX_WAIT)
+        known = _entity_tags(request_headers.get("If-None-Match"))
+
+        state = self._hub.state(race_id)
+        if wait and (state is None or _matches(known, state.etag)):
+            state = await self._hub.wait_for_change(
+                    race_id, state.etag if state else None, wait)
+
+        if state is None:
+            return (HTTPStatus.SERVICE_UNAVAILABLE,
+                    [("Retry-After", "1")],
+                    b"No state received yet\n")
+
+        headers = [("ETag", state.etag), ("Cache-Control", "no-cache")]
+        if _matches(known, state.etag):
+            return (HTTPStatus.NOT_MODIFIED, headers, b"")
+        return (HTTPStatus.OK,
+                headers + [("Content-Type", "application/json")],
+                state.body)
 
     async def relay(self, ws, path):
         """ Most basic real time websocket relay for game events pushed by the
@@ -122,16 +267,22 @@ class RedisWebsocketRelay(object):
         :param path: Connection path
         """
         tasks = []
+        route = urlsplit(path).path
+        outgoing_race = self._race_of(route, self.outgoing_websocket_path)
+        incoming_race = self._race_of(route, self.incoming_websocket_path)
 
         # Outgoing
-        if path == self.outgoing_websocket_path:
-            logger.debug("Startup game event producer")
-            tasks.append(self.loop.create_task(self.game_event_producer(ws)))
+        if outgoing_race:
+            wire_format = wire.negotiate(path, ws.subprotocol)
+            logger.debug(f"Startup game event producer ({wire_format})")
+            tasks.append(self.loop.create_task(
+                self.game_event_producer(ws, wire_format, outgoing_race)))
 
         # Incoming
-        elif path == self.incoming_websocket_path:
+        elif incoming_race:
             logger.debug("Start input event consumer")
-            tasks.append(self.loop.create_task(self.input_event_consumer(ws)))
+            tasks.append(self.loop.create_task(
+                self.input_event_consumer(ws, incoming_race)))
 
         # Default: Drop
         else:
@@ -145,7 +296,12 @@ class RedisWebsocketRelay(object):
         tasks.append(self.loop.create_task(self.dead_end_checker(ws)))
         logger.debug(f"{ws.remote_address} started dead end checker")
 
-        # wait for one of the two to terminate
+        # A closed connection ends the handler right away, the server waits
+        # for its handlers when it shuts down
+        tasks.append(self.loop.create_task(ws.wait_closed()))
+
+        # wait for the relay task, the dead end checker or the closed
+        # connection, whichever terminates first
         done, pending = await asyncio.wait(
             tasks,
             return_when=asyncio.FIRST_COMPLETED,
@@ -157,11 +313,31 @@ class RedisWebsocketRelay(object):
 
         logger.info(f"{ws.remote_address} disconnected")
 
+    def _race_of(self, route, base_path):
+        """ Resolves the race a path belongs to
+
+        :param route: Requested path without the query
+        :param base_path: Path of the default race
+        :returns: Race id or None if the path does not belong to a race
+        """
+        if route == base_path:
+            race_id = defaults.DEFAULT_RACE_ID
+        elif route.startswith(base_path + "/"):
+            race_id = route[len(base_path) + 1:]
+        else:
+            return None
+        return race_id if race_id in self._race_ids else None
+
     @property
     def loop(self):
         """ Eventloop the relay is running on """
         return self._loop
 
+    @property
+    def hub(self):
+        """ Fan-out hub of the outgoing event channel """
+        return self._hub
+
     @property
     def host(self):
         """ IP of the websocket relay """
@@ -196,3 +372,31 @@ class RedisWebsocketRelay(object):
     def incoming_websocket_path(self):
         """ incoming websocket stream path"""
         return self._incoming_websocket_path
+
+    @property
+    def stats_path(self):
+        """ HTTP path of the relay statistics """
+        return self._stats_path
+
+    @property
+    def state_path(self):
+        """ HTTP path of the latest race state """
+        return self._state_path
+
+
+def _entity_tags(header):
+    """ Parses an If-None-Match header
+
+    :param header: Header value, None if it was not sent
+    :returns: frozenset of the entity tags, weak ones compare equal to
+              strong ones
+    """
+    if not header:
+        return frozenset()
+    return frozenset(tag.strip().replace("W/", "", 1)
+                     for tag in header.split(","))
+
+
+def _matches(known, etag):
+    """ :returns: True if the client has the state with the entity tag """
+    return etag in known or "*" in known
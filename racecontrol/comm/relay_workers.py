@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+"""
+    racecontrol.comm.relay_workers
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Runs the websocket relay in worker processes sharing the listening port
+    with SO_REUSEPORT. Every worker has its own event loop and redis
+    subscription, the kernel spreads new connections over the workers.
+
+    :author: Matthias Riegler, 2018
+    :license: aGPLv3, see LICENSE.md for more details.
+"""
+
+
+import asyncio
+import logging
+import multiprocessing as mp
+import signal
+from .. import defaults
+from .redis_websocket_relay import RedisWebsocketRelay
+
+
+logger = logging.getLogger(__name__)
+
+
+def run_relay_worker(index, relay_kwargs):
+    """ Entry point of a worker process, serves until SIGTERM
+
+    :param index: Worker index, for logging
+    :param relay_kwargs: Keyword arguments of `RedisWebsocketRelay`
+    """
+    logging.basicConfig(level=logging.INFO)
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+
+    relay = RedisWebsocketRelay(loop=loop, reuse_port=True, **relay_kwargs)
+    loop.add_signal_handler(signal.SIGTERM, loop.stop)
+    # The supervisor handles keyboard interrupts
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    logger.info(f"Relay worker {index} serving")
+
+    try:
+        loop.run_forever()
+    finally:
+        loop.run_until_complete(relay.close())
+        loop.close()
+        logger.info(f"Relay worker {index} stopped")
+
+
+class RelayWorkerPool(object):
+    """ Starts the relay workers and restarts the ones which died """
+
+    def __init__(
+            self,
+            num_workers,
+            check_interval=defaults.RELAY_WORKER_CHECK_INTERVAL,
+            stop_timeout=defaults.RELAY_WORKER_STOP_TIMEOUT,
+            **relay_kwargs
+            ):
+        """ Init
+
+        :param num_workers: Number of worker processes
+        :param check_interval: Seconds between two liveness checks
+        :param stop_timeout: Seconds a worker gets to close its connections
+                             before it is killed
+        :param relay_kwargs: Keyword arguments of `RedisWebsocketRelay`
+        """
+        self._num_workers = num_workers
+        self._check_interval = check_interval
+        self._stop_timeout = stop_timeout
+        self._relay_kwargs = relay_kwargs
+        # Fresh interpreters, the workers must not inherit the game loop or
+        # its redis connections
+        self._context = mp.get_context("spawn")
+        # Index -> process
+        self._workers = {}
+        self._stopping = False
+        #: Number of restarted workers
+        self.restarts = 0
+
+    def _spawn(self, index):
+        """ Starts the worker with the given index """
+        process = self._context.Process(
+                target=run_relay_worker,
+                args=(index, self._relay_kwargs),
+                name=f"relay-worker-{index}",
+                daemon=True)
+        process.start()
+        self._workers[index] = process
+        logger.info(f"Started relay worker {index} (pid {process.pid})")
+
+    def start(self):
+        """ Starts every worker """
+        for index in range(self._num_workers):
+            self._spawn(index)
+
+    async def supervise(self):
+        """ Restarts workers which exited, runs until `stop` is called """
+        while not self._stopping:
+            await asyncio.sleep(self._check_interval)
+            for index, process in list(self._workers.items()):
+                if not process.is_alive() and not self._stopping:
+                    logger.error(f"Relay worker {index} exited with "
+                                 + f"{process.exitcode}, restarting")
+                    self.restarts += 1
+                    self._spawn(index)
+
+    def stop(self):
+        """ Stops every worker, they close their connections first """
+        self._stopping = True
+        for process in self._workers.values():
+            if process.is_alive():
+                process.terminate()
+
+        for index, process in self._workers.items():
+            process.join(self._stop_timeout)
+            if process.is_alive():
+                logger.warning(f"Relay worker {index} did not stop, killing")
+                process.kill()
+                process.join()
+
+    @property
+    def pids(self):
+        """ Process ids of the workers """
+        return [process.pid for process in self._workers.values()]
+
+    @property
+    def num_workers(self):
+        """ Number of worker processes """
+        return self._num_workers
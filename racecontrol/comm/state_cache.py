@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+"""
+    racecontrol.comm.state_cache
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Latest full state of a race, kept by the relay so new clients get a
+    snapshot right away instead of asking the game for one, and HTTP pollers
+    get it without touching redis or the game
+
+    :author: Matthias Riegler, 2018
+    :license: aGPLv3, see LICENSE.md for more details.
+"""
+
+
+import zlib
+from .packet import Packet
+from .. import messages
+from ..game.state_delta import apply_delta
+
+
+class StateCache(object):
+    """ Follows the snapshots and deltas of a channel and merges them into
+    the current full state
+    """
+
+    __slots__ = ("_state", "_packet", "_body", "_etag")
+
+    def __init__(self):
+        """ Init """
+        # Current state as snapshot packet, None until the first snapshot
+        self._state = None
+        # Packet of the current state, built on demand
+        self._packet = None
+        # Encoded JSON and entity tag of the current state, built on demand
+        self._body = None
+        self._etag = None
+
+    def update(self, packet):
+        """ Merges a packet relayed on the channel
+
+        :param packet: Packet, anything but snapshots and deltas is ignored
+        :returns: True if the current state changed
+        """
+        state = packet.state
+        if state is None:
+            return False
+
+        if state["type"] == messages.REDIS_MSG_TYPE_STATE_PUSH:
+            self._set(state, packet)
+        elif self._state is not None and state["base"] == self._state["seq"]:
+            self._set(apply_delta(self._state, state))
+        else:
+            # Missed a packet, wait for the next snapshot
+            self._set(None)
+            return False
+
+        return True
+
+    def _set(self, state, packet=None):
+        """ Replaces the current state
+
+        :param state: Snapshot, None if the state is unknown
+        :param packet: Packet of the snapshot if there is one already
+        """
+        self._state = state
+        self._packet = packet
+        self._body = None
+        self._etag = None
+
+    @property
+    def packet(self):
+        """ Snapshot packet of the current state, None if it is unknown """
+        if self._packet is None and self._state is not None:
+            self._packet = Packet.from_data(self._state)
+        return self._packet
+
+    @property
+    def body(self):
+        """ UTF-8 encoded JSON of the current state, None if it is unknown """
+        if self._body is None and self.packet is not None:
+            self._body = self.packet.text.encode()
+        return self._body
+
+    @property
+    def etag(self):
+        """ HTTP entity tag of the current state, None if it is unknown. The
+        sequence number restarts with the game, the checksum tells the states
+        apart anyway.
+        """
+        if self._etag is None and self.body is not None:
+            self._etag = f'"{self.seq}-{zlib.crc32(self.body):08x}"'
+        return self._etag
+
+    @property
+    def seq(self):
+        """ Sequence number of the current state, None if it is unknown """
+        return self._state["seq"] if self._state is not None else None
@@ -1,7 +1,7 @@
 # -*- coding: utf-8 -*-
 """
-    race_communicator.track_communicator
-    ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    racecontrol.comm.track_race_communicator
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 
     Communicates with the track communicator
 
@@ -10,8 +10,15 @@
 """
 
 
+import logging
+import asyncio
+import json
+import struct
 import aioredis
 import asyncserial
+from .. import defaults
+from .. import tracing
+from ..game.events import LapFinished
 
 # ======================================================================
 #                             Protocol description
@@ -20,7 +27,272 @@ import asyncserial
 #
 #       magic     ->  0xbe
 #       trackid   ->  0-3 for the tracks
-#       byte0-3   ->  round time
+#       byte0-3   ->  round time in ms, byte0 is the most significant byte
 #       checksum  ->  xor of <trackid> to <byte3>
 #
 # ======================================================================
+
+FRAME_MAGIC = 0xbe
+FRAME_SIZE = 7
+
+_ROUND_TIME = struct.Struct(">I")
+
+
+logger = logging.getLogger(__name__)
+
+
+class TrackFrameDecoder(object):
+    """ Decodes frames in place from a reusable buffer. Incoming bytes are
+    copied once into the buffer, frames are parsed without slicing and a
+    corrupted stream is resynchronized on the next magic byte.
+    """
+
+    def __init__(self, buffer_size=defaults.TRACK_READ_BUFFER_SIZE):
+        """ Init
+
+        :param buffer_size: Size of the receive buffer, at least one frame
+        """
+        if buffer_size < FRAME_SIZE:
+            raise ValueError(f"Buffer has to hold at least {FRAME_SIZE} bytes")
+
+        self._buffer = bytearray(buffer_size)
+        self._view = memoryview(self._buffer)
+        # First byte not parsed yet
+        self._start = 0
+        # End of the received data
+        self._end = 0
+
+        #: Number of decoded frames
+        self.frames = 0
+        #: Number of frames with an invalid checksum
+        self.checksum_errors = 0
+        #: Number of bytes skipped while resynchronizing
+        self.dropped_bytes = 0
+
+    def feed(self, data):
+        """ Feeds received bytes into the decoder
+
+        :param data: bytes-like object
+        :returns: [(track_id, round_time), ...] of every completed frame
+        """
+        frames = []
+        data = memoryview(data)
+
+        while data:
+            # Move the incomplete tail to the front, it is never longer than
+            # a frame
+            if self._end == len(self._buffer):
+                pending = self._end - self._start
+                self._view[:pending] = self._view[self._start:self._end]
+                self._start, self._end = 0, pending
+
+            count = min(len(data), len(self._buffer) - self._end)
+            self._view[self._end:self._end + count] = data[:count]
+            self._end += count
+            data = data[count:]
+
+            self._parse(frames)
+
+        return frames
+
+    def _parse(self, frames):
+        """ Parses every complete frame in the buffer """
+        buf = self._buffer
+        pos = self._start
+        end = self._end
+
+        while pos < end:
+            if buf[pos] != FRAME_MAGIC:
+                # Out of sync, skip to the next magic byte
+                nxt = buf.find(FRAME_MAGIC, pos + 1, end)
+                nxt = end if nxt < 0 else nxt
+                self.dropped_bytes += nxt - pos
+                pos = nxt
+                continue
+
+            if end - pos < FRAME_SIZE:
+                break
+
+            checksum = buf[pos + 1] ^ buf[pos + 2] ^ buf[pos + 3] ^ \
+                buf[pos + 4] ^ buf[pos + 5]
+
+            if checksum != buf[pos + 6]:
+                # Corrupted or a data byte which looked like the magic byte
+                self.checksum_errors += 1
+                self.dropped_bytes += 1
+                pos += 1
+                continue
+
+            frames.append((buf[pos + 1],
+                           _ROUND_TIME.unpack_from(buf, pos + 2)[0]))
+            self.frames += 1
+            pos += FRAME_SIZE
+
+        self._start = pos
+        if pos == end:
+            # Everything consumed, start at the beginning of the buffer again
+            self._start = self._end = 0
+
+    def stats(self):
+        """ :returns: dict with the decoder counters """
+        return {
+                "frames": self.frames,
+                "checksum_errors": self.checksum_errors,
+                "dropped_bytes": self.dropped_bytes
+                }
+
+
+class TrackRaceCommunicator(object):
+    """ Reads lap events from the track hardware.
+
+    If a game manager running on the same event loop is passed, events are
+    handed to it directly and only mirrored to the track event channel.
+    Otherwise they are published as track events on the incoming event
+    channel.
+    """
+
+    def __init__(
+            self,
+            loop,
+            port=defaults.TRACK_SERIAL_PORT,
+            baudrate=defaults.TRACK_SERIAL_BAUDRATE,
+            redis_uri=defaults.REDIS_URI,
+            incoming_event_channel=defaults.INCOMING_EVENT_CHANNEL,
+            track_event_channel=defaults.TRACK_EVENT_CHANNEL,
+            game_manager=None
+            ):
+        """ Init """
+        # Event loop
+        self._loop = loop
+        # Serial port
+        self._port = port
+        # Baudrate
+        self._baudrate = baudrate
+        # Redis URI
+        self._redis_uri = redis_uri
+        # Incoming game events, e.g. race start/stop
+        self._incoming_event_channel = incoming_event_channel
+        # Mirrored track events, informational only
+        self._track_event_channel = track_event_channel
+
+        # Only use the fast path if the game runs on our event loop
+        if game_manager is not None and game_manager.loop is not loop:
+            logger.warning("Game manager runs on another loop, using redis")
+            game_manager = None
+        self._game_manager = game_manager
+
+        self._decoder = TrackFrameDecoder()
+        self._serial = None
+        self._redis = None
+        self._reader_task = None
+
+        # Events waiting to be mirrored, bounded so a stalled redis does not
+        # pile them up
+        self._mirror_queue = asyncio.Queue(
+                maxsize=defaults.TRACK_MIRROR_QUEUE_SIZE)
+        self._mirror_task = None
+
+    async def start(self):
+        """ Opens the serial port and starts reading """
+        self._redis = await aioredis.create_redis(self.redis_uri)
+        self._serial = asyncserial.Serial(self.loop,
+                                          self.port,
+                                          baudrate=self.baudrate)
+
+        self._reader_task = self.loop.create_task(self._reader())
+        if self._game_manager:
+            self._mirror_task = self.loop.create_task(self._mirror())
+        logger.info(f"Reading track events from {self.port}")
+
+    async def _reader(self):
+        """ Reads everything available and emits the decoded frames """
+        while True:
+            dropped = self._decoder.dropped_bytes
+
+            for track_id, round_time in self._decoder.feed(
+                    await self._serial.read()):
+                await self.on_lap_finished(track_id, round_time)
+
+            if self._decoder.dropped_bytes != dropped:
+                logger.warning(
+                        f"Resynchronized, dropped "
+                        f"{self._decoder.dropped_bytes - dropped} bytes")
+
+    async def on_lap_finished(self, track_id, round_time):
+        """ Emits a lap_finished track event
+
+        :param track_id: Track the lap was finished on
+        :param round_time: Round time in ms
+        """
+        event = LapFinished(track_id, round_time,
+                            tracing.tracer.start(tracing.HOP_DECODE))
+
+        if self._game_manager:
+            self._game_manager.submit_track_event(event)
+            try:
+                self._mirror_queue.put_nowait(event)
+            except asyncio.QueueFull:
+                logger.warning(f"Mirror queue full, not mirroring {event}")
+        else:
+            tracing.tracer.stamp(event.trace, tracing.HOP_PUBLISH)
+            await self._redis.publish(self.incoming_event_channel,
+                                      json.dumps(event.to_request()))
+
+    async def _mirror(self):
+        """ Mirrors events handled in-process to the track event channel """
+        while True:
+            event = await self._mirror_queue.get()
+            try:
+                await self._redis.publish(self.track_event_channel,
+                                          json.dumps(event.to_request()))
+            except aioredis.RedisError as e:
+                logger.error(e)
+
+    async def close(self):
+        """ Stops reading and closes the serial port """
+        if self._reader_task:
+            self._reader_task.cancel()
+        if self._mirror_task:
+            self._mirror_task.cancel()
+        if self._serial:
+            await self._serial.abort()
+        if self._redis:
+            self._redis.close()
+            await self._redis.wait_closed()
+
+        logger.info(f"Closed {self.port}, {self._decoder.stats()}")
+
+    @property
+    def loop(self):
+        """ Event loop """
+        return self._loop
+
+    @property
+    def port(self):
+        """ Serial port """
+        return self._port
+
+    @property
+    def baudrate(self):
+        """ Baudrate """
+        return self._baudrate
+
+    @property
+    def redis_uri(self):
+        """ Redis uri """
+        return self._redis_uri
+
+    @property
+    def incoming_event_channel(self):
+        """ incoming event channel """
+        return self._incoming_event_channel
+
+    @property
+    def track_event_channel(self):
+        """ Channel in-process events are mirrored to """
+        return self._track_event_channel
+
+    @property
+    def decoder(self):
+        """ Frame decoder, provides the frame and drop counters """
+        return self._decoder
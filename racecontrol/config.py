@@ -1,8 +1,34 @@
 # Temporary solution!!!
+import os
+from . import defaults
 
 INITIAL_REDIRECT = "/core"
 SQLALCHEMY_TRACK_MODIFICATIONS = False
 DEBUG = True
 SECRET_KEY = 00000000000000000000000000000000
 SECRET_KEY = 'racecontroll-webui@development'
-SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+SQLALCHEMY_DATABASE_URI = \
+    f"sqlite:///{os.path.abspath(defaults.DATABASE_PATH)}"
+SQLALCHEMY_ENGINE_OPTIONS = {
+    # One connection per web UI thread
+    "pool_size": defaults.WEBUI_THREADS,
+    "max_overflow": 0,
+    "pool_timeout": 10,
+    # Pooled connections are handed from thread to thread
+    "connect_args": {"check_same_thread": False}
+}
+# Applied to every new connection
+SQLITE_PRAGMAS = {
+    # Readers do not block on a writer and the other way round
+    "journal_mode": "WAL",
+    # Safe with WAL, the last commits may be lost on power loss only
+    "synchronous": "NORMAL",
+    "busy_timeout": 5000,
+    "foreign_keys": "ON",
+    "cache_size": -16000,
+    "temp_store": "MEMORY"
+}
+# Fingerprinted static files, None serves the plain static folders only
+ASSETS_BUILD_DIR = os.path.abspath(defaults.ASSETS_BUILD_DIR)
+ASSETS_URL_PATH = "/assets"
+ASSETS_MAX_AGE = defaults.ASSETS_MAX_AGE
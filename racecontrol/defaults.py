@@ -14,7 +14,81 @@ NUM_DRIVERS = 2
 REDIS_URI = "redis://localhost"
 OUTGOING_EVENT_CHANNEL = "game_events"
 INCOMING_EVENT_CHANNEL = "input_events"
+# Track events handled in-process are mirrored here
+TRACK_EVENT_CHANNEL = "track_events"
 WEBSOCKET_STREAM_PATH = "/gamestream"
 WEBSOCKET_INPUT_PATH = "/input"
+WEBSOCKET_STATS_PATH = "/stats"
+# Plain HTTP path serving the latest race state, for clients without
+# websockets
+WEBSOCKET_STATE_PATH = "/state"
+# Seconds a long-poll on the state path waits for a change at most
+STATE_POLL_MAX_WAIT = 30
 WEBSOCKET_HOST = "0.0.0.0"
 WEBSOCKET_PORT = 8765
+REDIS_PUBLISH_BATCH_SIZE = 64
+REDIS_PUBLISH_QUEUE_SIZE = 1024
+REDIS_PUBLISH_CLOSE_TIMEOUT = 2
+# Seconds the publisher waits after a failed write, e.g. while redis restarts
+REDIS_PUBLISH_RETRY_DELAY = 0.5
+# Seconds the relay waits before resubscribing after redis went away,
+# doubled on every failed attempt up to the maximum
+REDIS_RECONNECT_DELAY = 0.5
+REDIS_RECONNECT_MAX_DELAY = 10
+# Packets queued per websocket client, pending states of a client which is
+# not keeping up are collapsed into the newest one
+SUBSCRIBER_QUEUE_SIZE = 4
+# Seconds a websocket client may stay behind before it is disconnected
+SUBSCRIBER_MAX_LAG = 10
+# Clients listed in the relay statistics, the ones lagging most
+RELAY_STATS_CLIENTS = 20
+STATE_DELTA_ENCODING = True
+STATE_SNAPSHOT_INTERVAL = 30
+STATE_PUSH_COALESCE_WINDOW = 0.05
+STATE_PUSH_KEEPALIVE_INTERVAL = 5
+# Serial port of the track communicator, None disables the track reader
+TRACK_SERIAL_PORT = None
+TRACK_SERIAL_BAUDRATE = 115200
+TRACK_READ_BUFFER_SIZE = 4096
+TRACK_MIRROR_QUEUE_SIZE = 256
+TRACE_LOG_INTERVAL = 60
+# Maximum number of traces attached to a single state push
+TRACE_MAX_PER_PUSH = 8
+# Directory of the race journals, None disables journaling
+JOURNAL_DIR = "journal"
+JOURNAL_FLUSH_INTERVAL = 0.05
+# "batch" syncs every write, "interval" at most every JOURNAL_FSYNC_INTERVAL
+# seconds, "never" leaves it to the OS
+JOURNAL_FSYNC_POLICY = "batch"
+JOURNAL_FSYNC_INTERVAL = 1
+# Largest journaled request in bytes, larger ones are not applied
+JOURNAL_MAX_RECORD_SIZE = 1 << 20
+# Races hosted by the game manager, the default race uses the plain channels
+DEFAULT_RACE_ID = "default"
+RACE_IDS = (DEFAULT_RACE_ID,)
+# Requests queued per race before new ones are dropped
+RACE_QUEUE_SIZE = 256
+# Relay worker processes sharing the websocket port, 0 runs the relay on the
+# game loop
+RELAY_WORKERS = 0
+RELAY_WORKER_CHECK_INTERVAL = 1
+RELAY_WORKER_STOP_TIMEOUT = 5
+# Web UI database, relative paths start in the working directory
+DATABASE_PATH = "racecontrol.db"
+# Store finished races with their lap history in the database
+PERSIST_RESULTS = True
+# Fingerprinted and precompressed copies of the web UI static files, built
+# when the web UI starts
+ASSETS_BUILD_DIR = "assets"
+# Seconds browsers may cache a fingerprinted file, its name changes with
+# its content
+ASSETS_MAX_AGE = 365 * 24 * 3600
+# Web based user interface, "gunicorn" or "development"
+WEBUI_SERVER = "gunicorn"
+WEBUI_HOST = "0.0.0.0"
+WEBUI_PORT = 5000
+WEBUI_WORKERS = 1
+WEBUI_THREADS = 8
+WEBUI_KEEPALIVE = 5
+# Seconds requests in flight get to finish on shutdown
+WEBUI_GRACEFUL_TIMEOUT = 10
@@ -10,13 +10,20 @@
 """
 
 import logging
-import asyncio
 import json
+import time
 from pprint import pformat
-from json.decoder import JSONDecodeError
 from .. import defaults
+from .. import tracing
 from . import race_states
 from .driver import Driver
+from .ranking import Ranking
+from .state_delta import StateDeltaEncoder
+from .state_publisher import StatePublisher
+from .task_supervisor import TaskSupervisor
+from .dispatch import handles, handler_table
+from .events import InvalidRequest, Pause, Resync, Start, TrackEvent
+from .events import parse_request
 from .. import messages
 
 
@@ -24,59 +31,83 @@ logger = logging.getLogger(__name__)
 
 
 class BaseRace(object):
-    """ Basis for the different race modes """
+    """ Basis for the different race modes, a mode handles events by marking
+    its methods with `racecontrol.game.dispatch.handles`
+    """
+
+    def __init_subclass__(cls, **kwargs):
+        """ Builds the handler table of the race mode """
+        super().__init_subclass__(**kwargs)
+        cls._handlers = handler_table(cls)
 
     def __init__(
             self,
             game_manager,
             num_drivers=defaults.NUM_DRIVERS,
+            delta_state=defaults.STATE_DELTA_ENCODING,
+            race_id=defaults.DEFAULT_RACE_ID
             ):
         """ Init """
         # Set the number of drivers
         self._num_drivers = num_drivers
+        # Race id, selects the channels of the race
+        self._race_id = race_id
         # Race manager
         self._game_manager = game_manager
+        # Only push changes between two states if enabled
+        self._delta_encoder = StateDeltaEncoder() if delta_state else None
+        # Coalesces state changes into as few pushes as possible
+        self._publisher = StatePublisher(self._push_state)
+        # Traces of the changes not pushed yet
+        self._pending_traces = []
 
         # Initialize game
         self._build_game_state()
         self._started = False
         self._paused = False
         self._finished = False
+        # Unix times, kept with the results
+        self._started_at = None
+        self._finished_at = None
+        # Driver and car database ids per slot, set by the start request
+        self._entries = [{} for _ in range(num_drivers)]
 
         # Initialize task handler
-        self._tasks = []
+        self._supervisor = TaskSupervisor(self.loop)
         self._ensure_future(self._ainit())
         logger.info("Created startup task for the actual race interface")
 
-    def _ensure_future(self, future):
-        """ Adds a future to the task queue, so every running task can be
-        stopped whenever an error occurs or the race finished
-        """
-        self._tasks.append(self.loop.create_task(future))
+    def _ensure_future(self, future, key=None):
+        """ Registers a future at the task supervisor, so every running task
+        can be stopped whenever an error occurs or the race finished
 
-    async def _garbage_collector(self):
-        """ Removes finished coroutines from the task list """
-        while True:
-            for task in self._tasks:
-                if task.done():
-                    self._tasks.remove(task)
-            await asyncio.sleep(1)
+        :param key: Optional key, a second task with the same key is not
+                    started while the first one is running
+        :returns: Task
+        """
+        return self._supervisor.spawn(future, key)
 
     async def _ainit(self):
         """ Initializes connection to pubsub, starts track communicator """
         # Give user code chance to setup the race
         await self.setup_race()
-        self._ensure_future(self._periodic_state_push())
-        # self._ensure_future(self._garbage_collector())
+        self._ensure_future(self._publisher.run(), key="publisher")
+        # Publish the initial state right away
+        self._mark_dirty()
 
-    async def _periodic_state_push(self, sleep_time=1):
-        """ Pushes the game state at a given number of seconds
+    def _mark_dirty(self):
+        """ Schedules a state push, changes made within the coalesce window
+        are published together
+        """
+        self._publisher.mark_dirty()
+
+    def _add_trace(self, trace):
+        """ Attaches a latency trace to the next state push
 
-        :param sleep_time: Number of seconds between state push
+        :param trace: trace, see `racecontrol.tracing`
         """
-        while True:
-            self._ensure_future(self._push_state())
-            await asyncio.sleep(sleep_time)
+        if trace and len(self._pending_traces) < defaults.TRACE_MAX_PER_PUSH:
+            self._pending_traces.append(trace)
 
     def _build_game_state(self):
         """ Initializes the game state """
@@ -87,8 +118,9 @@ class BaseRace(object):
         self._current_state["status"] = race_states.NOT_STARTED
 
         #: Stores the current driver positions
-        self._current_state["positions"] = \
-            [(driver, 0) for driver in range(self.num_drivers)]
+        self._ranking = Ranking(range(self.num_drivers))
+        #: Positions changed since the last push
+        self._moved_positions = set()
 
         # Populate all driver entries
         for driver in range(self.num_drivers):
@@ -99,13 +131,24 @@ class BaseRace(object):
         the websocket connection established by the web based UI
         """
         try:
-            _state_packet = {
-                    **self.current_state,
-                    "type": messages.REDIS_MSG_TYPE_STATE_PUSH
-                    }
+            if self._delta_encoder:
+                _state_packet = self._delta_encoder.encode(
+                        self.current_state, self._moved_positions)
+            else:
+                _state_packet = {
+                        **self.current_state,
+                        "type": messages.REDIS_MSG_TYPE_STATE_PUSH
+                        }
+            self._moved_positions = set()
+
+            if self._pending_traces:
+                for trace in self._pending_traces:
+                    tracing.tracer.stamp(trace, tracing.HOP_PUSH)
+                _state_packet["traces"] = self._pending_traces
+                self._pending_traces = []
 
             _num_receivers = await self.game_manager.push(
-                    json.dumps(_state_packet))
+                    json.dumps(_state_packet), self.race_id)
 
             # Debug output for the current state and receiver count
             logger.debug(f"Current game state received by {_num_receivers} " +
@@ -115,90 +158,164 @@ class BaseRace(object):
         except Exception as e:
             logger.error(e)
 
-    async def _get_driver_lap_count(self):
-        """ Get the lap count for each driver
+    async def _update_positions(self, id):
+        """ Moves a driver in the standings and publish the new state
 
-        :returns: [(driver, lap_count), ...]
+        :param id: Driver whose lap count or race time changed
         """
-        return [(driver, self._current_state[driver].lap_count)
-                for driver in range(self.num_drivers)]
-
-    async def _update_positions(self):
-        """ Update the player positions and publish the new state """
-        self._current_state["positions"] = await self._get_driver_lap_count()
-        self._current_state["positions"].sort(key=lambda d_lc: d_lc[1])
-        self._current_state["positions"].reverse()
+        driver = self._current_state[id]
+        self._moved_positions.update(self._ranking.update(
+                id, driver.lap_count, driver.total_time))
 
         # Update the UI
-        await self._push_state()
+        self._mark_dirty()
 
-    async def _on_lap_finished(self, id, lap_time):
-        """ Called when a driver finishes a lap """
+    async def _on_lap_finished(self, id, lap_time, trace=None):
+        """ Called when a driver finishes a lap
+
+        :param trace: Latency trace of the track event
+        """
 
         # Only perform when the game is running
         if self._current_state["status"] != race_states.STARTED:
             return
 
+        tracing.tracer.stamp(trace, tracing.HOP_LAP)
+        self._add_trace(trace)
+
         self._current_state[id].add_lap(lap_time)
         # Update the driver positions
-        await self._update_positions()
-
-    async def _input_event_consumer(self):
-        """ Input handler for incoming redis requests  """
-        while await self._subscribe.wait_message():
-
-            try:
-                request = await self._subscribe.get_json()
-                if await self._handle_request(request):
-                    self._ensure_future(self._push_state())
-
-            except TypeError as te:
-                logger.warning(te)
-
-            except JSONDecodeError:
-                logger.warning("invalid json request")
+        await self._update_positions(id)
 
     async def handle_request(self, request):
-        """ Handles a request
+        """ Handles a decoded request, e.g. a journaled one
 
         :returns: True if an event was handled, false otherwise. This is needed
                   so that the status can be updated(!!!)
         """
-        if request["request"] == messages.MSG_START:
-            self._ensure_future(self.on_start())
-        elif request["request"] == messages.MSG_PAUSE:
-            self._ensure_future(self.on_pause())
-        elif request["request"] == messages.MSG_TRACK_EVENT:
-            self._ensure_future(self.on_track_event(request))
-        else:
-            logger.warning(f"Could not handle {request}")
+        try:
+            event = parse_request(request)
+        except InvalidRequest as e:
+            logger.warning(f"Invalid request {request}: {e}")
+            return False
+        return self.dispatch(event)
+
+    def dispatch(self, event):
+        """ Passes a typed event to the handler the race mode registered for
+        it, this is the entry point of the in-process fast path as well
+
+        :param event: Event from `racecontrol.game.events`
+        :returns: True if the event was handled
+        """
+        handler = self._handlers.get(type(event))
+        if handler is None:
+            logger.warning(f"{type(self).__name__} does not handle {event}")
             return False
+        if (isinstance(event, TrackEvent)
+                and event.track_id >= self.num_drivers):
+            logger.warning(f"No driver on track {event.track_id}: {event}")
+            return False
+
+        function, is_coroutine = handler
+        if is_coroutine:
+            self._ensure_future(function(self, event))
+        else:
+            function(self, event)
+
+        if not isinstance(event, TrackEvent):
+            # Round trip of UI commands, track events are traced per lap
+            self._add_trace(event.trace)
+        self._mark_dirty()
+        return True
+
+    @handles(Start)
+    async def _handle_start(self, event):
+        """ Assigns the entries and starts the race """
+        self._assign_entries(event.entries)
+        await self.on_start()
+
+    @handles(Pause)
+    async def _handle_pause(self, event):
+        """ Pauses the race """
+        await self.on_pause()
+
+    @handles(Resync)
+    def _handle_resync(self, event):
+        """ Sends a full snapshot with the next push """
+        if self._delta_encoder:
+            self._delta_encoder.request_snapshot()
+
+    def _assign_entries(self, entries):
+        """ Assigns drivers and cars to the slots, only before the start
+
+        :param entries: [{"driver_id": ..., "car_id": ...}, ...] per slot,
+                        missing or None entries are left unassigned
+        """
+        if not entries or self.started:
+            return
 
-        await self._push_state()
+        for slot, entry in enumerate(entries[:self.num_drivers]):
+            if not isinstance(entry, dict):
+                continue
+            self._entries[slot] = {
+                    key: entry[key] for key in ("driver_id", "car_id")
+                    if isinstance(entry.get(key), int)
+                    }
 
     async def handle_finish(self, request):
         """ This method gets called when the race is finished, it should clean
         up all running tasks!
 
-        :param request: Request which triggered on_finish
+        :param request: Finish event which triggered on_finish, None if the
+                        race is removed
         """
         self.finished = True
+        self._finished_at = time.time()
 
         # Give the race code the chance to cleanup!
         await self.on_finish()
 
         # Nuke running coroutines
-        counter = 0
-        for task in self._tasks:
-            if not task.done():
-                task.cancel()
-                counter += 1
+        counter = self._supervisor.cancel_all()
 
         logger.info(f"Nuked {counter} running tasks")
 
-    async def _on_track_event(self, request):
-        """ This method gets called when a track event is registered """
-        raise NotImplementedError()
+    def results(self):
+        """ Final standings with the lap history of every slot, a plain copy
+        which may be handed to other threads
+
+        :returns: dict
+        """
+        entries = []
+        for position, (slot, _) in enumerate(self._ranking.standings()):
+            driver = self._current_state[slot]
+            entries.append({
+                    "slot": slot,
+                    "position": position,
+                    "driver_id": self._entries[slot].get("driver_id"),
+                    "car_id": self._entries[slot].get("car_id"),
+                    "lap_count": driver.lap_count,
+                    "total_time": driver.total_time,
+                    "best_time": driver.best_time,
+                    "best_lap": driver.best_lap,
+                    "laps": driver.laps.tolist()
+                    })
+
+        return {
+                "race_key": self.race_id,
+                "mode": type(self).__name__,
+                "started_at": self._started_at,
+                "finished_at": self._finished_at,
+                "entries": entries
+                }
+
+    def cancel_tasks(self):
+        """ Cancels every running task without finishing the race, e.g. on
+        shutdown
+
+        :returns: Number of canceled tasks
+        """
+        return self._supervisor.cancel_all()
 
     async def setup_race(self):
         """ Race setup goes here, should setup the racemode """
@@ -221,6 +338,11 @@ class BaseRace(object):
         """ Number of drivers in the race """
         return self._num_drivers
 
+    @property
+    def race_id(self):
+        """ Race id """
+        return self._race_id
+
     @property
     def game_manager(self):
         """ Race manager """
@@ -240,8 +362,20 @@ class BaseRace(object):
     def started(self, val):
         if val and not self._started and not self.paused and not self.finished:
             self._started = val
+            # Kept if it was restored from the journal
+            if self._started_at is None:
+                self._started_at = time.time()
             self._current_state["status"] = race_states.STARTED
-            self._ensure_future(self._push_state())
+            self._mark_dirty()
+
+    @property
+    def started_at(self):
+        """ Time the race was started, None before it started """
+        return self._started_at
+
+    @started_at.setter
+    def started_at(self, val):
+        self._started_at = val
 
     @property
     def paused(self):
@@ -254,10 +388,19 @@ class BaseRace(object):
             self._paused = val
             if val:
                 self._current_state["status"] = race_states.PAUSED
-                self._ensure_future(self._push_state())
             else:
                 self._current_state["status"] = race_states.STARTED
-                self._ensure_future(self._push_state())
+            self._mark_dirty()
+
+    @property
+    def publisher(self):
+        """ State publisher, provides push rate and latency """
+        return self._publisher
+
+    @property
+    def ranking(self):
+        """ Current standings """
+        return self._ranking
 
     @property
     def finished(self):
@@ -268,15 +411,21 @@ class BaseRace(object):
     def finished(self, val):
         self._finished = val
         self._current_state["status"] = race_states.FINISHED
-        # DO NOT ADD THIS TO THE TASK LIST
-        self.loop.create_task(self._push_state())
+        # DO NOT ADD THIS TO THE TASK LIST, the publisher gets canceled as well
+        self.loop.create_task(self._publisher.flush())
 
     @property
     def current_state(self):
         """ Current state of the race """
         copy = self._current_state.copy()
-        # Ensure we do not deliver the internal state
+        copy["positions"] = self._ranking.standings()
+        # Drivers are replaced by their serialized views, those are only
+        # rebuilt after a lap so unchanged drivers cost nothing
         for driver in range(self.num_drivers):
-            copy[driver] = copy[driver].copy()
+            copy[driver] = copy[driver].state()
 
         return copy
+
+
+# Race modes get their tables when they are defined
+BaseRace._handlers = handler_table(BaseRace)
@@ -11,9 +11,9 @@
 
 
 import logging
-from ... import messages
-from pprint import pformat
 from ..base_race import BaseRace
+from ..dispatch import handles
+from ..events import LapFinished
 
 
 logger = logging.getLogger(__name__)
@@ -51,23 +51,16 @@ class Race(BaseRace):
         """ This method gets called when the race is paused """
         logger.info("Race finished!")
 
-    async def on_track_event(self, request):
-        """ This method gets called when a track event is registered """
-        try:
-            if request["type"] == messages.MSG_TRACK_EVENT_LAP_FINISHED:
-                if self.started and not self.paused and not self.finished:
-                    # Register the driver
-                    await self._on_lap_finished(
-                            self._driver_track_mapping[
-                                int(request["track_id"])],
-                            int(request["time"]))
-                else:
-                    logger.warning(
-                            "Registered track event with no running, finished"
-                            + " or paused race \n" + pformat(request))
-            else:
-                logger.warning(
-                        f"Unknown track event occured: {request['type']}")
-
-        except KeyError as ke:
-            logging.error(f"Could not find {ke} in a seemingly valid request")
+    @handles(LapFinished)
+    async def on_lap_finished(self, event):
+        """ This method gets called when a driver finished a lap """
+        if self.started and not self.paused and not self.finished:
+            # Register the driver
+            await self._on_lap_finished(
+                    self._driver_track_mapping[event.track_id],
+                    event.time,
+                    event.trace)
+        else:
+            logger.warning(
+                    "Registered track event with no running, finished"
+                    + f" or paused race: {event}")
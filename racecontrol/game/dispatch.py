@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+"""
+    racecontrol.game.dispatch
+    ~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Declarative event handlers of the race modes. A race class marks its
+    handlers with `handles`, the table mapping every event class to its
+    handler is built once when the class is defined.
+
+    :author: Matthias Riegler, 2018
+    :license: aGPLv3, see LICENSE.md for more details.
+"""
+
+
+import inspect
+
+
+def handles(*event_types):
+    """ Method decorator, registers the method as handler of the given
+    event classes. Coroutine functions run as supervised tasks of the race,
+    plain functions right away.
+
+    :param event_types: Classes from `racecontrol.game.events`
+    """
+    def decorate(handler):
+        handler.handled_events = event_types
+        return handler
+    return decorate
+
+
+def handler_table(cls):
+    """ Collects the handlers of a class, a subclass may replace the handler
+    of an event or override the handler method itself
+
+    :param cls: Race class
+    :returns: dict of event class -> (function, True if it is a coroutine
+              function)
+    """
+    names = {}
+    for klass in reversed(cls.__mro__):
+        for name, attribute in vars(klass).items():
+            for event_type in getattr(attribute, "handled_events", ()):
+                names[event_type] = name
+
+    table = {}
+    for event_type, name in names.items():
+        function = getattr(cls, name)
+        table[event_type] = (function,
+                             inspect.iscoroutinefunction(function))
+    return table
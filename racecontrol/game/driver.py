@@ -10,40 +10,78 @@
 """
 
 
-class Driver(dict):
-    """ Driver class """
+from array import array
+
+
+class Driver(object):
+    """ Driver class, keeps the complete lap history in a compact array """
+
+    __slots__ = ("_laps", "_best_time", "_best_lap", "_total_time", "_state")
 
     def __init__(self):
         """ Init """
-        self["lap_count"] = 0
-        self["best_time"] = -1
-        self["lap_time"] = -1
-        self["best_lap"] = -1
+        # Lap times in ms
+        self._laps = array("l")
+        self._best_time = -1
+        self._best_lap = -1
+        self._total_time = 0
+        # Cached serialized view, rebuilt after every lap
+        self._state = None
 
     @property
     def lap_count(self):
         """ Lap count """
-        return self["lap_count"]
+        return len(self._laps)
 
     @property
     def lap_time(self):
         """ Last lap time  """
-        return self["lap_time"]
+        return self._laps[-1] if self._laps else -1
 
     @property
     def best_time(self):
         """ Best lap time  """
-        return self["best_time"]
+        return self._best_time
+
+    @property
+    def best_lap(self):
+        """ Lap number of the best lap """
+        return self._best_lap
+
+    @property
+    def total_time(self):
+        """ Sum of all lap times """
+        return self._total_time
+
+    @property
+    def laps(self):
+        """ Lap history, read only view """
+        return memoryview(self._laps).toreadonly()
 
     def add_lap(self, lap_time):
         """ Call when driver passed a new lap  """
-        self["lap_count"] += 1
-        self["lap_time"] = lap_time
+        self._laps.append(lap_time)
+        self._total_time += lap_time
         self._update_driver_best_lap()
+        self._state = None
 
     def _update_driver_best_lap(self):
         """ Updates the drivers best lap  """
-        if self.best_time < 0:
-            self["best_time"] = self["lap_time"]
-        elif self["lap_time"] < self["best_time"]:
-            self["best_time"] = self["lap_time"]
+        if self._best_time < 0 or self.lap_time < self._best_time:
+            self._best_time = self.lap_time
+            self._best_lap = self.lap_count
+
+    def state(self):
+        """ Serializable view of the driver, the history is not part of it.
+        The dict is shared until the next lap and must not be modified.
+
+        :returns: dict with lap_count, best_time, lap_time and best_lap
+        """
+        if self._state is None:
+            self._state = {
+                    "lap_count": self.lap_count,
+                    "best_time": self._best_time,
+                    "lap_time": self.lap_time,
+                    "best_lap": self._best_lap
+                    }
+        return self._state
@@ -0,0 +1,254 @@
+# -*- coding: utf-8 -*-
+"""
+    racecontrol.game.events
+    ~~~~~~~~~~~~~~~~~~~~~~~
+
+    Typed events, passed to the race either directly by an in-process
+    producer or parsed from a request received over redis. Every event class
+    declares the fields of its request, they are checked before anything is
+    queued for the race.
+
+    :author: Matthias Riegler, 2018
+    :license: aGPLv3, see LICENSE.md for more details.
+"""
+
+
+from .. import messages
+
+
+class InvalidRequest(ValueError):
+    """ A request which does not match the schema of any event """
+
+
+class Field(object):
+    """ Field of a request """
+
+    __slots__ = ("name", "kind", "required", "minimum")
+
+    def __init__(self, name, kind, required=True, minimum=None):
+        """ Init
+
+        :param name: Key in the request
+        :param kind: Type of the value, see `convert` for ints
+        :param required: Optional fields are None if they are missing
+        :param minimum: Smallest valid value
+        """
+        self.name = name
+        self.kind = kind
+        self.required = required
+        self.minimum = minimum
+
+    def convert(self, value):
+        """ Converts a value which is not of the field type yet, ints may be
+        sent as whole floats or as numeric strings
+
+        :raises InvalidRequest: if the value is malformed
+        """
+        try:
+            # JSON booleans are no numbers, `int` would truncate fractions
+            if (self.kind is not int or isinstance(value, bool)
+                    or isinstance(value, float) and not value.is_integer()):
+                raise TypeError()
+            return int(value)
+        except (TypeError, ValueError):
+            raise InvalidRequest(
+                    f"{self.name} is no {self.kind.__name__}: {value!r}") \
+                from None
+
+    def parse(self, value):
+        """ Checks the value of the field
+
+        :param value: Value in the request, None if it is missing
+        :returns: Value of the field type
+        :raises InvalidRequest: if the value is missing or malformed
+        """
+        if value is None:
+            if self.required:
+                raise InvalidRequest(f"{self.name} is missing")
+            return None
+        if type(value) is not self.kind:
+            value = self.convert(value)
+        if self.minimum is not None and value < self.minimum:
+            raise InvalidRequest(f"{self.name} is below {self.minimum}: "
+                                 + f"{value}")
+        return value
+
+
+def _checked_trace(trace):
+    """ Traces are only diagnostics, a malformed one is dropped instead of
+    the request
+
+    :param trace: Value of the `trace` field
+    :returns: trace or None
+    """
+    if not isinstance(trace, dict):
+        return None
+    for hop, stamp in trace.items():
+        if (not isinstance(hop, str) or isinstance(stamp, bool)
+                or not isinstance(stamp, (int, float))):
+            return None
+    return trace
+
+
+class Event(object):
+    """ Base of the typed events """
+
+    __slots__ = ("trace",)
+
+    #: Request this event is sent as, e.g. MSG_START
+    request = None
+    #: Type of the request, None for requests without a type
+    type = None
+    #: Fields of the request, in the order `__init__` takes them
+    fields = ()
+
+    def __init__(self, trace=None):
+        """ Init
+
+        :param trace: Latency trace, see `racecontrol.tracing`
+        """
+        self.trace = trace
+
+    @classmethod
+    def from_request(cls, request):
+        """ Creates the event from a request
+
+        :raises InvalidRequest: if a field is missing or malformed
+        """
+        values = [field.parse(request.get(field.name))
+                  for field in cls.fields]
+        return cls(*values, trace=_checked_trace(request.get("trace")))
+
+    def to_request(self):
+        """ :returns: Request of the event, e.g. for journaling it or
+                      mirroring it over redis
+        """
+        request = {"request": self.request}
+        if self.type is not None:
+            request["type"] = self.type
+        for field in self.fields:
+            value = getattr(self, field.name)
+            if value is not None:
+                request[field.name] = value
+        if self.trace:
+            request["trace"] = self.trace
+        return request
+
+    def __repr__(self):
+        values = "".join(f" {field.name}={getattr(self, field.name)!r}"
+                         for field in self.fields)
+        return f"<{type(self).__name__}{values}>"
+
+
+#: Event classes by (request, type)
+EVENTS = {}
+
+
+def register(cls):
+    """ Class decorator, makes an event class known to `parse_request` """
+    key = (cls.request, cls.type)
+    if key in EVENTS:
+        raise ValueError(f"{key} is registered already by {EVENTS[key]}")
+    EVENTS[key] = cls
+    return cls
+
+
+def parse_request(request):
+    """ Converts a decoded request to its typed event
+
+    :param request: Decoded request
+    :raises InvalidRequest: on unknown requests, missing or malformed fields
+    """
+    if not isinstance(request, dict):
+        raise InvalidRequest(f"Request is no object: {request!r}")
+
+    name, event_type = request.get("request"), request.get("type")
+    if not isinstance(name, str) \
+            or not (event_type is None or isinstance(event_type, str)):
+        raise InvalidRequest(f"Malformed request {name!r} "
+                             + f"of type {event_type!r}")
+
+    # Requests without a type may carry one anyway
+    cls = EVENTS.get((name, event_type)) or EVENTS.get((name, None))
+    if cls is None:
+        raise InvalidRequest(f"Unknown request {name!r} "
+                             + f"of type {event_type!r}")
+    return cls.from_request(request)
+
+
+@register
+class Start(Event):
+    """ Starts or resumes the race """
+
+    __slots__ = ("entries",)
+
+    request = messages.MSG_START
+    fields = (Field("entries", list, required=False),)
+
+    def __init__(self, entries=None, trace=None):
+        """ Init
+
+        :param entries: [{"driver_id": ..., "car_id": ...}, ...] per slot
+        """
+        super().__init__(trace)
+        self.entries = entries
+
+
+@register
+class Pause(Event):
+    """ Pauses the race """
+
+    __slots__ = ()
+
+    request = messages.MSG_PAUSE
+
+
+@register
+class Finish(Event):
+    """ Finishes the race, the next one is set up right away """
+
+    __slots__ = ()
+
+    request = messages.MSG_FINISH
+
+
+@register
+class Resync(Event):
+    """ A client asks for a full state snapshot """
+
+    __slots__ = ()
+
+    request = messages.MSG_RESYNC
+
+
+class TrackEvent(Event):
+    """ Base of the events reported by the track """
+
+    __slots__ = ("track_id",)
+
+    request = messages.MSG_TRACK_EVENT
+    fields = (Field("track_id", int, minimum=0),)
+
+
+@register
+class LapFinished(TrackEvent):
+    """ A driver passed the finish line """
+
+    __slots__ = ("time",)
+
+    type = messages.MSG_TRACK_EVENT_LAP_FINISHED
+    fields = TrackEvent.fields + (Field("time", int, minimum=0),)
+
+    def __init__(self, track_id, time, trace=None):
+        """ Init
+
+        :param track_id: Track the lap was finished on
+        :param time: Lap time in ms
+        :param trace: Latency trace, see `racecontrol.tracing`
+        """
+        super().__init__(trace)
+        self.track_id = track_id
+        self.time = time
+
+    def __repr__(self):
+        return f"<LapFinished track {self.track_id}: {self.time}ms>"
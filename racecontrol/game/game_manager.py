@@ -12,25 +12,38 @@
 import logging
 import aioredis
 from json import JSONDecodeError
+from .. import channels
 from .. import defaults
-from .. import messages
-from .builtin import Race
+from .. import tracing
+from .events import InvalidRequest, parse_request
+from .race_runner import RaceRunner
+from .results import ResultStore
 
 
 logger = logging.getLogger(__name__)
 
 
 class GameManager:
-    """ Game manager, spins up race instances """
+    """ Game manager, hosts independent races keyed by their race id """
 
     def __init__(
             self,
             loop,
             redis_uri=defaults.REDIS_URI,
             outgoing_event_channel=defaults.OUTGOING_EVENT_CHANNEL,
-            incoming_event_channel=defaults.INCOMING_EVENT_CHANNEL
+            incoming_event_channel=defaults.INCOMING_EVENT_CHANNEL,
+            journal_dir=defaults.JOURNAL_DIR,
+            race_ids=defaults.RACE_IDS,
+            persist_results=defaults.PERSIST_RESULTS
             ):
-        """ Init """
+        """ Init
+
+        :param journal_dir: Directory of the race journals, an unfinished
+                            race found there is recovered. None disables
+                            journaling.
+        :param race_ids: Races created on startup
+        :param persist_results: Store finished races in the database
+        """
         # Set the event loop
         self._loop = loop
         # Redis URI
@@ -39,15 +52,23 @@ class GameManager:
         self._outgoing_event_channel = outgoing_event_channel
         # Incoming game events, e.g. race start/stop
         self._incoming_event_channel = incoming_event_channel
+        # Race journals
+        self._journal_dir = journal_dir
+        # Race id -> runner
+        self._runners = {}
+        # Incoming channel -> runner, routes requests
+        self._runners_by_channel = {}
+        # Writes finished races to the database
+        self._result_store = ResultStore(loop) if persist_results else None
 
         # Async code init
         self.loop.run_until_complete(self._ainit())
 
         logger.info("Created game manager")
 
-        # Create a race
-        self._current_race = Race(game_manager=self,
-                                  num_drivers=4)
+        # Create the races
+        for race_id in race_ids:
+            self.loop.run_until_complete(self.add_race(race_id))
 
     async def _ainit(self):
         """ Initializes connection to pubsub, starts track communicator """
@@ -55,66 +76,167 @@ class GameManager:
         self._redis_subscribe = await aioredis.create_redis(self.redis_uri)
         self._redis_publish = await aioredis.create_redis(self.redis_uri)
 
-        # Create the subscriber for UI events
+        # One subscription for the UI events of every race
         self._subscribe = (await self._redis_subscribe
-                                     .subscribe(
-                                         self.incoming_event_channel))[0]
+                                     .psubscribe(channels.channel_pattern(
+                                         self.incoming_event_channel)))[0]
 
         # Start input event consumer
-        self.loop.create_task(self._input_event_consumer())
+        self._consumer = self.loop.create_task(self._input_event_consumer())
+
+    async def add_race(self, race_id, num_drivers=4):
+        """ Creates a race and starts handling its requests
+
+        :param race_id: Race id, see `racecontrol.channels.valid_race_id`
+        :returns: RaceRunner
+        """
+        if not channels.valid_race_id(race_id):
+            raise ValueError(f"Invalid race id {race_id!r}")
+        if race_id in self._runners:
+            raise ValueError(f"Race {race_id} exists already")
+
+        runner = RaceRunner(game_manager=self,
+                            race_id=race_id,
+                            num_drivers=num_drivers,
+                            journal_dir=self._journal_dir)
+        await runner.start()
+
+        self._runners[race_id] = runner
+        self._runners_by_channel[channels.race_channel(
+            self.incoming_event_channel, race_id)] = runner
+        logger.info(f"Created race {race_id}")
+        return runner
+
+    async def remove_race(self, race_id):
+        """ Stops a race, its current state is lost unless it is journaled
+
+        :param race_id: Race id
+        """
+        runner = self._runners.pop(race_id)
+        del self._runners_by_channel[channels.race_channel(
+            self.incoming_event_channel, race_id)]
+        await runner.race.handle_finish(None)
+        await runner.close()
+        logger.info(f"Removed race {race_id}")
 
     async def _input_event_consumer(self):
         """ Input handler for incoming redis requests  """
         while await self._subscribe.wait_message():
 
             try:
-                request = await self._subscribe.get_json()
-                if self.current_race:
-                    if request["request"] == messages.MSG_FINISH:
-                        await self.current_race.handle_finish(request)
-                        self.current_race = Race(game_manager=self,
-                                                 num_drivers=4)
-                    else:
-                        # Pass every other message over to the actual game
-                        await self.current_race.handle_request(request)
-                else:
-                    logger.error("No game instance is running, this should" +
-                                 "NEVER happen!")
-
-            except TypeError as te:
-                logger.warning(te)
+                channel, request = await self._subscribe.get_json()
+                runner = self._runners_by_channel.get(channel.decode())
+                if runner is None:
+                    logger.warning(f"No race on {channel}")
+                    continue
+
+                # Rejected before anything is queued for the race
+                event = parse_request(request)
+                tracing.tracer.stamp(event.trace, tracing.HOP_RECEIVE)
+                runner.submit(event)
+
+            except InvalidRequest as e:
+                logger.warning(f"Invalid request on {channel}: {e}")
 
             except JSONDecodeError:
                 logger.warning("invalid json request")
 
-    async def push(self, msg):
-        """ Pushes a message to the outgoing pubsub channel
+            except Exception as e:
+                # Bad input must never end the consumer of every race
+                logger.warning(f"Dropped request: {e!r}")
+
+    async def handle_request(self, request, race_id=defaults.DEFAULT_RACE_ID):
+        """ Passes a decoded request to a race and waits until it is handled,
+        bypassing the request queue of the race
+
+        :param request: Decoded request
+        :param race_id: Race id
+        """
+        await self._runners[race_id].handle_request(request)
+
+    def store_results(self, race):
+        """ Stores a finished race in the background, the event loop only
+        copies its results
+
+        :param race: Finished race
+        """
+        if self._result_store:
+            self._result_store.persist(race.results())
+
+    def submit_track_event(self, event, race_id=defaults.DEFAULT_RACE_ID):
+        """ In-process fast path for track events. Producers running on the
+        same event loop hand typed events straight to the race instead of
+        publishing them over redis.
+
+        :param event: Event from `racecontrol.game.events`
+        :param race_id: Race id
+        """
+        tracing.tracer.stamp(event.trace, tracing.HOP_RECEIVE)
+
+        runner = self._runners.get(race_id)
+        if runner:
+            runner.submit_track_event(event)
+        else:
+            logger.error(f"No race {race_id} is running")
+
+    async def close(self):
+        """ Stops every race, writes and closes their journals, waits for the
+        results being stored and closes the redis connections
+        """
+        self._consumer.cancel()
+        for runner in self._runners.values():
+            await runner.close()
+        if self._result_store:
+            await self._result_store.close()
+
+        for redis in (self._redis_subscribe, self._redis_publish):
+            redis.close()
+            await redis.wait_closed()
+
+    async def push(self, msg, race_id=defaults.DEFAULT_RACE_ID):
+        """ Pushes a message to the outgoing pubsub channel of a race
 
         :param msg: Message to send, string or bytestring
+        :param race_id: Race id
         :returns: Receiver count
         """
-        return await self._redis_publish.publish(self.outgoing_event_channel,
-                                                 msg)
+        return await self._redis_publish.publish(
+                channels.race_channel(self.outgoing_event_channel, race_id),
+                msg)
+
+    def race(self, race_id):
+        """ :returns: Current race of a race id """
+        return self._runners[race_id].race
+
+    def runner(self, race_id):
+        """ :returns: RaceRunner of a race id """
+        return self._runners[race_id]
+
+    @property
+    def race_ids(self):
+        """ Ids of the hosted races """
+        return list(self._runners)
 
     @property
     def current_race(self):
-        """ Current race """
-        return self._current_race
-
-    @current_race.setter
-    def current_race(self, newrace):
-        """ Current race setter """
-        if newrace and self.current_race.finished:
-            self._current_race = newrace
-        else:
-            logger.error("Coroutines probably not canceled" +
-                         "Leaving old race intact")
+        """ Current race of the default race id """
+        return self.race(defaults.DEFAULT_RACE_ID)
 
     @property
     def loop(self):
         """ Eventloop the relay is running on """
         return self._loop
 
+    @property
+    def journal(self):
+        """ Journal of the default race, None if journaling is disabled """
+        return self.runner(defaults.DEFAULT_RACE_ID).journal
+
+    @property
+    def result_store(self):
+        """ Result store, None if results are not persisted """
+        return self._result_store
+
     @property
     def redis_uri(self):
         """ Redis uri """
@@ -0,0 +1,293 @@
+# -*- coding: utf-8 -*-
+"""
+    racecontrol.game.journal
+    ~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Append-only journal of the requests a race accepted, replayed through the
+    race logic to recover a race after a crash
+
+    :author: Matthias Riegler, 2018
+    :license: aGPLv3, see LICENSE.md for more details.
+"""
+
+
+import asyncio
+import glob
+import json
+import logging
+import os
+import struct
+import time
+import zlib
+from .. import defaults
+
+
+logger = logging.getLogger(__name__)
+
+# ======================================================================
+#                             File layout
+#
+#   All fields are little endian
+#
+#   header      ->  <magic:4s> <version:u8> <num_drivers:u8>
+#   record      ->  <seq:u32> <crc32:u32> <timestamp:f64> <length:u32>
+#                   <payload:length>
+#
+#   payload     ->  request as JSON, without its latency trace
+#   crc32       ->  checksum of the payload
+#
+#   Records are only appended. A torn or corrupt record ends the journal,
+#   it is cut off when the journal is opened again.
+#
+#   Version 1 journals have a u16 length and are still read and continued.
+#
+# ======================================================================
+
+MAGIC = b"RCJ\0"
+VERSION = 2
+
+FSYNC_BATCH = "batch"
+FSYNC_INTERVAL = "interval"
+FSYNC_NEVER = "never"
+
+SUFFIX = ".journal"
+
+_HEADER = struct.Struct("<4sBB")
+# Version -> record header
+_RECORDS = {
+        1: struct.Struct("<IIdH"),
+        2: struct.Struct("<IIdI")
+        }
+
+
+def _max_length(record):
+    """ :returns: Largest payload the length field of a record holds """
+    return (1 << 8 * struct.calcsize(record.format[-1])) - 1
+
+
+def _read(path):
+    """ Reads a journal
+
+    :param path: Journal file
+    :returns: (version, num_drivers, [(seq, timestamp, request), ...],
+               valid_size)
+    :raises ValueError: if the file is not a journal
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+
+    if len(data) < _HEADER.size:
+        raise ValueError(f"{path} is not a journal")
+    magic, version, num_drivers = _HEADER.unpack_from(data, 0)
+    record = _RECORDS.get(version)
+    if magic != MAGIC or record is None:
+        raise ValueError(f"{path} is not a journal")
+
+    records = []
+    offset = _HEADER.size
+    while offset + record.size <= len(data):
+        seq, crc, timestamp, length = record.unpack_from(data, offset)
+        start = offset + record.size
+        payload = data[start:start + length]
+        if len(payload) != length or zlib.crc32(payload) != crc:
+            logger.warning(f"Journal {path} ends with a torn record")
+            break
+        records.append((seq, timestamp, json.loads(payload)))
+        offset = start + length
+
+    return version, num_drivers, records, offset
+
+
+def read_journal(path):
+    """ Reads a journal
+
+    :param path: Journal file
+    :returns: (num_drivers, [(seq, timestamp, request), ...], valid_size)
+    :raises ValueError: if the file is not a journal
+    """
+    return _read(path)[1:]
+
+
+def journal_path(directory, race_id):
+    """ :returns: Path for a new journal of a race """
+    return os.path.join(directory,
+                        f"{race_id}.{int(time.time() * 1000)}{SUFFIX}")
+
+
+def latest_journal(directory, race_id):
+    """ :returns: Path of the most recent journal of a race or None """
+    paths = glob.glob(os.path.join(directory, f"{race_id}.*{SUFFIX}"))
+    return max(paths, default=None)
+
+
+class RaceJournal(object):
+    """ Journal of a single race. Appending only serializes the record into
+    a buffer, a writer task writes the buffer in batches from an executor so
+    the race never waits for the disk.
+    """
+
+    def __init__(
+            self,
+            loop,
+            path,
+            num_drivers,
+            flush_interval=defaults.JOURNAL_FLUSH_INTERVAL,
+            fsync_policy=defaults.JOURNAL_FSYNC_POLICY,
+            fsync_interval=defaults.JOURNAL_FSYNC_INTERVAL,
+            max_record_size=defaults.JOURNAL_MAX_RECORD_SIZE
+            ):
+        """ Init, an existing journal is continued
+
+        :param loop: Event loop the writer runs on
+        :param path: Journal file
+        :param num_drivers: Number of drivers of the race
+        :param flush_interval: Maximum time a record stays in the buffer
+        :param fsync_policy: FSYNC_BATCH syncs every write, FSYNC_INTERVAL at
+                             most every `fsync_interval` seconds and
+                             FSYNC_NEVER leaves it to the OS
+        :param max_record_size: Largest payload in bytes
+        """
+        self._loop = loop
+        self._path = path
+        self._num_drivers = num_drivers
+        self._flush_interval = flush_interval
+        self._fsync_policy = fsync_policy
+        self._fsync_interval = fsync_interval
+        self._max_record_size = max_record_size
+        # Record header of the journal version
+        self._record = _RECORDS[VERSION]
+        # Records recovered from an existing journal
+        self._records = []
+        # Serialized records not written yet
+        self._buffer = bytearray()
+        # Only one batch is written at a time
+        self._write_lock = asyncio.Lock()
+        self._closing = asyncio.Event()
+        self._last_fsync = 0
+        self._writer = None
+        self._closed = False
+
+        self._file = self._open()
+        self._seq = self._records[-1][0] if self._records else 0
+
+    def _open(self):
+        """ Opens the journal file, cuts off a torn tail """
+        if os.path.exists(self._path):
+            version, num_drivers, self._records, size = _read(self._path)
+            # Continued in the version it was started with
+            self._record = _RECORDS[version]
+            if num_drivers != self._num_drivers:
+                raise ValueError(f"Journal {self._path} has {num_drivers} "
+                                 + f"drivers, expected {self._num_drivers}")
+            f = open(self._path, "r+b")
+            f.truncate(size)
+            f.seek(size)
+            return f
+
+        os.makedirs(os.path.dirname(self._path) or ".", exist_ok=True)
+        f = open(self._path, "wb")
+        f.write(_HEADER.pack(MAGIC, VERSION, self._num_drivers))
+        return f
+
+    def start(self):
+        """ Starts the writer task """
+        self._writer = self._loop.create_task(self._write_periodically())
+
+    def serialize(self, request):
+        """ Serializes a request into the payload of a record. Done before
+        the request is applied, one which can not be journaled is rejected.
+
+        :param request: Request, its trace is not journaled
+        :returns: Payload for `append_payload`
+        :raises ValueError: if the payload is too large for a record
+        """
+        payload = json.dumps({key: value for key, value in request.items()
+                              if key != "trace"}).encode()
+        limit = min(self._max_record_size, _max_length(self._record))
+        if len(payload) > limit:
+            raise ValueError(f"Record of {len(payload)} bytes exceeds the "
+                             + f"limit of {limit} bytes")
+        return payload
+
+    def append(self, request):
+        """ Appends a request
+
+        :param request: Accepted request, its trace is not journaled
+        :returns: Sequence number of the record
+        :raises ValueError: if the request is too large for a record
+        """
+        return self.append_payload(self.serialize(request))
+
+    def append_payload(self, payload):
+        """ Appends a record serialized by `serialize`
+
+        :param payload: Payload
+        :returns: Sequence number of the record
+        """
+        self._seq += 1
+        self._buffer += self._record.pack(self._seq, zlib.crc32(payload),
+                                          time.time(), len(payload))
+        self._buffer += payload
+        return self._seq
+
+    async def _write_periodically(self):
+        """ Writes the buffer every flush interval until closed """
+        while not self._closing.is_set():
+            try:
+                await asyncio.wait_for(self._closing.wait(),
+                                       self._flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            await self.flush()
+
+    async def flush(self, fsync=None):
+        """ Writes the buffered records
+
+        :param fsync: Overrides the fsync policy
+        """
+        async with self._write_lock:
+            if not self._buffer and not fsync:
+                return
+            batch, self._buffer = self._buffer, bytearray()
+
+            if fsync is None:
+                fsync = self._fsync_policy == FSYNC_BATCH or (
+                        self._fsync_policy == FSYNC_INTERVAL
+                        and time.monotonic() - self._last_fsync
+                        >= self._fsync_interval)
+            await self._loop.run_in_executor(None, self._write, batch, fsync)
+            if fsync:
+                self._last_fsync = time.monotonic()
+
+    def _write(self, batch, fsync):
+        """ Blocking write, runs in the executor """
+        self._file.write(batch)
+        self._file.flush()
+        if fsync:
+            os.fsync(self._file.fileno())
+
+    async def close(self):
+        """ Writes the remaining records and closes the file """
+        if self._closed:
+            return
+        self._closed = True
+        self._closing.set()
+        if self._writer:
+            await self._writer
+        await self.flush(fsync=self._fsync_policy != FSYNC_NEVER)
+        self._file.close()
+
+    @property
+    def records(self):
+        """ [(seq, timestamp, request), ...] recovered when opened """
+        return self._records
+
+    @property
+    def seq(self):
+        """ Sequence number of the last record """
+        return self._seq
+
+    @property
+    def path(self):
+        """ Journal file """
+        return self._path
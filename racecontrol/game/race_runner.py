@@ -0,0 +1,258 @@
+# -*- coding: utf-8 -*-
+"""
+    racecontrol.game.race_runner
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Hosts the races of one race id, one after another
+
+    :author: Matthias Riegler, 2018
+    :license: aGPLv3, see LICENSE.md for more details.
+"""
+
+
+import asyncio
+import logging
+from .. import defaults
+from .. import messages
+from .builtin import Race
+from .events import Finish, InvalidRequest, Resync, parse_request
+from .journal import RaceJournal, journal_path, latest_journal
+
+
+logger = logging.getLogger(__name__)
+
+
+class RaceRunner(object):
+    """ Runs the current race of a race id, replaces it by a new one once it
+    finished and keeps its journal. Requests are handled by an own worker
+    task, a stalled race does not hold up the races of other ids.
+    """
+
+    def __init__(
+            self,
+            game_manager,
+            race_id,
+            num_drivers=4,
+            journal_dir=defaults.JOURNAL_DIR,
+            queue_size=defaults.RACE_QUEUE_SIZE
+            ):
+        """ Init
+
+        :param game_manager: Game manager hosting the race
+        :param race_id: Race id
+        :param journal_dir: Directory of the race journals, an unfinished
+                            race found there is recovered. None disables
+                            journaling.
+        :param queue_size: Requests queued before new ones are dropped
+        """
+        self._game_manager = game_manager
+        self._race_id = race_id
+        self._num_drivers = num_drivers
+        self._journal_dir = journal_dir
+        # Requests not handled yet
+        self._queue = asyncio.Queue(maxsize=queue_size)
+        self._journal = None
+        self._worker = None
+        #: Requests dropped because the queue was full
+        self.dropped = 0
+
+        self._race = self._create_race()
+
+    def _create_race(self):
+        """ :returns: New race """
+        return Race(game_manager=self._game_manager,
+                    num_drivers=self._num_drivers,
+                    race_id=self._race_id)
+
+    async def start(self):
+        """ Recovers an unfinished race and starts handling requests """
+        await self._open_journal(recover=True)
+        self._worker = self.loop.create_task(self._work())
+
+    def submit(self, event):
+        """ Queues an event
+
+        :param event: Event from `racecontrol.game.events`
+        :returns: False if the event was dropped
+        """
+        try:
+            self._queue.put_nowait(event)
+            return True
+        except asyncio.QueueFull:
+            self.dropped += 1
+            logger.warning(f"Race {self.race_id} is not keeping up, "
+                           + f"dropped {event}")
+            return False
+
+    async def _work(self):
+        """ Handles the queued events in order """
+        while True:
+            event = await self._queue.get()
+            try:
+                await self.handle_event(event)
+            except Exception as e:
+                logger.error(f"Race {self.race_id} failed to handle "
+                             + f"{event}: {e}")
+
+    async def handle_request(self, request):
+        """ Parses a decoded request and handles it
+
+        :param request: Decoded request
+        """
+        try:
+            event = parse_request(request)
+        except InvalidRequest as e:
+            logger.warning(f"Invalid request {request}: {e}")
+            return
+        await self.handle_event(event)
+
+    async def handle_event(self, event):
+        """ Passes an event to the race, a finish event replaces the race by
+        a new one
+
+        :param event: Event from `racecontrol.game.events`
+        """
+        if isinstance(event, Finish):
+            self._journal_append(event.to_request())
+            await self.race.handle_finish(event)
+            if self.race.finished:
+                self._game_manager.store_results(self.race)
+                self._race = self._create_race()
+                await self._open_journal()
+            else:
+                logger.error("Coroutines probably not canceled" +
+                             "Leaving old race intact")
+        # Pass every other event over to the actual game
+        else:
+            self._dispatch(event)
+
+    def submit_track_event(self, event):
+        """ Passes a typed track event straight to the race
+
+        :param event: Event from `racecontrol.game.events`
+        """
+        self._dispatch(event)
+
+    def _dispatch(self, event):
+        """ Passes an event to the race and journals it if it was accepted.
+        It is serialized first, an event is never applied without being
+        journaled.
+
+        :param event: Event from `racecontrol.game.events`
+        :returns: True if the race accepted the event
+        """
+        payload = None
+        if self._journal and not isinstance(event, Resync):
+            try:
+                payload = self._journal.serialize(event.to_request())
+            except ValueError as e:
+                logger.warning(f"Race {self.race_id} rejected "
+                               + f"{type(event).__name__}: {e}")
+                return False
+
+        if not self.race.dispatch(event):
+            return False
+        if payload is not None:
+            self._journal.append_payload(payload)
+        return True
+
+    def _journal_append(self, request):
+        """ Journals an accepted request of the current race """
+        if self._journal:
+            self._journal.append(request)
+
+    async def _open_journal(self, recover=False):
+        """ Opens the journal of the current race, closes the previous one
+
+        :param recover: Continue the latest journal if its race is not
+                        finished, the race is rebuilt from it
+        """
+        if self._journal:
+            await self._journal.close()
+            self._journal = None
+        if self._journal_dir is None:
+            return
+
+        path = latest_journal(self._journal_dir, self.race_id) \
+            if recover else None
+        journal = await self._recover(path) if path else None
+
+        if journal is None:
+            journal = RaceJournal(self.loop,
+                                  journal_path(self._journal_dir,
+                                               self.race_id),
+                                  self._num_drivers)
+
+        journal.start()
+        self._journal = journal
+
+    async def _recover(self, path):
+        """ Rebuilds the current race from a journal
+
+        :param path: Journal file
+        :returns: Journal to continue or None if its race is finished
+        """
+        try:
+            journal = RaceJournal(self.loop, path, self._num_drivers)
+        except ValueError as e:
+            logger.error(f"Not recovering from {path}: {e}")
+            return None
+
+        records = journal.records
+        if records and records[-1][2].get("request") == messages.MSG_FINISH:
+            await journal.close()
+            return None
+
+        await self._replay(records)
+        logger.info(f"Recovered race {self.race_id} from {path}, replayed "
+                    + f"{len(records)} records")
+        return journal
+
+    async def _replay(self, records):
+        """ Passes journaled requests through the current race
+
+        :param records: [(seq, timestamp, request), ...]
+        """
+        for _, timestamp, request in records:
+            # Started when the first start was journaled, not on recovery
+            if (request.get("request") == messages.MSG_START
+                    and self.race.started_at is None):
+                self.race.started_at = timestamp
+            await self.race.handle_request(request)
+            # Let the handlers spawned by the race run in order
+            await asyncio.sleep(0)
+
+    async def close(self):
+        """ Stops handling requests, writes and closes the journal """
+        if self._worker:
+            self._worker.cancel()
+            self._worker = None
+        self.race.cancel_tasks()
+        if self._journal:
+            await self._journal.close()
+            self._journal = None
+
+    @property
+    def loop(self):
+        """ Event loop """
+        return self._game_manager.loop
+
+    @property
+    def race_id(self):
+        """ Race id """
+        return self._race_id
+
+    @property
+    def race(self):
+        """ Current race """
+        return self._race
+
+    @property
+    def journal(self):
+        """ Journal of the current race, None if journaling is disabled """
+        return self._journal
+
+    @property
+    def pending(self):
+        """ Number of queued requests """
+        return self._queue.qsize()
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+"""
+    racecontrol.game.ranking
+    ~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Incrementally maintained standings
+
+    :author: Matthias Riegler, 2018
+    :license: aGPLv3, see LICENSE.md for more details.
+"""
+
+
+class Ranking(object):
+    """ Standings ordered by lap count, ties are broken by the cumulative race
+    time so whoever crossed the line first stays ahead. An update moves the
+    entry by adjacent swaps, a lap usually costs one or two comparisons.
+    """
+
+    def __init__(self, entries):
+        """ Init
+
+        :param entries: Entries in their initial order, e.g. driver ids
+        """
+        # Position -> entry
+        self._order = list(entries)
+        # Entry -> position
+        self._positions = {entry: position
+                           for position, entry in enumerate(self._order)}
+        # Entry -> (-lap_count, total_time), smaller is better
+        self._keys = {entry: (0, 0) for entry in self._order}
+
+    def update(self, entry, lap_count, total_time):
+        """ Updates the standing of an entry
+
+        :param entry: Entry to update
+        :param lap_count: Laps driven
+        :param total_time: Cumulative race time
+        :returns: Positions whose entry or lap count changed, ascending
+        """
+        key = (-lap_count, total_time)
+        self._keys[entry] = key
+        start = position = self._positions[entry]
+
+        # Overtake the entries now behind
+        while position > 0 and key < self._keys[self._order[position - 1]]:
+            self._swap(position, position - 1)
+            position -= 1
+
+        # Fall behind, e.g. after a correction
+        if position == start:
+            while position < len(self._order) - 1 and \
+                    key > self._keys[self._order[position + 1]]:
+                self._swap(position, position + 1)
+                position += 1
+
+        first, last = sorted((start, position))
+        return list(range(first, last + 1))
+
+    def _swap(self, a, b):
+        """ Swaps the entries on two positions """
+        order = self._order
+        order[a], order[b] = order[b], order[a]
+        self._positions[order[a]] = a
+        self._positions[order[b]] = b
+
+    def position(self, entry):
+        """ :returns: Position of an entry, starting at 0 """
+        return self._positions[entry]
+
+    def entry(self, position):
+        """ :returns: (entry, lap_count) on a position """
+        entry = self._order[position]
+        return entry, -self._keys[entry][0]
+
+    def standings(self):
+        """ :returns: [(entry, lap_count), ...] ordered by position """
+        return [(entry, -self._keys[entry][0]) for entry in self._order]
+
+    def __len__(self):
+        """ Number of entries """
+        return len(self._order)
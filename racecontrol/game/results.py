@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+"""
+    racecontrol.game.results
+    ~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Persists finished races into the web UI database. Writes happen on a
+    single writer thread, each race in one transaction together with the
+    driver and car records, the event loop only hands over a plain copy of
+    the results.
+
+    :author: Matthias Riegler, 2018
+    :license: aGPLv3, see LICENSE.md for more details.
+"""
+
+
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy import insert, select
+from ..webui import create_app, db, init_db
+from ..webui.models import Car, Driver, Race, Entry, Lap
+from ..webui.util.database.records import update_records
+
+
+logger = logging.getLogger(__name__)
+
+
+def _existing(model, entries, key):
+    """ :returns: Set of the ids referenced by the entries which exist """
+    ids = {entry[key] for entry in entries if entry[key] is not None}
+    if not ids:
+        return set()
+    return set(db.session.scalars(select(model.id).where(model.id.in_(ids))))
+
+
+def _entry(race, result, drivers, cars):
+    """ :returns: Entry of a slot, without references to missing drivers or
+                  cars
+    """
+    return Entry(race=race,
+                 slot=result["slot"],
+                 position=result["position"],
+                 driver_id=result["driver_id"]
+                 if result["driver_id"] in drivers else None,
+                 car_id=result["car_id"] if result["car_id"] in cars else None,
+                 lap_count=result["lap_count"],
+                 total_time=result["total_time"],
+                 best_time=result["best_time"],
+                 best_lap=result["best_lap"])
+
+
+class ResultStore(object):
+    """ Writes race results in the background """
+
+    def __init__(self, loop, config=None):
+        """ Init
+
+        :param config: dict overriding single web UI configuration values,
+                       e.g. the database URI
+        """
+        self._loop = loop
+        self._config = config
+        # Created by the writer thread on first use
+        self._app = None
+        # One writer, races are stored in the order they finished
+        self._executor = ThreadPoolExecutor(max_workers=1,
+                                            thread_name_prefix="results")
+        # Writes not done yet
+        self._pending = set()
+
+    def persist(self, results):
+        """ Stores the results of a race in the background
+
+        :param results: `BaseRace.results`
+        :returns: Future resolving to the database id of the race, None if
+                  it could not be stored
+        """
+        future = asyncio.ensure_future(self._persist(results), loop=self.loop)
+        self._pending.add(future)
+        future.add_done_callback(self._pending.discard)
+        return future
+
+    async def _persist(self, results):
+        """ Runs the write on the writer thread
+
+        :returns: Database id of the race, None if the write failed
+        """
+        try:
+            race_id = await self.loop.run_in_executor(
+                    self._executor, self.write, results)
+        except Exception as e:
+            logger.error(f"Could not store race {results['race_key']}: {e}")
+            return None
+        logger.info(f"Stored race {results['race_key']} as {race_id}")
+        return race_id
+
+    def write(self, results):
+        """ Writes the results of a race in one transaction, blocking
+
+        :param results: `BaseRace.results`
+        :returns: Database id of the race
+        """
+        if self._app is None:
+            self._app = create_app(self._config)
+            init_db(self._app)
+
+        with self._app.app_context():
+            # Drivers or cars deleted during the race are left out
+            drivers = _existing(Driver, results["entries"], "driver_id")
+            cars = _existing(Car, results["entries"], "car_id")
+
+            race = Race(race_key=results["race_key"],
+                        mode=results["mode"],
+                        started_at=results["started_at"],
+                        finished_at=results["finished_at"])
+            entries = [_entry(race, result, drivers, cars)
+                       for result in results["entries"]]
+            db.session.add(race)
+            db.session.add_all(entries)
+            # Assigns the ids the laps refer to
+            db.session.flush()
+
+            laps = [{"race_id": race.id,
+                     "entry_id": entry.id,
+                     "lap_no": lap_no,
+                     "time": time}
+                    for entry, result in zip(entries, results["entries"])
+                    for lap_no, time in enumerate(result["laps"], 1)]
+            if laps:
+                # One executemany instead of an ORM object per lap
+                db.session.execute(insert(Lap), laps)
+
+            update_records(entries)
+            db.session.commit()
+            return race.id
+
+    async def close(self):
+        """ Waits for the pending writes and stops the writer thread """
+        if self._pending:
+            await asyncio.gather(*self._pending, return_exceptions=True)
+        self._executor.shutdown(wait=True)
+
+    @property
+    def loop(self):
+        """ Event loop """
+        return self._loop
+
+    @property
+    def pending(self):
+        """ Number of races not stored yet """
+        return len(self._pending)
@@ -0,0 +1,192 @@
+# -*- coding: utf-8 -*-
+"""
+    racecontrol.game.state_delta
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Encodes consecutive race states as full snapshots and delta packets
+
+    :author: Matthias Riegler, 2018
+    :license: aGPLv3, see LICENSE.md for more details.
+"""
+
+
+from .. import defaults
+from .. import messages
+
+
+# ======================================================================
+#                               Packet layout
+#
+#   snapshot  ->  {"type": REDIS_MSG_TYPE_STATE_PUSH, "seq": n,
+#                  "status": ..., "positions": [...], <driver>: {...}, ...}
+#
+#   delta     ->  {"type": REDIS_MSG_TYPE_STATE_DELTA, "seq": n, "base": m,
+#                  "drivers": {<driver>: {...}, ...},
+#                  ["status": ...], ["positions": [...]],
+#                  ["ranks": [[position, driver, lap_count], ...]]}
+#
+#   `ranks` replaces single entries of the positions, it is sent instead of
+#   `positions` when the moved positions are known.
+#
+#   A delta only applies to the state with sequence number `base`, clients
+#   which missed a packet request a new snapshot with MSG_RESYNC.
+#
+# ======================================================================
+
+
+class StateDeltaEncoder(object):
+    """ Keeps track of the last published state and encodes the difference
+    to it
+    """
+
+    def __init__(self, snapshot_interval=defaults.STATE_SNAPSHOT_INTERVAL):
+        """ Init
+
+        :param snapshot_interval: Number of packets after which a full
+                                  snapshot is sent regardless of changes
+        """
+        self._snapshot_interval = snapshot_interval
+        # Sequence number of the last encoded packet
+        self._seq = 0
+        # Last encoded state
+        self._last_state = None
+        # Packets encoded since the last snapshot
+        self._since_snapshot = 0
+
+    def request_snapshot(self):
+        """ Forces the next packet to be a full snapshot """
+        self._last_state = None
+
+    def encode(self, state, moved_positions=None):
+        """ Encodes a state
+
+        :param state: Race state, e.g. `BaseRace.current_state`
+        :param moved_positions: Positions changed since the last state, the
+                                positions are compared if not given
+        :returns: snapshot or delta packet
+        """
+        if self._last_state is None or \
+                self._since_snapshot >= self._snapshot_interval:
+            return self.snapshot(state)
+
+        last = self._last_state
+        packet = {
+                "type": messages.REDIS_MSG_TYPE_STATE_DELTA,
+                "seq": self._seq + 1,
+                "base": self._seq,
+                "drivers": {}
+                }
+
+        if moved_positions:
+            positions = state["positions"]
+            packet["ranks"] = [[position, *positions[position]]
+                               for position in sorted(moved_positions)]
+
+        for key, value in state.items():
+            if key == "positions" and moved_positions is not None:
+                # Covered by the ranks
+                continue
+            elif key == "status" or key == "positions":
+                if value != last.get(key):
+                    packet[key] = value
+            elif value is not last.get(key) and value != last.get(key):
+                # Unchanged drivers share their view with the last state
+                packet["drivers"][key] = value
+
+        self._seq += 1
+        self._since_snapshot += 1
+        self._last_state = state
+        return packet
+
+    def snapshot(self, state):
+        """ Encodes a full snapshot of a state
+
+        :param state: Race state
+        :returns: snapshot packet
+        """
+        self._seq += 1
+        self._since_snapshot = 0
+        self._last_state = state
+        return {
+                **state,
+                "type": messages.REDIS_MSG_TYPE_STATE_PUSH,
+                "seq": self._seq
+                }
+
+    @property
+    def seq(self):
+        """ Sequence number of the last encoded packet """
+        return self._seq
+
+
+def is_state_packet(packet):
+    """ :returns: True if the decoded packet is a snapshot or a delta """
+    return isinstance(packet, dict) and packet.get("type") in (
+            messages.REDIS_MSG_TYPE_STATE_PUSH,
+            messages.REDIS_MSG_TYPE_STATE_DELTA)
+
+
+def _apply_ranks(positions, ranks):
+    """ :returns: Copy of the positions with the ranks applied """
+    positions = list(positions)
+    for position, *entry in ranks:
+        positions[position] = entry
+    return positions
+
+
+def _merge_traces(older, newer, merged):
+    """ Keeps the traces of both packets, each is finished once sent """
+    if "traces" in newer:
+        merged["traces"] = older.get("traces", []) + newer["traces"]
+
+
+def apply_delta(snapshot, delta):
+    """ Applies a delta to a snapshot, like the clients do
+
+    :param snapshot: Snapshot packet with the sequence number `delta["base"]`
+    :param delta: Delta packet
+    :returns: New snapshot packet, the arguments are not modified
+    """
+    state = {**snapshot, **delta["drivers"], "seq": delta["seq"]}
+    if "status" in delta:
+        state["status"] = delta["status"]
+    if "positions" in delta:
+        state["positions"] = delta["positions"]
+    if "ranks" in delta:
+        state["positions"] = _apply_ranks(state["positions"], delta["ranks"])
+    _merge_traces(snapshot, delta, state)
+    return state
+
+
+def merge_packets(older, newer):
+    """ Collapses two consecutive packets into one with the same effect
+
+    :param older: Snapshot or delta packet
+    :param newer: Snapshot or delta packet following `older`
+    :returns: Merged packet or None if `newer` does not apply to `older`
+    """
+    if newer["type"] == messages.REDIS_MSG_TYPE_STATE_PUSH:
+        return newer
+    if newer["base"] != older["seq"]:
+        return None
+    if older["type"] == messages.REDIS_MSG_TYPE_STATE_PUSH:
+        return apply_delta(older, newer)
+
+    merged = {**older, "seq": newer["seq"],
+              "drivers": {**older["drivers"], **newer["drivers"]}}
+    if "status" in newer:
+        merged["status"] = newer["status"]
+    if "positions" in newer:
+        # Replaces earlier ranks as well
+        merged.pop("ranks", None)
+        merged["positions"] = newer["positions"]
+    if "ranks" in newer:
+        if "positions" in merged:
+            merged["positions"] = _apply_ranks(merged["positions"],
+                                               newer["ranks"])
+        else:
+            ranks = {rank[0]: rank for rank in older.get("ranks", ())}
+            ranks.update((rank[0], rank) for rank in newer["ranks"])
+            merged["ranks"] = [ranks[position] for position in sorted(ranks)]
+    _merge_traces(older, newer, merged)
+    return merged
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+"""
+    racecontrol.game.state_publisher
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Change driven state publisher, coalescing bursts of changes into one push
+
+    :author: Matthias Riegler, 2018
+    :license: aGPLv3, see LICENSE.md for more details.
+"""
+
+
+import logging
+import asyncio
+import time
+from .. import defaults
+from ..metrics import LatencyHistogram, RateMeter
+
+
+logger = logging.getLogger(__name__)
+
+
+class StatePublisher(object):
+    """ Pushes the race state once it got marked dirty. Every change within
+    the coalesce window ends up in the same push, an idle race is only pushed
+    every `keepalive_interval` seconds.
+    """
+
+    def __init__(
+            self,
+            push,
+            coalesce_window=defaults.STATE_PUSH_COALESCE_WINDOW,
+            keepalive_interval=defaults.STATE_PUSH_KEEPALIVE_INTERVAL
+            ):
+        """ Init
+
+        :param push: Coroutine function performing the actual push
+        :param coalesce_window: Seconds changes are collected before pushing
+        :param keepalive_interval: Seconds between pushes of an idle race
+        """
+        self._push = push
+        self._coalesce_window = coalesce_window
+        self._keepalive_interval = keepalive_interval
+
+        self._dirty = asyncio.Event()
+        # Time the oldest unpublished change was made
+        self._dirty_since = None
+
+        #: Time between the first change and the finished push
+        self.push_latency = LatencyHistogram()
+        #: Pushes per second
+        self.push_rate = RateMeter()
+
+    def mark_dirty(self):
+        """ Marks the state as changed, it gets pushed with the next window """
+        if self._dirty_since is None:
+            self._dirty_since = time.monotonic()
+        self._dirty.set()
+
+    async def run(self):
+        """ Publisher loop """
+        while True:
+            try:
+                await asyncio.wait_for(self._dirty.wait(),
+                                       timeout=self._keepalive_interval)
+            except asyncio.TimeoutError:
+                # Idle, keep the clients alive
+                logger.debug(f"State publisher: {self.stats()}")
+            else:
+                # Give further changes the chance to join this push
+                await asyncio.sleep(self._coalesce_window)
+
+            await self.flush()
+
+    async def flush(self):
+        """ Pushes the state immediately """
+        dirty_since = self._dirty_since
+        self._dirty_since = None
+        self._dirty.clear()
+
+        await self._push()
+
+        self.push_rate.mark()
+        if dirty_since is not None:
+            self.push_latency.record(time.monotonic() - dirty_since)
+
+    def stats(self):
+        """ :returns: dict with the push rate and latency """
+        return {
+                "pushes": self.push_rate.count,
+                "pushes_per_second": self.push_rate.rate(),
+                "latency_ms": self.push_latency.summary()
+                }
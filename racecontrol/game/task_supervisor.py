@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+"""
+    racecontrol.game.task_supervisor
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Registry of the tasks spawned by a race
+
+    :author: Matthias Riegler, 2018
+    :license: aGPLv3, see LICENSE.md for more details.
+"""
+
+
+import logging
+import functools
+
+
+logger = logging.getLogger(__name__)
+
+
+class TaskSupervisor(object):
+    """ Keeps track of running tasks only. Finished tasks drop out of the
+    registry on their own and their exceptions get logged, tasks spawned with
+    a key are not started twice while the first one is still running.
+    """
+
+    def __init__(self, loop):
+        """ Init
+
+        :param loop: Event loop the tasks are created on
+        """
+        self._loop = loop
+        # Running tasks
+        self._tasks = set()
+        # Running tasks by key
+        self._keyed = {}
+
+    def spawn(self, coro, key=None):
+        """ Creates a task
+
+        :param coro: Coroutine to run
+        :param key: Optional key, if a task with the same key is still running
+                    `coro` is dropped and the running task is returned
+        :returns: Task
+        """
+        if key is not None:
+            running = self._keyed.get(key)
+            if running is not None:
+                coro.close()
+                return running
+
+        task = self._loop.create_task(coro)
+        self._tasks.add(task)
+        if key is not None:
+            self._keyed[key] = task
+        task.add_done_callback(functools.partial(self._on_done, key))
+        return task
+
+    def _on_done(self, key, task):
+        """ Removes a finished task and logs its exception """
+        self._tasks.discard(task)
+        if key is not None and self._keyed.get(key) is task:
+            del self._keyed[key]
+
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"Task {task} failed", exc_info=task.exception())
+
+    def cancel_all(self):
+        """ Cancels every running task
+
+        :returns: Number of canceled tasks
+        """
+        tasks = list(self._tasks)
+        for task in tasks:
+            task.cancel()
+        return len(tasks)
+
+    def __len__(self):
+        """ Number of running tasks """
+        return len(self._tasks)
@@ -17,16 +17,25 @@ field!
 
 # A message should look like this:
 # {
-#     "request": (MSG_START|MSG_PAUSE|MSG_RESET|MSG_FINISH|MSG_TRACK_EVENT),
+#     "request": (MSG_START|MSG_PAUSE|MSG_RESET|MSG_FINISH|MSG_TRACK_EVENT|
+#                 MSG_RESYNC),
 #     "type": e.g. MSG_TRACK_EVENT_LAP_FINISHED
 #     ...
 # }
+#
+# Every (request, type) pair is parsed into its event class from
+# `racecontrol.game.events`, requests not matching its fields are rejected
+# before they reach a race
 
+# start may assign database drivers and cars to the slots with
+# {"entries": [{"driver_id": ..., "car_id": ...}, ...]}
 MSG_START = "start"
 MSG_PAUSE = "pause"
 MSG_RESET = "reset"
 MSG_FINISH = "finish"
 MSG_TRACK_EVENT = "track_event"
+# Requests a full state snapshot, e.g. after a client missed a delta
+MSG_RESYNC = "resync"
 
 # lap_finished passes {"track_id": ..., "time"}
 MSG_TRACK_EVENT_LAP_FINISHED = "lap_finished"
@@ -34,3 +43,4 @@ MSG_TRACK_EVENT_LAP_FINISHED = "lap_finished"
 
 # Redis messages
 REDIS_MSG_TYPE_STATE_PUSH = "update_positions"
+REDIS_MSG_TYPE_STATE_DELTA = "state_delta"
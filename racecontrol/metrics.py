@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+"""
+    racecontrol.metrics
+    ~~~~~~~~~~~~~~~~~~~
+
+    Lightweight latency and rate measurements for the hot paths
+
+    :author: Matthias Riegler, 2018
+    :license: aGPLv3, see LICENSE.md for more details.
+"""
+
+
+import time
+from collections import deque
+
+
+class LatencyHistogram(object):
+    """ Keeps the most recent latency samples and reports percentiles """
+
+    def __init__(self, size=1024):
+        """ Init
+
+        :param size: Number of samples kept for the percentiles
+        """
+        self._samples = deque(maxlen=size)
+        # Total number of recorded samples
+        self._count = 0
+        # Maximum ever recorded
+        self._max = 0.0
+
+    def record(self, latency):
+        """ Records a sample
+
+        :param latency: Latency in seconds
+        """
+        self._samples.append(latency)
+        self._count += 1
+        if latency > self._max:
+            self._max = latency
+
+    def percentile(self, p):
+        """ Percentile of the kept samples
+
+        :param p: Percentile, 0-100
+        :returns: Latency in seconds, 0 if nothing got recorded
+        """
+        if not self._samples:
+            return 0.0
+        samples = sorted(self._samples)
+        return samples[min(len(samples) - 1, int(len(samples) * p / 100))]
+
+    def summary(self):
+        """ :returns: dict with count, p50, p99 and max in milliseconds """
+        return {
+                "count": self._count,
+                "p50": self.percentile(50) * 1000,
+                "p99": self.percentile(99) * 1000,
+                "max": self._max * 1000
+                }
+
+    @property
+    def count(self):
+        """ Number of recorded samples """
+        return self._count
+
+
+class RateMeter(object):
+    """ Counts events and reports the rate over a sliding window """
+
+    def __init__(self, window=10):
+        """ Init
+
+        :param window: Window in seconds the rate is calculated over
+        """
+        self._window = window
+        self._events = deque()
+        # Total number of events
+        self._count = 0
+
+    def mark(self, now=None):
+        """ Marks an event """
+        now = time.monotonic() if now is None else now
+        self._events.append(now)
+        self._count += 1
+        self._expire(now)
+
+    def _expire(self, now):
+        """ Drops events which left the window """
+        while self._events and self._events[0] < now - self._window:
+            self._events.popleft()
+
+    def rate(self, now=None):
+        """ :returns: Events per second within the window """
+        self._expire(time.monotonic() if now is None else now)
+        return len(self._events) / self._window
+
+    @property
+    def count(self):
+        """ Total number of events """
+        return self._count
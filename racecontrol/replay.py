@@ -0,0 +1,199 @@
+# -*- coding: utf-8 -*-
+"""
+    racecontrol.replay
+    ~~~~~~~~~~~~~~~~~~
+
+    Feeds recorded races back through the game manager, either in real time,
+    sped up or as fast as possible. Recordings are race journals, see
+    `racecontrol.game.journal`.
+
+    The race logic only depends on the order of the requests and the lap
+    times they carry, so the resulting standings do not depend on the
+    replay speed.
+
+    :author: Matthias Riegler, 2018
+    :license: aGPLv3, see LICENSE.md for more details.
+"""
+
+
+import argparse
+import asyncio
+import json
+import logging
+import time
+from . import defaults
+from . import messages
+from .game.journal import read_journal
+
+
+logger = logging.getLogger(__name__)
+
+
+def load_recording(paths):
+    """ Loads recorded requests
+
+    :param paths: Journal files, replayed in the given order
+    :returns: [(timestamp, request), ...]
+    """
+    records = []
+    for path in paths:
+        _, journal_records, _ = read_journal(path)
+        records += [(timestamp, request)
+                    for _, timestamp, request in journal_records]
+    return records
+
+
+class VirtualClock(object):
+    """ Maps recorded timestamps onto the event loop clock """
+
+    def __init__(self, loop, speed=None):
+        """ Init
+
+        :param loop: Event loop
+        :param speed: Replay speed, 1 is real time. None does not wait at all.
+        """
+        self._loop = loop
+        self._speed = speed
+        # Recorded time the replay started at
+        self._origin = 0
+        # Loop time the replay started at
+        self._started = 0
+        # Recorded time of the last event reached
+        self._reached = 0
+
+    def start(self, origin):
+        """ Starts the clock
+
+        :param origin: Recorded timestamp of the first event
+        """
+        self._origin = self._reached = origin
+        self._started = self._loop.time()
+
+    def now(self):
+        """ :returns: Current recorded time """
+        if self._speed is None:
+            return self._reached
+        return self._origin \
+            + (self._loop.time() - self._started) * self._speed
+
+    async def sleep_until(self, timestamp):
+        """ Waits until a recorded timestamp is reached. Yields to the loop
+        at least once so handlers of the previous event run first.
+        """
+        delay = 0
+        if self._speed is not None:
+            delay = (timestamp - self._origin) / self._speed \
+                - (self._loop.time() - self._started)
+        await asyncio.sleep(max(0, delay))
+        self._reached = max(self._reached, timestamp)
+
+    @property
+    def speed(self):
+        """ Replay speed, None if not throttled """
+        return self._speed
+
+
+class ReplayEngine(object):
+    """ Replays a recording through a game manager """
+
+    def __init__(self, game_manager, records, speed=None):
+        """ Init
+
+        :param game_manager: Game manager to feed, should not journal
+        :param records: [(timestamp, request), ...], see `load_recording`
+        :param speed: Replay speed, None replays as fast as possible
+        """
+        self._game_manager = game_manager
+        self._records = records
+        self._clock = VirtualClock(game_manager.loop, speed)
+        # Standings of every race finished during the replay
+        self._results = []
+
+    def standings(self):
+        """ :returns: Standings of the current race """
+        race = self._game_manager.current_race
+        state = race.current_state
+        return [{"position": position + 1, "driver": driver, **state[driver]}
+                for position, (driver, _) in enumerate(state["positions"])]
+
+    async def run(self):
+        """ Runs the replay
+
+        :returns: dict with the throughput and the standings of every race
+        """
+        if not self._records:
+            return {"events": 0, "races": []}
+
+        self._clock.start(self._records[0][0])
+        started = time.monotonic()
+
+        for timestamp, request in self._records:
+            await self._clock.sleep_until(timestamp)
+            if request.get("request") == messages.MSG_FINISH:
+                self._results.append(self.standings())
+            await self._game_manager.handle_request(request)
+
+        # Let the handlers of the last event run
+        await asyncio.sleep(0)
+        elapsed = time.monotonic() - started
+
+        races = self._results
+        if self._records[-1][1].get("request") != messages.MSG_FINISH:
+            # Unfinished race at the end of the recording
+            races = races + [self.standings()]
+
+        recorded = self._records[-1][0] - self._records[0][0]
+        return {
+                "events": len(self._records),
+                "elapsed_s": elapsed,
+                "events_per_second": len(self._records) / elapsed
+                if elapsed else None,
+                "recorded_s": recorded,
+                "speedup": recorded / elapsed if elapsed else None,
+                "races": races
+                }
+
+
+def main():
+    """ Entry point """
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("journals", nargs="+")
+    parser.add_argument("--speed", default="max",
+                        help="Replay speed, 1 is real time, 'max' does not "
+                             "wait between events")
+    parser.add_argument("--redis", default="memory",
+                        help="Redis URI or 'memory' for the in-process "
+                             "stand-in")
+    parser.add_argument("--output", help="Write the results as JSON")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+
+    if args.redis == "memory":
+        from .bench import fake_redis
+        fake_redis.install()
+        redis_uri = defaults.REDIS_URI
+    else:
+        redis_uri = args.redis
+
+    # Import after installing the stand-in
+    from .game import GameManager
+
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+
+    game_manager = GameManager(loop=loop, redis_uri=redis_uri,
+                               journal_dir=None, persist_results=False)
+    engine = ReplayEngine(game_manager,
+                          load_recording(args.journals),
+                          None if args.speed == "max" else float(args.speed))
+    results = loop.run_until_complete(engine.run())
+
+    if args.output:
+        from .bench.report import write_report
+        write_report(args.output, "replay", vars(args), results)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
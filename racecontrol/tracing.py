@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+"""
+    racecontrol.tracing
+    ~~~~~~~~~~~~~~~~~~~
+
+    Latency tracing of track events and UI commands from their origin to the
+    websocket send
+
+    :author: Matthias Riegler, 2018
+    :license: aGPLv3, see LICENSE.md for more details.
+
+
+A *trace* is a dict mapping hop names to `time.monotonic()` timestamps, in
+the order the hops were passed. It travels with the request as `"trace"`
+field and with state packets as `"traces"` list. The monotonic clock is
+shared by every process on the host, so traces can cross process borders.
+"""
+
+import logging
+import asyncio
+import time
+from . import defaults
+from .metrics import LatencyHistogram
+
+
+logger = logging.getLogger(__name__)
+
+# Hops
+HOP_DECODE = "decode"
+HOP_INPUT = "input"
+HOP_PUBLISH = "publish"
+HOP_RECEIVE = "receive"
+HOP_LAP = "lap"
+HOP_PUSH = "push"
+HOP_SEND = "send"
+
+
+class Tracer(object):
+    """ Collects per hop latency histograms """
+
+    def __init__(self):
+        """ Init """
+        self._histograms = {}
+
+    def _histogram(self, name):
+        """ Histogram by name, created on first use """
+        histogram = self._histograms.get(name)
+        if histogram is None:
+            histogram = self._histograms[name] = LatencyHistogram()
+        return histogram
+
+    def start(self, hop):
+        """ Starts a new trace
+
+        :param hop: Name of the first hop
+        :returns: trace
+        """
+        return {hop: time.monotonic()}
+
+    def stamp(self, trace, hop):
+        """ Adds a hop to a trace and records its latency
+
+        :param trace: trace, ignored if None
+        :param hop: Name of the hop
+        """
+        if not trace or not isinstance(trace, dict):
+            return
+        now = time.monotonic()
+        self._record_hop(trace, hop, now)
+        trace[hop] = now
+
+    def finish(self, trace, hop):
+        """ Records the final hop of a trace and its end-to-end latency
+
+        :param trace: trace, ignored if None
+        :param hop: Name of the final hop
+        """
+        if not trace or not isinstance(trace, dict):
+            return
+        now = time.monotonic()
+        self._record_hop(trace, hop, now)
+        first_hop, first = next(iter(trace.items()))
+        self._histogram(f"{first_hop}->{hop} (total)").record(now - first)
+
+    def _record_hop(self, trace, hop, now):
+        """ Records the latency from the last hop of the trace to `hop` """
+        last_hop = list(trace)[-1]
+        self._histogram(f"{last_hop}->{hop}").record(now - trace[last_hop])
+
+    def summary(self):
+        """ :returns: dict of hop -> {count, p50, p99, max} in milliseconds """
+        return {name: histogram.summary()
+                for name, histogram in sorted(self._histograms.items())}
+
+    async def log_periodically(self, interval=defaults.TRACE_LOG_INTERVAL):
+        """ Logs the summary every `interval` seconds """
+        while True:
+            await asyncio.sleep(interval)
+            for name, summary in self.summary().items():
+                logger.info(f"{name}: {summary['count']} samples, "
+                            f"p50 {summary['p50']:.2f}ms, "
+                            f"p99 {summary['p99']:.2f}ms, "
+                            f"max {summary['max']:.2f}ms")
+
+
+#: Tracer of this process
+tracer = Tracer()
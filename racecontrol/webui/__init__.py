@@ -1,7 +1,9 @@
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from .util.framework.blueprint import register_blueprint
+from .util.framework.assets import register_assets
 from .util.config.routing import register_initial_redirect
+from .util.database.sqlite import register_pragmas
 
 
 # Database
@@ -34,13 +36,14 @@ def register_blueprints(app):
         register_blueprint(app, name, target)
 
 
-def create_app():
+def create_app(config=None):
     """
     WebUI fabric, initializes the configurations and returns a ready to use
     Flask object
 
     The configuration file is passed by the environment variable `CONFIG`
 
+    :param config: dict overriding single configuration values
     :returns: Ready to use Flask app
     """
     app = Flask(__name__)
@@ -49,9 +52,12 @@ def create_app():
     # app.config.from_pyfile(os.environ.get("CONFIG", "../config/docker.py"))
     # @TODO
     app.config.from_object("racecontrol.config")
+    app.config.update(config or {})
 
     # Initialize DB
     db.init_app(app)
+    with app.app_context():
+        register_pragmas(db.engine, app.config.get("SQLITE_PRAGMAS", {}))
 
     # Register blueprints
     register_blueprints(app)
@@ -59,4 +65,24 @@ def create_app():
     # Register initial redirect
     register_initial_redirect(app)
 
+    # Register fingerprinted static files
+    register_assets(app)
+
+    # Register maintenance commands, the models need `db` to be set up
+    from .util.database.records import register_record_commands
+    register_record_commands(app)
+
     return app
+
+
+def init_db(app):
+    """
+    Creates the database schema, runs once on startup before the web UI
+    workers are started
+
+    :param app: Flask app
+    """
+    with app.app_context():
+        db.create_all()
+        # Workers open their own connections
+        db.engine.dispose()
@@ -1,7 +1,8 @@
 from flask import render_template, url_for, redirect
 
 from . import blueprint
-from ...models import Car
+from ...models import Car, CarRecord
+from ... import db
 from ...util.database.helper import remove_from_db
 from .forms import NewCarForm, DeleteCarForm
 
@@ -56,4 +57,8 @@ def profile(id):
         if deleted:
             return redirect(url_for(".index"))
 
-    return render_template("car/profile.html", car=car, form=form)
+    # Maintained when races are stored, a single primary key lookup
+    record = db.session.get(CarRecord, car.id) if car else None
+
+    return render_template("car/profile.html", car=car, form=form,
+                           record=record)
@@ -1,6 +1,6 @@
 from flask import render_template, url_for, redirect, abort
 from . import blueprint
-from ...models import Driver
+from ...models import Driver, DriverRecord
 from ... import db
 from ...util.database.helper import remove_from_db
 from .forms import NewDriverForm, DriverForm
@@ -59,6 +59,10 @@ def profile(id):
             driver.shortname = form.shortname.data
             db.session.commit()
 
+    # Maintained when races are stored, a single primary key lookup
+    record = db.session.get(DriverRecord, driver.id) if driver else None
+
     return render_template("/driver/profile.html",
                            form=form,
-                           driver=driver)
+                           driver=driver,
+                           record=record)
@@ -8,16 +8,37 @@ class WSUpdate {
    **/
   constructor(args) {
     this.args = args;
+    // Last applied state and its sequence number
+    this.state = null;
+    this.seq = -1;
     setTimeout(() => this.connect(this.args), 3000);
   }
 
   /**
    * Connects to the websocket
    */
-  connect({host, port, streamPath, inputPath}) {
-    this.stream = new WebSocket(`ws://${host}:${port}/${streamPath}`);
+  connect({host, port, streamPath, inputPath, wireFormat}) {
+    if(wireFormat === "binary") {
+      // Compact binary state packets, see racecontrol.wire
+      this.stream = new WebSocket(`ws://${host}:${port}/${streamPath}`,
+                                  ["racecontrol.binary"]);
+      this.stream.binaryType = "arraybuffer";
+    } else {
+      this.stream = new WebSocket(`ws://${host}:${port}/${streamPath}`);
+    }
     this.input = new WebSocket(`ws://${host}:${port}/${inputPath}`);
-    this.stream.onmessage = this.handle;
+    this.resyncPending = false;
+    // The relay sends its cached snapshot first, start over with it
+    this.state = null;
+    this.seq = -1;
+    this.stream.onmessage = e => this.handle(e);
+    // Deltas only apply on top of a snapshot, ask the game for one if the
+    // relay had none cached
+    this.input.onopen = () => setTimeout(() => {
+      if(this.state === null) {
+        this.resync();
+      }
+    }, 1000);
 
     /*
     this.stream.onerror = () => {
@@ -58,11 +79,25 @@ class WSUpdate {
     WSUpdate.setWSOK();
     try {
       // Parse input
-      const input = JSON.parse(e.data);
+      const input = (typeof e.data === "string") ?
+        JSON.parse(e.data) : WSUpdate.decodeBinary(e.data);
       switch(input.type) {
         case "update_positions":
-          WSUpdate.updatePositionView(input);
-          WSUpdate.updateUiButtons(input.status);
+          this.state = input;
+          this.seq = input.seq;
+          this.resyncPending = false;
+          WSUpdate.updatePositionView(this.state);
+          WSUpdate.updateUiButtons(this.state.status);
+          break;
+        case "state_delta":
+          if(this.state === null || input.base !== this.seq) {
+            // Missed a packet, the delta does not apply to our state
+            this.resync();
+            break;
+          }
+          this.applyDelta(input);
+          WSUpdate.updatePositionView(this.state);
+          WSUpdate.updateUiButtons(this.state.status);
           break;
         default:
           console.log(`Unknown type: ${input.type}`);
@@ -73,6 +108,103 @@ class WSUpdate {
     }
   }
 
+  /**
+   * Decodes a binary state packet, layout is described in racecontrol.wire
+   */
+  static decodeBinary(buffer) {
+    const statuses = ["not_started", "started", "paused", "finished"];
+    const unchanged = 0xff;
+    const view = new DataView(buffer);
+
+    const kind = view.getUint8(1);
+    const seq = view.getUint32(2, true);
+    const base = view.getUint32(6, true);
+    const status = view.getUint8(10);
+    const numPositions = view.getUint8(11);
+    const numDrivers = view.getUint8(12);
+    const numRanks = view.getUint8(13);
+    let offset = 14;
+
+    let positions = null;
+    if(numPositions !== unchanged) {
+      positions = [];
+      for(let i = 0; i < numPositions; i++, offset += 5) {
+        positions.push([view.getUint8(offset),
+                        view.getUint32(offset + 1, true)]);
+      }
+    }
+
+    const ranks = [];
+    for(let i = 0; i < numRanks; i++, offset += 6) {
+      ranks.push([view.getUint8(offset), view.getUint8(offset + 1),
+                  view.getUint32(offset + 2, true)]);
+    }
+
+    const drivers = {};
+    for(let i = 0; i < numDrivers; i++, offset += 17) {
+      drivers[view.getUint8(offset)] = {
+        lap_count: view.getUint32(offset + 1, true),
+        best_time: view.getInt32(offset + 5, true),
+        lap_time: view.getInt32(offset + 9, true),
+        best_lap: view.getInt32(offset + 13, true)
+      };
+    }
+
+    if(kind === 1) {
+      return {type: "update_positions", seq, status: statuses[status],
+              positions, ...drivers};
+    }
+
+    const delta = {type: "state_delta", seq, base, drivers};
+    if(status !== unchanged) {
+      delta.status = statuses[status];
+    }
+    if(positions !== null) {
+      delta.positions = positions;
+    }
+    if(ranks.length > 0) {
+      delta.ranks = ranks;
+    }
+    return delta;
+  }
+
+  /**
+   * Applies a delta packet to the current state
+   */
+  applyDelta(delta) {
+    for(const [driverId, driver] of Object.entries(delta.drivers)) {
+      this.state[driverId] = driver;
+    }
+    if("positions" in delta) {
+      this.state.positions = delta.positions;
+    }
+    if("ranks" in delta) {
+      // Only the positions that changed
+      for(const [position, driverId, lapCount] of delta.ranks) {
+        this.state.positions[position] = [driverId, lapCount];
+      }
+    }
+    if("status" in delta) {
+      this.state.status = delta.status;
+    }
+    this.seq = delta.seq;
+  }
+
+  /**
+   * Requests a full snapshot, only once until it arrived
+   */
+  resync() {
+    if(this.resyncPending) {
+      return;
+    }
+    try {
+      this.input.send(JSON.stringify({"request": "resync"}));
+      this.resyncPending = true;
+    } catch(e) {
+      console.error(e);
+    }
+  }
+
   /**
    * Updates the UI icons based on the game state
    */
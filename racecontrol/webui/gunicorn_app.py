@@ -0,0 +1,29 @@
+from gunicorn.app.base import BaseApplication
+
+
+class GunicornApplication(BaseApplication):
+    """
+    Runs an already created Flask app with gunicorn, configured by a dict
+    instead of the command line
+
+    :param app: Flask app
+    :param options: Gunicorn settings, e.g. `workers` or `keepalive`
+    """
+
+    def __init__(self, app, options):
+        self.application = app
+        self.options = options
+        super().__init__()
+
+    def load_config(self):
+        """
+        Applies the options to the gunicorn configuration
+        """
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+
+    def load(self):
+        """
+        :returns: WSGI application served by the workers
+        """
+        return self.application
@@ -2,3 +2,5 @@ from .. import db
 
 from .car import Car
 from .driver import Driver
+from .race import Race, Entry, Lap
+from .records import DriverRecord, CarRecord
@@ -0,0 +1,93 @@
+from . import db
+
+
+class Race(db.Model):
+    """
+    Database entry of a finished race
+
+    :param race_key: Id of the race in the game manager, e.g. "default"
+    :param mode: Race mode
+    :param started_at: Unix time the race was started
+    :param finished_at: Unix time the race was finished
+    """
+
+    id = db.Column(db.Integer, primary_key=True)
+    race_key = db.Column(db.String(32), nullable=False)
+    mode = db.Column(db.String, nullable=False)
+    started_at = db.Column(db.Float, nullable=True)
+    finished_at = db.Column(db.Float, nullable=False, index=True)
+
+    entries = db.relationship("Entry", back_populates="race",
+                              order_by="Entry.position")
+
+    def __repr__(self):
+        """
+        :returns: String representation of the race
+        """
+        return f"<{self.race_key} - {self.mode} - {self.finished_at}>"
+
+
+class Entry(db.Model):
+    """
+    Result of one slot of a finished race
+
+    :param slot: Track / driver slot in the race
+    :param position: Final position, 0 is the winner
+    :param driver_id: Driver on the slot, None if none was assigned
+    :param car_id: Car on the slot, None if none was assigned
+    """
+
+    __table_args__ = (
+        db.Index("ix_entry_driver_race", "driver_id", "race_id"),
+        db.Index("ix_entry_car_race", "car_id", "race_id"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    race_id = db.Column(db.Integer, db.ForeignKey("race.id"), nullable=False)
+    slot = db.Column(db.Integer, nullable=False)
+    position = db.Column(db.Integer, nullable=False)
+    # Results are kept when a driver or car is deleted
+    driver_id = db.Column(db.Integer,
+                          db.ForeignKey("driver.id", ondelete="SET NULL"),
+                          nullable=True)
+    car_id = db.Column(db.Integer,
+                       db.ForeignKey("car.id", ondelete="SET NULL"),
+                       nullable=True)
+    lap_count = db.Column(db.Integer, nullable=False)
+    total_time = db.Column(db.Integer, nullable=False)
+    best_time = db.Column(db.Integer, nullable=False)
+    best_lap = db.Column(db.Integer, nullable=False)
+
+    race = db.relationship("Race", back_populates="entries")
+
+    def __repr__(self):
+        """
+        :returns: String representation of the entry
+        """
+        return f"<{self.race_id} - {self.slot} - P{self.position + 1}>"
+
+
+class Lap(db.Model):
+    """
+    Single lap of a finished race
+
+    :param lap_no: Lap number of the entry, starting at 1
+    :param time: Lap time
+    """
+
+    __table_args__ = (
+        db.Index("ix_lap_race_lap_no", "race_id", "lap_no"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    race_id = db.Column(db.Integer, db.ForeignKey("race.id"), nullable=False)
+    entry_id = db.Column(db.Integer, db.ForeignKey("entry.id"),
+                         nullable=False, index=True)
+    lap_no = db.Column(db.Integer, nullable=False)
+    time = db.Column(db.Integer, nullable=False)
+
+    def __repr__(self):
+        """
+        :returns: String representation of the lap
+        """
+        return f"<{self.entry_id} - {self.lap_no} - {self.time}>"
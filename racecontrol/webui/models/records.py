@@ -0,0 +1,77 @@
+from sqlalchemy.orm import declared_attr
+from . import db
+
+
+class RecordMixin(object):
+    """
+    Aggregated results, maintained whenever a race is stored so reading them
+    never touches the lap history
+
+    :param races: Races finished
+    :param wins: Races won
+    :param laps: Laps driven
+    :param best_time: Fastest lap ever, None until a lap was driven
+    """
+
+    races = db.Column(db.Integer, nullable=False, default=0)
+    wins = db.Column(db.Integer, nullable=False, default=0, index=True)
+    laps = db.Column(db.Integer, nullable=False, default=0)
+    best_time = db.Column(db.Integer, nullable=True, index=True)
+
+    @declared_attr
+    def best_race_id(cls):
+        """
+        Race the fastest lap was driven in
+        """
+        return db.Column(db.Integer,
+                         db.ForeignKey("race.id", ondelete="SET NULL"),
+                         nullable=True)
+
+    def add(self, entry):
+        """
+        Adds the result of a race
+
+        :param entry: Entry of a stored race
+        """
+        self.races = (self.races or 0) + 1
+        # Nobody wins a race without laps, its first slot is no winner
+        won = entry.position == 0 and entry.lap_count > 0
+        self.wins = (self.wins or 0) + (1 if won else 0)
+        self.laps = (self.laps or 0) + entry.lap_count
+
+        if entry.best_time > 0 and (self.best_time is None or
+                                    entry.best_time < self.best_time):
+            self.best_time = entry.best_time
+            self.best_race_id = entry.race_id
+
+
+class DriverRecord(RecordMixin, db.Model):
+    """
+    Aggregated results of a driver
+    """
+
+    driver_id = db.Column(db.Integer,
+                          db.ForeignKey("driver.id", ondelete="CASCADE"),
+                          primary_key=True)
+
+    def __repr__(self):
+        """
+        :returns: String representation of the record
+        """
+        return f"<{self.driver_id} - {self.wins}/{self.races}>"
+
+
+class CarRecord(RecordMixin, db.Model):
+    """
+    Aggregated results of a car
+    """
+
+    car_id = db.Column(db.Integer,
+                       db.ForeignKey("car.id", ondelete="CASCADE"),
+                       primary_key=True)
+
+    def __repr__(self):
+        """
+        :returns: String representation of the record
+        """
+        return f"<{self.car_id} - {self.wins}/{self.races}>"
@@ -0,0 +1,60 @@
+import os
+from .. import defaults
+from . import create_app, init_db
+from .util.framework.assets import build_assets
+try:
+    # Preforking server with a thread pool per worker
+    from .gunicorn_app import GunicornApplication
+except ImportError:
+    # No gunicorn installed; the Flask development server works as well!
+    GunicornApplication = None
+
+
+SERVER_GUNICORN = "gunicorn"
+SERVER_DEVELOPMENT = "development"
+
+
+def serve(host=defaults.WEBUI_HOST,
+          port=defaults.WEBUI_PORT,
+          server=defaults.WEBUI_SERVER,
+          workers=defaults.WEBUI_WORKERS,
+          threads=defaults.WEBUI_THREADS,
+          keepalive=defaults.WEBUI_KEEPALIVE,
+          graceful_timeout=defaults.WEBUI_GRACEFUL_TIMEOUT,
+          config=None):
+    """
+    Serves the web based user interface until SIGTERM, meant to run in its
+    own process. Gunicorn drains the requests in flight on SIGTERM.
+
+    :param server: `SERVER_GUNICORN` or `SERVER_DEVELOPMENT`, falls back to
+                   the development server if gunicorn is not installed
+    :param workers: Worker processes
+    :param threads: Threads per worker process
+    :param keepalive: Seconds an idle keep-alive connection is held open
+    :param graceful_timeout: Seconds in flight requests get on shutdown
+    :param config: dict overriding single configuration values
+    """
+    # Keyboard interrupts go to the racecontrol process only, it stops the
+    # web UI with SIGTERM so requests in flight are not cut off
+    os.setpgrp()
+
+    webui = create_app(config)
+    init_db(webui)
+    build_assets(webui)
+
+    if server == SERVER_GUNICORN and GunicornApplication is not None:
+        GunicornApplication(webui, {
+            "bind": f"{host}:{port}",
+            "workers": workers,
+            "threads": threads,
+            "worker_class": "gthread",
+            "keepalive": keepalive,
+            "graceful_timeout": graceful_timeout
+            }).run()
+        return
+
+    webui.run(host=host,
+              port=port,
+              debug=True,
+              use_reloader=False,
+              use_debugger=False)
@@ -0,0 +1,78 @@
+import click
+from ... import db
+from ...models import CarRecord, DriverRecord, Entry
+
+
+def _record(records, model, key, id):
+    """
+    Looks a record up, creates it if it does not exist yet
+
+    :param records: dict of loaded records, (model, id) -> record
+    :param model: DriverRecord or CarRecord
+    :param key: Primary key column, e.g. `driver_id`
+    :param id: Driver or car ID
+    :returns: Record
+    """
+    record = records.get((model, id))
+    if record is None:
+        record = db.session.get(model, id)
+        if record is None:
+            record = model(**{key: id})
+            db.session.add(record)
+        records[model, id] = record
+    return record
+
+
+def update_records(entries, records=None):
+    """
+    Adds the entries of a stored race to the driver and car records, within
+    the transaction of the current session
+
+    :param entries: Entries with their IDs assigned
+    :param records: dict of records loaded before, shared between calls
+    """
+    records = {} if records is None else records
+    for entry in entries:
+        if entry.driver_id is not None:
+            _record(records, DriverRecord, "driver_id",
+                    entry.driver_id).add(entry)
+        if entry.car_id is not None:
+            _record(records, CarRecord, "car_id", entry.car_id).add(entry)
+
+
+def rebuild_records():
+    """
+    Recomputes every record from the stored races, e.g. after a backfill
+
+    :returns: Number of entries processed
+    """
+    DriverRecord.query.delete()
+    CarRecord.query.delete()
+
+    records = {}
+    processed = 0
+    entries = (Entry.query
+               .filter((Entry.driver_id.isnot(None)) |
+                       (Entry.car_id.isnot(None)))
+               .order_by(Entry.race_id, Entry.id)
+               .yield_per(1000))
+    for entry in entries:
+        update_records((entry,), records)
+        processed += 1
+
+    db.session.commit()
+    return processed
+
+
+def register_record_commands(app):
+    """
+    Registers `flask rebuild-records`
+
+    :param app: Flask app
+    """
+    @app.cli.command("rebuild-records")
+    def rebuild_records_command():
+        """
+        Recomputes the driver and car records from the stored races
+        """
+        click.echo(f"Rebuilt records from {rebuild_records()} entries")
@@ -0,0 +1,20 @@
+from sqlalchemy import event
+
+
+def register_pragmas(engine, pragmas):
+    """
+    Applies pragmas to every new connection of a SQLite engine, engines of
+    other databases are left alone
+
+    :param engine: SQLAlchemy engine
+    :param pragmas: dict of pragma -> value, e.g. `{"journal_mode": "WAL"}`
+    """
+    if engine.dialect.name != "sqlite":
+        return
+
+    @event.listens_for(engine, "connect")
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for pragma, value in pragmas.items():
+            cursor.execute(f"PRAGMA {pragma} = {value}")
+        cursor.close()
@@ -0,0 +1,210 @@
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import click
+from flask import current_app, request, send_from_directory, url_for
+try:
+    # Smaller than gzip for text files
+    import brotli
+except ImportError:
+    # No brotli installed; gzip is understood by every browser anyway!
+    brotli = None
+
+
+MANIFEST = "manifest.json"
+
+# Only text compresses well, images are already compressed
+COMPRESSIBLE = (".css", ".js", ".svg", ".html", ".json", ".txt")
+
+# Files smaller than that are sent as they are
+COMPRESS_MIN_SIZE = 256
+
+
+def _encoders():
+    """
+    :returns: list of (content encoding, file suffix, compress function),
+              preferred encoding first
+    """
+    encoders = [("gzip", ".gz",
+                 lambda data: gzip.compress(data, 9, mtime=0))]
+    if brotli is not None:
+        encoders.insert(0, ("br", ".br", brotli.compress))
+    return encoders
+
+
+def _static_folders(app):
+    """
+    Static folders of the app and its blueprints
+
+    :param app: Flask app
+    :returns: Generator of (endpoint, folder)
+    """
+    if app.has_static_folder:
+        yield "static", app.static_folder
+    for blueprint in app.blueprints.values():
+        if blueprint.has_static_folder:
+            yield f"{blueprint.name}.static", blueprint.static_folder
+
+
+def _fingerprint(filename, digest):
+    """
+    Adds the content hash to a file name, e.g. `js/race.<digest>.js`
+
+    :param filename: Path relative to the static folder
+    :param digest: Content hash
+    :returns: Fingerprinted path
+    """
+    root, extension = os.path.splitext(filename)
+    return f"{root}.{digest}{extension}"
+
+
+def _write(path, data):
+    """
+    Writes a file unless it exists already, its name is derived from its
+    content
+
+    :param path: Target path
+    :param data: Content
+    """
+    if os.path.exists(path):
+        return
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Workers may serve the file while it is written
+    temporary = f"{path}.{os.getpid()}.tmp"
+    with open(temporary, "wb") as f:
+        f.write(data)
+    os.replace(temporary, path)
+
+
+def build_assets(app):
+    """
+    Writes a fingerprinted copy of every static file and the gzip, or
+    brotli, compressed versions of the text files into the asset build
+    directory. Runs once before the web UI workers are started.
+
+    :param app: Flask app
+    :returns: Manifest, dict of `<endpoint>:<filename>` -> built path
+    """
+    output = app.config.get("ASSETS_BUILD_DIR")
+    if output is None:
+        return {}
+
+    manifest = {}
+    encoders = _encoders()
+    for endpoint, folder in _static_folders(app):
+        # Blueprints get a directory each, their file names may collide
+        prefix = endpoint.rsplit(".", 1)[0]
+        for root, _, files in os.walk(folder):
+            for name in files:
+                with open(os.path.join(root, name), "rb") as f:
+                    data = f.read()
+                filename = os.path.relpath(os.path.join(root, name), folder)
+                filename = filename.replace(os.sep, "/")
+                built = f"{prefix}/" + _fingerprint(
+                        filename, hashlib.sha256(data).hexdigest()[:12])
+
+                path = os.path.join(output, built)
+                _write(path, data)
+                if (name.endswith(COMPRESSIBLE)
+                        and len(data) >= COMPRESS_MIN_SIZE):
+                    for _, suffix, compress in encoders:
+                        _write(path + suffix, compress(data))
+
+                manifest[f"{endpoint}:{filename}"] = built
+
+    temporary = os.path.join(output, f"{MANIFEST}.{os.getpid()}.tmp")
+    with open(temporary, "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(temporary, os.path.join(output, MANIFEST))
+
+    app.extensions["assets"] = manifest
+    return manifest
+
+
+def _manifest(app):
+    """
+    Manifest of the built assets, read once per process
+
+    :param app: Flask app
+    :returns: dict, empty if the assets were not built
+    """
+    manifest = app.extensions.get("assets")
+    if manifest is None:
+        manifest = {}
+        output = app.config.get("ASSETS_BUILD_DIR")
+        if output is not None:
+            try:
+                with open(os.path.join(output, MANIFEST)) as f:
+                    manifest = json.load(f)
+            except FileNotFoundError:
+                pass
+        app.extensions["assets"] = manifest
+    return manifest
+
+
+def asset_url(endpoint, filename):
+    """
+    `url_for` for static files, resolves to the fingerprinted copy if the
+    assets were built and to the plain static file otherwise
+
+    :param endpoint: Static endpoint, e.g. `static` or `.static`
+    :param filename: Path relative to the static folder
+    :returns: URL
+    """
+    if endpoint.startswith("."):
+        blueprint = request.blueprint
+        endpoint = f"{blueprint}{endpoint}" if blueprint else endpoint[1:]
+
+    built = _manifest(current_app).get(f"{endpoint}:{filename}")
+    if built is None:
+        return url_for(endpoint, filename=filename)
+    return url_for("assets", filename=built)
+
+
+def serve_asset(filename):
+    """
+    Sends a fingerprinted file, compressed if the client accepts it. The
+    name changes with the content, so browsers never have to ask again.
+
+    :param filename: Built path
+    """
+    output = current_app.config["ASSETS_BUILD_DIR"]
+    path, encoding = filename, None
+    for name, suffix, _ in _encoders():
+        if (request.accept_encodings[name]
+                and os.path.isfile(os.path.join(output, filename + suffix))):
+            path, encoding = filename + suffix, name
+            break
+
+    response = send_from_directory(
+            output, path,
+            mimetype=mimetypes.guess_type(filename)[0],
+            download_name=os.path.basename(filename),
+            max_age=current_app.config["ASSETS_MAX_AGE"])
+    if encoding is not None:
+        response.headers["Content-Encoding"] = encoding
+    response.vary.add("Accept-Encoding")
+    response.cache_control.immutable = True
+    return response
+
+
+def register_assets(app):
+    """
+    Registers the asset route, the `asset_url` template helper and
+    `flask build-assets`
+
+    :param app: Flask app
+    """
+    if app.config.get("ASSETS_BUILD_DIR") is not None:
+        app.add_url_rule(f"{app.config['ASSETS_URL_PATH']}/<path:filename>",
+                         "assets", serve_asset)
+    app.add_template_global(asset_url)
+
+    @app.cli.command("build-assets")
+    def build_assets_command():
+        """
+        Writes the fingerprinted and compressed static files
+        """
+        click.echo(f"Built {len(build_assets(app))} assets")
@@ -0,0 +1,202 @@
+# -*- coding: utf-8 -*-
+"""
+    racecontrol.wire
+    ~~~~~~~~~~~~~~~~
+
+    Compact binary encoding of state packets for the game stream. JSON stays
+    the default, clients opt in per connection either with the
+    `WIRE_SUBPROTOCOL_BINARY` websocket subprotocol or with
+    `?format=binary` in the stream path.
+
+    :author: Matthias Riegler, 2018
+    :license: aGPLv3, see LICENSE.md for more details.
+"""
+
+
+import struct
+from urllib.parse import urlsplit, parse_qs
+from . import messages
+from .game import race_states
+
+# ======================================================================
+#                             Packet layout
+#
+#   All fields are little endian
+#
+#   header      ->  <version:u8> <kind:u8> <seq:u32> <base:u32>
+#                   <status:u8> <num_positions:u8> <num_drivers:u8>
+#                   <num_ranks:u8>
+#   position    ->  <driver:u8> <lap_count:u32>         (num_positions x)
+#   rank        ->  <position:u8> <driver:u8> <lap_count:u32>
+#                                                       (num_ranks x)
+#   driver      ->  <driver:u8> <lap_count:u32> <best_time:i32>
+#                   <lap_time:i32> <best_lap:i32>        (num_drivers x)
+#
+#   kind        ->  1 snapshot, 2 delta
+#   base        ->  sequence number a delta applies to, 0 for snapshots
+#   status      ->  index in STATUSES, 0xff if unchanged (delta only)
+#   positions   ->  0xff if unchanged (delta only)
+#   ranks       ->  single changed positions (delta only)
+#
+# ======================================================================
+
+VERSION = 2
+
+KIND_SNAPSHOT = 1
+KIND_DELTA = 2
+
+UNCHANGED = 0xff
+
+STATUSES = (
+        race_states.NOT_STARTED,
+        race_states.STARTED,
+        race_states.PAUSED,
+        race_states.FINISHED
+        )
+
+DRIVER_FIELDS = ("lap_count", "best_time", "lap_time", "best_lap")
+
+FORMAT_JSON = "json"
+FORMAT_BINARY = "binary"
+
+WIRE_SUBPROTOCOL_JSON = "racecontrol.json"
+WIRE_SUBPROTOCOL_BINARY = "racecontrol.binary"
+SUBPROTOCOLS = [WIRE_SUBPROTOCOL_JSON, WIRE_SUBPROTOCOL_BINARY]
+
+_HEADER = struct.Struct("<BBIIBBBB")
+_POSITION = struct.Struct("<BI")
+_RANK = struct.Struct("<BBI")
+_DRIVER = struct.Struct("<BIiii")
+
+_STATUS_INDEX = {status: index for index, status in enumerate(STATUSES)}
+_STATE_KEYS = ("type", "seq", "base", "status", "positions", "ranks",
+               "drivers", "traces")
+
+
+def negotiate(path, subprotocol=None):
+    """ Determines the wire format of a stream connection
+
+    :param path: Requested path including the query string
+    :param subprotocol: Negotiated websocket subprotocol
+    :returns: FORMAT_JSON or FORMAT_BINARY
+    """
+    if subprotocol == WIRE_SUBPROTOCOL_BINARY:
+        return FORMAT_BINARY
+
+    query = parse_qs(urlsplit(path).query)
+    if FORMAT_BINARY in query.get("format", []):
+        return FORMAT_BINARY
+
+    return FORMAT_JSON
+
+
+def encode(packet):
+    """ Encodes a state packet
+
+    :param packet: Decoded snapshot or delta packet
+    :returns: bytes or None if the packet is not a state packet
+    """
+    packet_type = packet.get("type")
+
+    if packet_type == messages.REDIS_MSG_TYPE_STATE_PUSH:
+        kind = KIND_SNAPSHOT
+        drivers = [(key, value) for key, value in packet.items()
+                   if key not in _STATE_KEYS]
+    elif packet_type == messages.REDIS_MSG_TYPE_STATE_DELTA:
+        kind = KIND_DELTA
+        drivers = list(packet["drivers"].items())
+    else:
+        return None
+
+    positions = packet.get("positions")
+    ranks = packet.get("ranks", ())
+    status = _STATUS_INDEX[packet["status"]] if "status" in packet \
+        else UNCHANGED
+
+    buf = bytearray(_HEADER.size
+                    + _POSITION.size * len(positions or ())
+                    + _RANK.size * len(ranks)
+                    + _DRIVER.size * len(drivers))
+
+    _HEADER.pack_into(buf, 0,
+                      VERSION,
+                      kind,
+                      packet["seq"],
+                      packet.get("base", 0),
+                      status,
+                      UNCHANGED if positions is None else len(positions),
+                      len(drivers),
+                      len(ranks))
+    offset = _HEADER.size
+
+    for driver, lap_count in positions or ():
+        _POSITION.pack_into(buf, offset, int(driver), lap_count)
+        offset += _POSITION.size
+
+    for position, driver, lap_count in ranks:
+        _RANK.pack_into(buf, offset, position, int(driver), lap_count)
+        offset += _RANK.size
+
+    for driver, state in drivers:
+        _DRIVER.pack_into(buf, offset, int(driver),
+                          *(state[field] for field in DRIVER_FIELDS))
+        offset += _DRIVER.size
+
+    return bytes(buf)
+
+
+def decode(data):
+    """ Decodes a binary state packet
+
+    :param data: bytes-like object created by `encode`
+    :returns: Packet as it would have been received in JSON format
+    """
+    view = memoryview(data)
+    version, kind, seq, base, status, num_positions, num_drivers, \
+        num_ranks = _HEADER.unpack_from(view, 0)
+
+    if version != VERSION:
+        raise ValueError(f"Unsupported wire format version {version}")
+
+    offset = _HEADER.size
+    if num_positions != UNCHANGED:
+        positions = [list(pos) for pos in _POSITION.iter_unpack(
+            view[offset:offset + num_positions * _POSITION.size])]
+        offset += num_positions * _POSITION.size
+    else:
+        positions = None
+
+    ranks = [list(rank) for rank in _RANK.iter_unpack(
+        view[offset:offset + num_ranks * _RANK.size])]
+    offset += num_ranks * _RANK.size
+
+    drivers = {}
+    for driver, *fields in _DRIVER.iter_unpack(
+            view[offset:offset + num_drivers * _DRIVER.size]):
+        drivers[str(driver)] = dict(zip(DRIVER_FIELDS, fields))
+
+    if kind == KIND_SNAPSHOT:
+        packet = {
+                "type": messages.REDIS_MSG_TYPE_STATE_PUSH,
+                "seq": seq,
+                "status": STATUSES[status],
+                "positions": positions,
+                **drivers
+                }
+    elif kind == KIND_DELTA:
+        packet = {
+                "type": messages.REDIS_MSG_TYPE_STATE_DELTA,
+                "seq": seq,
+                "base": base,
+                "drivers": drivers
+                }
+        if status != UNCHANGED:
+            packet["status"] = STATUSES[status]
+        if positions is not None:
+            packet["positions"] = positions
+        if ranks:
+            packet["ranks"] = ranks
+    else:
+        raise ValueError(f"Unknown packet kind {kind}")
+
+    return packet